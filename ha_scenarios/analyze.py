@@ -0,0 +1,87 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that acts as entrypoint for the offline analysis of past runs.
+
+ex.: python analyze.py -a /home/user/PycharmProjects/hadr/logs -o summary.csv
+"""
+import pathlib
+import time
+from absl import app, flags
+from src.common import cm9_bulk_analyzer
+
+_ARCHIVE_ROOT = flags.DEFINE_string(
+    'archive_root',
+    default='.',
+    help=(
+        'Directory holding the <run_id>_<scenario> run directories, '
+        'usually the --log_dest of the scenario runs, default is `pwd`'
+    ),
+    short_name='a',
+)
+
+_SUMMARY_FILE = flags.DEFINE_string(
+    'summary_file',
+    default='runs_summary.csv',
+    help='CSV file the consolidated summary table is written to',
+    short_name='o',
+)
+
+_WORKERS = flags.DEFINE_integer(
+    'workers',
+    default=None,
+    help='Number of parsing processes, default is the number of cores',
+    short_name='w',
+)
+
+_USE_CACHE = flags.DEFINE_bool(
+    'use_cache',
+    default=True,
+    help='Reuse & store the sidecar cache of parsed results files',
+)
+
+_CACHE_DIR = flags.DEFINE_string(
+    'cache_dir',
+    default=None,
+    help=(
+        'Directory for the sidecar cache files, default is next to each '
+        'results file (ex.: when the archive is read-only)'
+    ),
+)
+
+
+def main(argv) -> None:
+    """ Entry point of the bulk analysis"""
+    del argv
+
+    started = time.monotonic()
+    runs = cm9_bulk_analyzer.find_runs(_ARCHIVE_ROOT.value)
+    print(f'{len(runs)} runs found under '
+          f'{pathlib.Path(_ARCHIVE_ROOT.value).resolve()}')
+
+    rows = cm9_bulk_analyzer.analyse_runs(runs, _WORKERS.value,
+                                          _USE_CACHE.value, _CACHE_DIR.value)
+    cm9_bulk_analyzer.write_summary_table(rows, _SUMMARY_FILE.value)
+
+    failed_runs = [row['run_id'] for row in rows if row['error']]
+    print(f'Summary of {len(rows)} runs written to {_SUMMARY_FILE.value} in '
+          f'{time.monotonic() - started:.1f} secs')
+    if failed_runs:
+        print(f'{len(failed_runs)} runs could not be parsed: {failed_runs}')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that generates synthetic Swingbench results xml files
+
+The fixtures under tests/testdata come from actual scenario runs lasting
+minutes. To measure the parser against soak runs lasting hours or days,
+write_resultsxml() generates results files of any length with a reading
+per second & a known outage pattern:
+
+    write_resultsxml('7d.xml', run_secs=7 * 86400,
+                     outages=periodic_outages(7 * 86400, every_secs=3600,
+                                              outage_secs=60))
+
+The readings are 0 during the ramp up & the outages, and otherwise jitter
+between STEADY_TPS_LOW & STEADY_TPS_HIGH, above the RECOVERY_TPS of the
+parser, so that every outage is detected exactly as generated.
+"""
+import pathlib
+import typing
+
+import numpy as np
+
+START_TS = 1658003925819  # epoch ms of the first reading
+RAMP_UP_SECS = 30
+STEADY_TPS_LOW = 110
+STEADY_TPS_HIGH = 130
+
+# readings formatted & written per write() call
+_BLOCK_READINGS = 3600
+
+_XML_HEAD = """<?xml version = '1.0' encoding = 'UTF-8'?>
+<Results xmlns="http://www.dominicgiles.com/swingbench">
+   <Overview>
+      <BenchmarkName>Order Entry (JDBC)</BenchmarkName>
+      <Comment>Synthetic results file generated for benchmarking</Comment>
+      <TotalRunTime>{total_run_time}</TotalRunTime>
+   </Overview>
+   <BenchmarkMetrics>
+      <TPSReadings>"""
+
+_XML_TAIL = """</TPSReadings>
+   </BenchmarkMetrics>
+</Results>
+"""
+
+
+class Outage(typing.NamedTuple):
+    """An outage of `duration_secs` zero TPS readings, starting with the
+    reading at `offset_secs` from the first reading of the run."""
+    offset_secs: int
+    duration_secs: int
+
+
+def periodic_outages(run_secs: int, every_secs: int, outage_secs: int,
+                     first_offset_secs: int = 600) -> list:
+    """Outages of `outage_secs` every `every_secs` till the end of the run"""
+    return [Outage(offset_secs, outage_secs)
+            for offset_secs in range(first_offset_secs, run_secs - outage_secs,
+                                     every_secs)]
+
+
+def tps_values(run_secs: int, outages: list = (), seed: int = 0) -> np.ndarray:
+    """The TPS of every second of the run as an int64 array"""
+    rng = np.random.default_rng(seed)
+    tps = rng.integers(STEADY_TPS_LOW, STEADY_TPS_HIGH, size=run_secs,
+                       dtype=np.int64)
+    tps[:RAMP_UP_SECS] = 0
+    for outage in outages:
+        if outage.offset_secs <= RAMP_UP_SECS:
+            raise ValueError(f'{outage} starts before the end of the ramp up')
+        tps[outage.offset_secs:outage.offset_secs + outage.duration_secs] = 0
+    return tps
+
+
+def write_resultsxml(resultsxml_file: str, run_secs: int, outages: list = (),
+                     seed: int = 0) -> None:
+    """Write a results xml file of `run_secs` readings with the outages
+
+    The <TPSReadings> text is written block by block, so that generating a
+    multi-day file does not need it in memory at once.
+    """
+    tps = tps_values(run_secs, outages, seed)
+    hours, secs = divmod(run_secs, 3600)
+    with open(resultsxml_file, 'w', encoding='utf-8') as resultsxml_fh:
+        resultsxml_fh.write(_XML_HEAD.format(
+            total_run_time=f'{hours}:{secs // 60:02}:{secs % 60:02}'))
+        for block_start in range(0, run_secs, _BLOCK_READINGS):
+            block_tps = tps[block_start:block_start + _BLOCK_READINGS]
+            # same layout as swingbench: `timestamp, TPS, ` with a trailing
+            # comma after the last reading
+            if block_start:
+                resultsxml_fh.write(' ')
+            resultsxml_fh.write(' '.join(
+                f'{START_TS + (block_start + i) * 1000}, {value},'
+                for i, value in enumerate(block_tps.tolist())))
+        resultsxml_fh.write(_XML_TAIL)
+
+
+def synthetic_resultsxml_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    sample_xml_filename = pathlib.Path('/tmp/synthetic_1h.xml')
+
+    write_resultsxml(sample_xml_filename, 3600,
+                     periodic_outages(3600, every_secs=900, outage_secs=45))
+    print(f'{sample_xml_filename}: {sample_xml_filename.stat().st_size} bytes')
+
+
+if __name__ == '__main__':
+    synthetic_resultsxml_standalone_runner()
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of ParseSwingbenchRunXML against synthetic long-run results
+
+For each run length (1h, 24h, 7d at a reading per second by default) a
+synthetic results file is generated once into --workdir and parsed in
+each mode:
+* tree      => ParseSwingbenchRunXML(streaming=False)
+* streaming => ParseSwingbenchRunXML(streaming=True)
+* cached    => ParseSwingbenchRunXML(use_cache=True) served by the sidecar
+               cache primed beforehand
+
+The best wall time of --repeats parses & the peak traced memory (separate
+parse under tracemalloc, which slows the parse down) are reported per
+size & mode, and saved to --results_file as json. Given a --baseline_file
+saved by an earlier run on the same machine, every size & mode whose time
+or peak memory grew by more than --tolerance (and above a small noise
+floor) is reported as a regression and the benchmark exits with status 1:
+
+    python benchmarks/bm1_parse_resultsxml.py --results_file=before.json
+    ... parser change ...
+    python benchmarks/bm1_parse_resultsxml.py --baseline_file=before.json
+"""
+import contextlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from absl import app, flags
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+
+# pylint: disable=import-error,wrong-import-position
+from benchmarks import bm0_synthetic_resultsxml
+from src.common.cm2_parse_resultsxml import ParseSwingbenchRunXML
+# pylint: enable=import-error,wrong-import-position
+
+SIZES = {'1h': 3600, '24h': 86400, '7d': 7 * 86400}
+MODES = ['tree', 'streaming', 'cached']
+
+# growth below these is timer / allocator noise rather than a regression,
+# ex.: 0.9 ms => 1.3 ms for the 1h parse
+_NOISE_FLOOR = {'secs': 0.005, 'peak_mib': 0.5}
+
+_SIZES = flags.DEFINE_multi_enum(
+    'sizes', default=list(SIZES), enum_values=list(SIZES),
+    help='Run lengths of the synthetic results files to benchmark')
+
+_MODES = flags.DEFINE_multi_enum(
+    'modes', default=MODES, enum_values=MODES,
+    help='Parse modes to benchmark')
+
+_REPEATS = flags.DEFINE_integer(
+    'repeats', default=3, help='Timed parses per size & mode, best is kept')
+
+_OUTAGE_EVERY_SECS = flags.DEFINE_integer(
+    'outage_every_secs', default=3600,
+    help='Seconds between the starts of the generated outages')
+
+_OUTAGE_SECS = flags.DEFINE_integer(
+    'outage_secs', default=60, help='Duration of each generated outage')
+
+_WORKDIR = flags.DEFINE_string(
+    'workdir', default=None,
+    help=('Directory for the generated results files, kept across runs; '
+          'default is a temporary directory'))
+
+_RESULTS_FILE = flags.DEFINE_string(
+    'results_file', default=None,
+    help='Json file the measurements are saved to, usable as a baseline')
+
+_BASELINE_FILE = flags.DEFINE_string(
+    'baseline_file', default=None,
+    help='Json file of an earlier run to detect regressions against')
+
+_TOLERANCE = flags.DEFINE_float(
+    'tolerance', default=0.25,
+    help='Relative growth of time or peak memory reported as a regression')
+
+
+def generate_resultsxml(workdir: str, size: str, outage_every_secs: int,
+                        outage_secs: int) -> pathlib.Path:
+    """Generate the results file of a size & pattern unless already there"""
+    run_secs = SIZES[size]
+    resultsxml_file = pathlib.Path(
+        workdir, f'synthetic_{size}_{outage_every_secs}_{outage_secs}.xml')
+    if not resultsxml_file.exists():
+        bm0_synthetic_resultsxml.write_resultsxml(
+            resultsxml_file, run_secs,
+            bm0_synthetic_resultsxml.periodic_outages(
+                run_secs, outage_every_secs, outage_secs))
+    return resultsxml_file
+
+
+def benchmark_parse(resultsxml_file: pathlib.Path, mode: str,
+                    repeats: int) -> dict:
+    """Best wall time & peak traced memory of parsing a file in a mode"""
+    cache_dir = str(resultsxml_file.parent / 'cache')
+
+    def parse() -> ParseSwingbenchRunXML:
+        parse_swingbench_run = ParseSwingbenchRunXML(
+            resultsxml_file=resultsxml_file, streaming=mode == 'streaming',
+            use_cache=mode == 'cached', cache_dir=cache_dir)
+        # the parser prints every window, which would swamp the report
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            parse_swingbench_run.parse_swingbench_resultsxml()
+        return parse_swingbench_run
+
+    if mode == 'cached':
+        parse()  # prime the cache, the measured parses are all cache hits
+
+    secs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        parse_swingbench_run = parse()
+        secs.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        parse()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'secs': round(min(secs), 4), 'peak_mib': round(
+        peak_bytes / 2**20, 3), 'outage_windows': len(
+            parse_swingbench_run.outage_windows)}
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Describe every size & mode measured worse than the baseline"""
+    regressions = []
+    for key, measured in results.items():
+        if key not in baseline:
+            continue
+        for metric in ['secs', 'peak_mib']:
+            limit = max(baseline[key][metric] * (1 + tolerance),
+                        baseline[key][metric] + _NOISE_FLOOR[metric])
+            if measured[metric] > limit:
+                regressions.append(
+                    f'{key} {metric}: {measured[metric]} > '
+                    f'{baseline[key][metric]} (+{tolerance:.0%})')
+    return regressions
+
+
+def main(argv) -> None:
+    """ Entry point of the benchmark"""
+    del argv
+
+    with contextlib.ExitStack() as stack:
+        workdir = _WORKDIR.value or stack.enter_context(
+            tempfile.TemporaryDirectory())
+        pathlib.Path(workdir).mkdir(parents=True, exist_ok=True)
+
+        results = {}
+        print(f'{"size/mode":<16} {"file MiB":>9} {"secs":>9} '
+              f'{"peak MiB":>9} {"outages":>8}')
+        for size in _SIZES.value:
+            resultsxml_file = generate_resultsxml(
+                workdir, size, _OUTAGE_EVERY_SECS.value, _OUTAGE_SECS.value)
+            file_mib = resultsxml_file.stat().st_size / 2**20
+            for mode in _MODES.value:
+                key = f'{size}/{mode}'
+                results[key] = benchmark_parse(resultsxml_file, mode,
+                                               _REPEATS.value)
+                print(f'{key:<16} {file_mib:>9.1f} '
+                      f'{results[key]["secs"]:>9.4f} '
+                      f'{results[key]["peak_mib"]:>9.3f} '
+                      f'{results[key]["outage_windows"]:>8}')
+
+    if _RESULTS_FILE.value:
+        with open(_RESULTS_FILE.value, 'w', encoding='utf-8') as results_fh:
+            json.dump(results, results_fh, indent=2)
+
+    if _BASELINE_FILE.value:
+        with open(_BASELINE_FILE.value, encoding='utf-8') as baseline_fh:
+            baseline = json.load(baseline_fh)
+        regressions = find_regressions(results, baseline, _TOLERANCE.value)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regression against {_BASELINE_FILE.value}')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that acts as entrypoint to excerpt the logs of a past run.
+
+The logs are excerpted for the outage windows of the run plus a margin,
+found in the DB hosts logs by their timestamps, into the run directory.
+
+ex.: python excerpt.py -j site.json -r logs/1658003923_Jul1622_133843_testing
+"""
+import os
+import sys
+from absl import app, flags
+from src.common import (cm1_json_file_flag, cm4_excerptor, cm6_paramiko,
+                        cm9_bulk_analyzer)
+from src.common.cm2_parse_resultsxml import ParseSwingbenchRunXML
+
+_JSON_FILE = flags.DEFINE_string(
+    'json_file',
+    None,
+    'Json file containing site-specific constants',
+    short_name='j',
+    required=True,
+)
+
+_RUN_DIR = flags.DEFINE_string(
+    'run_dir',
+    default=None,
+    help='The <run_id>_<scenario> directory of the run, holding its results',
+    short_name='r',
+    required=True,
+)
+
+_MARGIN_SECS = flags.DEFINE_integer(
+    'margin_secs',
+    default=300,
+    help='Seconds excerpted before the first & after the last outage window',
+)
+
+_COMPRESS_EXCERPTS = flags.DEFINE_bool(
+    'compress_excerpts',
+    default=False,
+    help=(
+        'Compress the log excerpts on the DB hosts (zstd or gzip) for the '
+        'transfer to the control node, worth it over slow links'
+    ),
+)
+
+_FILTER_EXCERPTS = flags.DEFINE_bool(
+    'filter_excerpts',
+    default=False,
+    help=(
+        'Only excerpt the log lines matching the `excerpt_filters` of the '
+        'json file, filtered on the DB hosts'
+    ),
+)
+
+
+def main(argv) -> None:
+    """ Entry point of the excerpt of a past run"""
+    del argv
+
+    run = cm9_bulk_analyzer.run_dir_of(_RUN_DIR.value)
+    if run is None:
+        sys.exit(f'{_RUN_DIR.value} is not a <run_id>_<scenario> directory')
+
+    parse_swingbench_run = ParseSwingbenchRunXML(
+        resultsxml_file=os.path.join(run.path, f'{run.run_id}.xml'),
+        streaming=True)
+    parse_swingbench_run.parse_swingbench_resultsxml()
+    window = cm4_excerptor.outage_time_window(
+        parse_swingbench_run.outage_windows, _MARGIN_SECS.value)
+    if window is None:
+        sys.exit(f'No outage window in the results of {run.run_id}')
+
+    cm1_json_file_flag.deserialize_json()
+    excerptor_inst = cm4_excerptor.ExcerptorCls(
+        run.run_id, run.path, compress=_COMPRESS_EXCERPTS.value)
+    excerpt_failures = excerptor_inst.excerpt_logs_in_window(
+        *window, apply_filters=_FILTER_EXCERPTS.value)
+    cm6_paramiko.connection_pool.close_all()
+    if excerpt_failures:
+        sys.exit(f'The logs could not be excerpted for: {excerpt_failures}')
+
+
+if __name__ == '__main__':
+    app.run(main)
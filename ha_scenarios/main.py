@@ -15,16 +15,17 @@
 # limitations under the License.
 
 """Module that acts as entrypoint for command line invocation."""
+import concurrent.futures
 import datetime
-import time
 import pathlib
+import time
 from absl import app, flags
 from src.common import cm1_json_file_flag
 from src.common.cm2_parse_resultsxml import ParseSwingbenchRunXML
 from src.common.cm3_logging import LoggerCls
-from src.common import cm4_tailing_cls
-from src.common.cm5_setup_swingbench_return_sbtokens import Swingbench
-from src.common.cm6_paramiko import ClientCls
+from src.common import cm4_excerptor
+from src.common.cm5_setup_swingbench import Swingbench
+from src.common import cm6_paramiko
 
 # the dict _RUNTIME_SCENARIO_DICT is based on prior benchmarking runs at:
 # go/bmx-oracle-rac:failover-benchmarks
@@ -76,6 +77,79 @@ _LOG_DEST = flags.DEFINE_string(
     short_name='l',
 )
 
+_STOP_AFTER_RECOVERY_SECS = flags.DEFINE_integer(
+    'stop_after_recovery_secs',
+    default=60,
+    help=(
+        'Stop the Swingbench workload once it stayed recovered from the '
+        'outage for this many seconds, 0 runs it for the full scenario '
+        'runtime'
+    ),
+)
+
+_MAX_RAMPUP_SECS = flags.DEFINE_integer(
+    'max_rampup_secs',
+    default=180,
+    help=(
+        'Longest wait for the Swingbench workload to reach a steady TPS '
+        'before the fault injection'
+    ),
+)
+
+_COMPRESS_EXCERPTS = flags.DEFINE_bool(
+    'compress_excerpts',
+    default=False,
+    help=(
+        'Compress the log excerpts on the DB hosts (zstd or gzip) for the '
+        'transfer to the control node, worth it over slow links'
+    ),
+)
+
+_EXCERPT_TRANSPORT = flags.DEFINE_enum(
+    'excerpt_transport',
+    default='exec',
+    enum_values=list(cm4_excerptor.TRANSPORTS),
+    help=(
+        'How the log excerpts are pulled from the DB hosts: exec runs '
+        '`sudo tail`, sftp reads the logs the SSH user may read over SFTP '
+        '& falls back to exec for the others'
+    ),
+)
+
+_FILTER_EXCERPTS = flags.DEFINE_bool(
+    'filter_excerpts',
+    default=False,
+    help=(
+        'Only excerpt the log lines matching the `excerpt_filters` of the '
+        'json file, filtered on the DB hosts'
+    ),
+)
+
+_SSH_CONNECT_TIMEOUT_SECS = flags.DEFINE_float(
+    'ssh_connect_timeout_secs',
+    default=cm6_paramiko.ClientCls.connect_timeout,
+    help=(
+        'Longest wait for each of the TCP connect, the SSH banner & the '
+        'authentication when connecting to a DB host'
+    ),
+)
+
+_SSH_KEEPALIVE_SECS = flags.DEFINE_float(
+    'ssh_keepalive_secs',
+    default=cm6_paramiko.ClientCls.keepalive_secs,
+    help='Interval of the keepalives sent on the SSH connections',
+)
+
+_SSH_DEAD_PEER_SECS = flags.DEFINE_float(
+    'ssh_dead_peer_secs',
+    default=cm6_paramiko.ClientCls.dead_peer_secs,
+    help=(
+        'Drop an SSH connection once the DB host did not acknowledge data '
+        'for this long, ex.: after a kernel panic, instead of hanging for '
+        'the OS TCP timeout'
+    ),
+)
+
 run_id = datetime.datetime.now().strftime(
     '%s_%b%d%y_%H%M%S')  # ex.: 1657669952_Jul1222_165232
 
@@ -131,6 +205,14 @@ def process_input_flags():
         global NODE_TO_TEST  # pylint: disable=global-statement
         NODE_TO_TEST = deserialized_data["nodes"][1]["host_ip"]
 
+    # process the _SSH_* flags into the options of the pooled connections
+    cm6_paramiko.connection_pool.client_options.update(
+        connect_timeout=_SSH_CONNECT_TIMEOUT_SECS.value,
+        banner_timeout=_SSH_CONNECT_TIMEOUT_SECS.value,
+        auth_timeout=_SSH_CONNECT_TIMEOUT_SECS.value,
+        keepalive_secs=_SSH_KEEPALIVE_SECS.value,
+        dead_peer_secs=_SSH_DEAD_PEER_SECS.value)
+
 
 def main(argv) -> None:
     """ Entry point to all the modules"""
@@ -158,20 +240,43 @@ def main(argv) -> None:
         f"Swingbench runtime: {sb_runtime} for scenario: {_SCENARIO.value}")
     swingbench_obj = Swingbench(sb_runtime, run_id, LOG_LOCATION)
     swingbench_cmd_tokens = swingbench_obj.generate_swingbench_tokens()
-    swingbench_obj.run_swingbench(swingbench_cmd_tokens)
+    # connect to all nodes while Swingbench ramps up, the connections are
+    # pooled for the HWMs, the fault injection & the excerpts
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        warm_future = executor.submit(
+            cm6_paramiko.connection_pool.warm,
+            [node['host_ip'] for node in deserialized_data['nodes']],
+            deserialized_data['ssh_user_name'],
+            deserialized_data['ssh_key_file'])
+        swingbench_obj.run_swingbench(swingbench_cmd_tokens,
+                                      _MAX_RAMPUP_SECS.value)
+        warm_failures = warm_future.result()
+    if warm_failures:
+        logger_obj.logger.error(
+            f'Could not connect during the ramp up to: {warm_failures}')
 
     logger_obj.logger.info(
         f'The Swingbench cmd tokens are: {swingbench_cmd_tokens}')
 
     # Record high watermarks of ASM, CRS, RDBMS alert logs in both RAC nodes
-    excerptor_inst = cm4_tailing_cls.ExcerptorCls(run_id, LOG_LOCATION)
+    excerptor_inst = cm4_excerptor.ExcerptorCls(
+        run_id, LOG_LOCATION, compress=_COMPRESS_EXCERPTS.value,
+        transport=_EXCERPT_TRANSPORT.value)
     # tail_cmds_nodeee2 = generate_get_hwm_cmds_for_given_host(1)
-    excerptor_inst.generate_get_hwm_groupby_host()
+    hwm_failures = excerptor_inst.generate_get_hwm_groupby_host()
+    if hwm_failures:
+        # the logs of these nodes cannot be excerpted since their HWMs were
+        # not recorded
+        logger_obj.logger.error(
+            f'Could not record the high watermarks of: {hwm_failures}')
 
     # send hwms to logger
     logger_obj.logger.info(
         f'The high watermarks of the logs are:{excerptor_inst.tail_cmds_dict}')
 
+    # recorded for the offline analysis of the run (see analyze.py)
+    logger_obj.logger.info(f'Fault injection node: {NODE_TO_TEST}')
+
     # connect to BMX backend hosts and run failure scenario commands
     # This is the traffic director in main()
     if _SCENARIO.value == 'testing':
@@ -179,20 +284,41 @@ def main(argv) -> None:
     elif _SCENARIO.value == 'oracleinst_down':
         _scenario_oracleinst_down(NODE_TO_TEST)
 
-    # Parse the swingbench results xml to deduce the failover latency
-    sb_results_xml_filename = str(
-        pathlib.PurePath(LOG_LOCATION, "".join([run_id, ".xml"])))
-
     hh, mm = sb_runtime.split(':')
     sb_runtime_secs = int(hh) * 3600 + int(mm) * 60
 
-    # We add 60s to Swingbench runtime to avoid the error:
-    # FileNotFoundError: [Errno 2] No such file or directory:
-    # '/home/jcnarasimhan/PycharmProjects/hadr/logs/1657844727_Jul1422_172527.xml'
+    # The results xml is only written once Swingbench exits after its
+    # runtime, so it's waited for up to 60s more than the runtime; but
+    # no longer than it takes for the file to show up (see below)
     sb_blocking_time = sb_runtime_secs + 60
-    logger_obj.logger.info(f'We are now going to sleep for {sb_blocking_time}')
+    sb_deadline = time.monotonic() + sb_blocking_time
+
+    # Keep watching the TPS printed by charbench live from where the ramp up
+    # wait stopped, most scenarios recover within a couple of minutes of
+    # their runtime of up to 30 minutes
+    monitor = swingbench_obj.live_monitor
+    stop_after_recovery_secs = _STOP_AFTER_RECOVERY_SECS.value or float('inf')
+    monitor.stop_after_recovery_secs = stop_after_recovery_secs
+    logger_obj.logger.info(f'Watching {monitor.sb_timeseries_file} for up to '
+                           f'{sb_blocking_time} secs')
+    sb_process = swingbench_obj.swingbench_process
+    if monitor.watch(sb_blocking_time,
+                     is_running=lambda: sb_process.poll() is None):
+        logger_obj.logger.info(
+            f'Recovered from the outage for {stop_after_recovery_secs} secs: '
+            f'{monitor.outage_windows[-1]}, stopping the workload')
+        # charbench writes the results xml on its way out
+        swingbench_obj.stop_swingbench()
+
+    # Wait for Swingbench to exit & its results xml to be completely written
+    if not swingbench_obj.wait_for_completion(
+            max(sb_deadline - time.monotonic(), 0)):
+        logger_obj.logger.error(
+            f'No complete results xml {swingbench_obj.sb_results_xml_filename}'
+            f' within {sb_blocking_time} secs of the fault injection')
 
-    time.sleep(sb_blocking_time)
+    # Parse the swingbench results xml to deduce the failover latency
+    sb_results_xml_filename = swingbench_obj.sb_results_xml_filename
 
     # parse the generated xml file from the swingbench run
     # common_mod_01_parse_resultsxml.parse_swingbench_resultsxml(sb_results_xml_filename)
@@ -200,7 +326,13 @@ def main(argv) -> None:
     parse_swingbench_run.parse_swingbench_resultsxml()
 
     # Get the logs generated for the duration of test
-    excerptor_inst.excerpt_logs()
+    excerpt_failures = excerptor_inst.excerpt_logs(
+        apply_filters=_FILTER_EXCERPTS.value)
+    if excerpt_failures:
+        logger_obj.logger.error(
+            f'The logs could not be excerpted for: {excerpt_failures}')
+
+    cm6_paramiko.connection_pool.close_all()
 
 
 if __name__ == '__main__':
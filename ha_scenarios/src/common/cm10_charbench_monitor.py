@@ -0,0 +1,297 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that detects outages live from the verbose charbench output
+
+Swingbench.run_swingbench() runs charbench with `-v`, which prints a line per
+second to <log_location>/<run_id>_swingbench_timeseries, ex.:
+
+    Time      Users       TPM      TPS     Errors
+    13:38:45  [0/60]        0        0        0
+    ...
+    13:39:20  [60/60]    6840      127        0
+    ...
+
+The TPS column is located from the header line, so additional verbose
+columns do not matter. Each reading is handed over to the same
+OutageWindowDetector the results xml parser uses, so the outage start &
+recovery seen live are exactly the ones the parser reports afterwards.
+
+Before the fault injection, wait_steady() blocks till the workload ramped up
+to a steady state (see SteadyStateDetector). Once an outage has been
+recovered from and the TPS stayed out of outage for
+`stop_after_recovery_secs`, the workload can be stopped right away instead
+of running for the full scenario runtime.
+"""
+import codecs
+import collections
+import datetime
+import pathlib
+import re
+import sys
+import time
+
+import numpy as np
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent.parent))  # current directory structure is:
+# <root> > src > common > <common module like the current  one>
+
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm7_tps_timeseries
+
+_TIME_OF_DAY = re.compile(r'^(\d{1,2}):(\d{2}):(\d{2})$')
+
+# seconds between two reads of the timeseries file once at its end
+_POLL_INTERVAL_SECS = 0.5
+
+
+class SteadyStateDetector:
+    """Rolling mean & variance test of the workload having ramped up.
+
+    The TPS is steady once, over the last `window_readings` readings:
+    * the mean is above 0,
+    * the coefficient of variation (standard deviation / mean) is at most
+      `max_cv`, ex.: 0.1 allows a jitter of 110-130 TPS but not a ramp up
+      or dips to a few TPS,
+    * the mean drifted by at most `max_mean_drift` (relative) from the mean
+      of the window before, ruling out a slow but smooth ramp up.
+
+    The sums of both windows are updated per reading, so each reading costs
+    O(1) irrespective of the window length.
+    """
+
+    def __init__(self, window_readings: int = 20, max_cv: float = 0.1,
+                 max_mean_drift: float = 0.05):
+        self.window_readings = window_readings
+        self.max_cv = max_cv
+        self.max_mean_drift = max_mean_drift
+        self.mean = 0.0
+        self.cv = float('inf')
+        self._readings = collections.deque()  # both windows, oldest first
+        self._sum = 0  # of the last window
+        self._sum_sq = 0
+        self._previous_sum = 0  # of the window before
+
+    def feed(self, tps: int) -> bool:
+        """Add the next reading, True if the TPS is steady with it"""
+        self._readings.append(tps)
+        self._sum += tps
+        self._sum_sq += tps * tps
+        if len(self._readings) > self.window_readings:
+            # the oldest reading of the last window moves to the one before
+            moved = self._readings[-self.window_readings - 1]
+            self._sum -= moved
+            self._sum_sq -= moved * moved
+            self._previous_sum += moved
+        if len(self._readings) > 2 * self.window_readings:
+            self._previous_sum -= self._readings.popleft()
+
+        if len(self._readings) < 2 * self.window_readings:
+            return False
+
+        self.mean = self._sum / self.window_readings
+        if self.mean <= 0:
+            return False
+        variance = max(self._sum_sq / self.window_readings - self.mean ** 2,
+                       0.0)
+        self.cv = variance ** 0.5 / self.mean
+        previous_mean = self._previous_sum / self.window_readings
+        return (self.cv <= self.max_cv and
+                abs(self.mean - previous_mean) <=
+                self.max_mean_drift * self.mean)
+
+
+class LiveOutageMonitorCls:
+    """Tails the charbench timeseries file & tracks the outage windows.
+
+    An example invocation, blocking till the workload ramped up (for at
+    most 3 minutes) & then till it recovered for 60s:
+
+        monitor = LiveOutageMonitorCls(sb_timeseries_file,
+                                       stop_after_recovery_secs=60)
+        monitor.wait_steady(timeout_secs=180, is_running=process_is_running)
+        ...  # inject the fault
+        if monitor.watch(timeout_secs=1260, is_running=process_is_running):
+            ...  # stop the workload early
+
+    `outage_windows` holds the windows closed so far, as a list of
+    cm7_tps_timeseries.OutageWindow.
+    """
+
+    def __init__(self, sb_timeseries_file: str,
+                 stop_after_recovery_secs: float = 60,
+                 run_date: datetime.date = None,
+                 steady_state_detector: SteadyStateDetector = None):
+        self.sb_timeseries_file = sb_timeseries_file
+        self.stop_after_recovery_secs = stop_after_recovery_secs
+        self.steady_state_detector = (steady_state_detector or
+                                      SteadyStateDetector())
+        self.steady = False  # latest reading found the TPS steady
+        # charbench only prints the time of day
+        self.run_date = run_date or datetime.date.today()
+        self.outage_windows = []
+        self._detector = cm7_tps_timeseries.OutageWindowDetector()
+        self._tps_col = None
+        self._last_secs_of_run = None
+        self._day_offset = 0
+        self._last_timestamp = 0
+        self._pending_text = ''
+        # read position in the file, kept across watch() & wait_steady()
+        self._offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def watch(self, timeout_secs: float, is_running=None) -> bool:
+        """Tail the file till recovery was sustained, True if that happened
+
+        Returns False once `timeout_secs` elapsed or, if given, once the
+        `is_running()` callable tells the workload is no longer running and
+        the file has been read to its end.
+        """
+        return self._tail(timeout_secs, is_running, self.recovery_sustained)
+
+    def wait_steady(self, timeout_secs: float, is_running=None) -> bool:
+        """Tail the file till the TPS is steady, True if that happened
+
+        Returns False on timeout or workload exit, like watch().
+        """
+        return self._tail(timeout_secs, is_running, lambda: self.steady)
+
+    def _tail(self, timeout_secs: float, is_running, done) -> bool:
+        """Feed what gets appended to the file till `done()` returns True"""
+        deadline = time.monotonic() + timeout_secs
+        # lines read by an earlier call but not consumed once it was done
+        if self.feed_text('', done):
+            return True
+
+        timeseries_fh = None
+        try:
+            while time.monotonic() < deadline:
+                if timeseries_fh is None:
+                    try:
+                        # pylint: disable-next=consider-using-with
+                        timeseries_fh = open(self.sb_timeseries_file, 'rb')
+                    except FileNotFoundError:
+                        time.sleep(_POLL_INTERVAL_SECS)
+                        continue
+                    timeseries_fh.seek(self._offset)
+
+                running = is_running is None or is_running()
+                chunk = timeseries_fh.read()
+                if chunk:
+                    self._offset += len(chunk)
+                    if self.feed_text(self._decoder.decode(chunk), done):
+                        return True
+                elif not running:
+                    return False
+                else:
+                    time.sleep(_POLL_INTERVAL_SECS)
+            return False
+        finally:
+            if timeseries_fh is not None:
+                timeseries_fh.close()
+
+    def feed_text(self, text: str, done=None) -> bool:
+        """Consume a piece of the timeseries output, line by line
+
+        A trailing incomplete line is kept till its newline arrives. If the
+        `done()` callable returns True after a line, the lines after it are
+        kept for the next call & True is returned.
+        """
+        lines = (self._pending_text + text).split('\n')
+        self._pending_text = lines.pop()
+        for idx, line in enumerate(lines):
+            self.feed_line(line)
+            if done is not None and done():
+                self._pending_text = '\n'.join(lines[idx + 1:] +
+                                               [self._pending_text])
+                return True
+        return False
+
+    def feed_line(self, line: str) -> None:
+        """Consume one line, the header or a per second reading"""
+        tokens = line.split()
+        if 'TPS' in tokens:
+            self._tps_col = tokens.index('TPS')
+            return
+        if (self._tps_col is None or len(tokens) <= self._tps_col or
+                not tokens[0] or _TIME_OF_DAY.match(tokens[0]) is None):
+            return
+        try:
+            tps = int(tokens[self._tps_col].replace(',', ''))
+        except ValueError:
+            return
+
+        was_in_outage = self.in_outage
+        self._last_timestamp = self._epoch_ms(tokens[0])
+        self._detector.feed(np.array([[self._last_timestamp, tps]],
+                                     dtype=np.int64))
+        self.outage_windows = self._detector.outage_windows
+        self.steady = self.steady_state_detector.feed(tps)
+
+        if self.in_outage and not was_in_outage:
+            print(f'Outage started at {tokens[0]} (TPS: {tps})')
+        elif was_in_outage and not self.in_outage:
+            print(f'Recovered from outage at {tokens[0]} (TPS: {tps}) after '
+                  f'{self.outage_windows[-1].duration} secs')
+
+    @property
+    def in_outage(self) -> bool:
+        """True while the latest reading is inside an outage window"""
+        return self._detector.in_outage
+
+    def recovery_sustained(self) -> bool:
+        """True once the last outage ended stop_after_recovery_secs ago"""
+        if not self.outage_windows or self.in_outage:
+            return False
+        recovered_secs = (self._last_timestamp -
+                          self.outage_windows[-1].end) / 1000
+        return recovered_secs >= self.stop_after_recovery_secs
+
+    def _epoch_ms(self, time_of_day: str) -> int:
+        """Epoch ms of a HH:MM:SS reading, rolling over past midnight"""
+        hours, minutes, secs = (int(group) for group in
+                                _TIME_OF_DAY.match(time_of_day).groups())
+        secs_of_day = hours * 3600 + minutes * 60 + secs
+        if (self._last_secs_of_run is not None and
+                secs_of_day < self._last_secs_of_run - 43200):
+            self._day_offset += 1
+        self._last_secs_of_run = secs_of_day
+
+        reading_date = self.run_date + datetime.timedelta(days=self._day_offset)
+        reading_dt = datetime.datetime.combine(
+            reading_date, datetime.time()) + datetime.timedelta(
+                seconds=secs_of_day)
+        return int(reading_dt.timestamp() * 1000)
+
+
+def charbench_monitor_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    readings = [0, 0, 120, 118, 0, 0, 0, 45, 121, 119, 122, 124]
+    sample_text = 'Time      Users       TPM      TPS     Errors\n' + ''.join(
+        f'13:38:{45 + i}  [60/60]  {tps * 60:>7}  {tps:>7}  0\n'
+        for i, tps in enumerate(readings))
+
+    monitor = LiveOutageMonitorCls('/dev/null', stop_after_recovery_secs=3)
+    for line in sample_text.splitlines(keepends=True):
+        monitor.feed_text(line)
+        print(f'{line.rstrip():<50} in_outage: {monitor.in_outage}, '
+              f'recovery_sustained: {monitor.recovery_sustained()}')
+    print(monitor.outage_windows)
+
+
+if __name__ == '__main__':
+    charbench_monitor_standalone_runner()
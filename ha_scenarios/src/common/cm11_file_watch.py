@@ -0,0 +1,152 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that waits for a file to be written, woken up by inotify
+
+charbench writes the results xml (<log_location>/<run_id>.xml) on its way
+out, so the file may show up a little after the workload exited. Instead
+of sleeping for the worst case, wait_for_file() watches the directory of
+the file through the Linux inotify API and re-checks the file each time
+it is closed after writing or moved into place:
+
+    wait_for_file(sb_results_xml_filename, timeout_secs=60,
+                  is_complete=results_xml_complete)
+
+inotify is used through ctypes, so there is no extra dependency. Where it
+is not available (ex.: macOS control node), the file is polled instead.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import pathlib
+import select
+import struct
+import time
+
+# from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len of name
+
+# seconds between two checks of the file when inotify is not available
+_POLL_INTERVAL_SECS = 0.5
+
+
+class InotifyCls:
+    """Minimal ctypes wrapper of the inotify API for watching a directory.
+
+    Raises OSError if inotify is not available on the platform.
+    """
+
+    def __init__(self, directory: str,
+                 mask: int = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE):
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f'inotify_add_watch failed for {directory}')
+
+    def read_names(self, timeout_secs: float) -> list:
+        """Names of the files with an event, [] if none within the timeout"""
+        readable, _, _ = select.select([self._fd], [], [],
+                                       max(timeout_secs, 0))
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(buffer):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            # the name is NUL padded to an alignment boundary
+            names.append(os.fsdecode(
+                buffer[offset:offset + name_len].rstrip(b'\0')))
+            offset += name_len
+        return names
+
+    def close(self) -> None:
+        """Release the inotify file descriptor & its watch"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def wait_for_file(file_path: str, timeout_secs: float,
+                  is_complete=os.path.exists) -> bool:
+    """Block till `is_complete(file_path)` is True, False on timeout
+
+    The check is done right away and then every time the file is created,
+    closed after writing or moved into its directory.
+    """
+    deadline = time.monotonic() + timeout_secs
+    file_path = pathlib.Path(file_path)
+    try:
+        inotify = InotifyCls(str(file_path.parent))
+    except OSError:
+        inotify = None
+
+    try:
+        # checked after the watch is in place, so no event can be missed
+        while not is_complete(file_path):
+            remaining_secs = deadline - time.monotonic()
+            if remaining_secs <= 0:
+                return False
+            if inotify is None:
+                time.sleep(min(_POLL_INTERVAL_SECS, remaining_secs))
+                continue
+            while file_path.name not in inotify.read_names(remaining_secs):
+                remaining_secs = deadline - time.monotonic()
+                if remaining_secs <= 0:
+                    return is_complete(file_path)
+        return True
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+
+def file_watch_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    sample_file = pathlib.Path('/tmp/file_watch_sample.txt')
+    if sample_file.exists():
+        sample_file.unlink()
+
+    print(f'Waiting 60 secs for: echo hello > {sample_file}')
+    print(f'Written: {wait_for_file(sample_file, timeout_secs=60)}')
+
+
+if __name__ == '__main__':
+    file_watch_standalone_runner()
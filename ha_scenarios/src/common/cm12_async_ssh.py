@@ -0,0 +1,192 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to run cmds in the BMX DB backends from asyncio code
+
+run() awaits the CommandResult of a cmd & start() returns an
+AsyncCommandCls whose stdout & stderr are asyncio.StreamReader, so their
+lines can be iterated over as they arrive:
+
+    results = await asyncio.gather(*(cm12_async_ssh.run(host, 'uptime')
+                                     for host in hosts))
+
+    async_cmd = await cm12_async_ssh.start(host, 'tail -f alert.log')
+    async for line in async_cmd.stdout:
+        ...
+    async_cmd.close()
+
+The cmds run on channels of the pooled connections of cm6_paramiko. The
+channels are read by the event loop itself, woken up by their file
+descriptor, so any number of cmds & streams are driven without a thread
+per channel. Only the blocking steps of paramiko (connecting, opening a
+channel & the exit status following the EOF) are run in the default
+executor of the loop.
+"""
+import asyncio
+import functools
+import json
+import pathlib
+import sys
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent.parent))  # current directory structure is:
+# <root> > src > common > <common module like the current  one>
+
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm1_json_file_flag, cm6_paramiko
+
+# bytes received from a channel at a time
+_RECV_BYTES = 32 * 1024
+
+# longest line the stdout & stderr readers hand out
+_LINE_LIMIT_BYTES = 1024 * 1024
+
+
+class AsyncCommandCls:
+    """A cmd running on a channel, its o/p read by the running event loop.
+
+    stdout & stderr are asyncio.StreamReader fed as the o/p arrives, at
+    the EOF of the cmd wait() returns its exit status. The channel stops
+    being read while either reader holds more than twice _LINE_LIMIT_BYTES
+    & resumes once it was read down to the limit. The o/p then waits in
+    the window of the channel, which stalls the cmd when full, instead of
+    piling up in memory. So both readers have to be read, as by run().
+    """
+
+    def __init__(self, channel, command: str):
+        self.channel = channel
+        self.command = command
+        self._loop = asyncio.get_running_loop()
+        self.stdout = asyncio.StreamReader(limit=_LINE_LIMIT_BYTES)
+        self.stderr = asyncio.StreamReader(limit=_LINE_LIMIT_BYTES)
+        # the readers call pause_reading() & resume_reading() of their
+        # transport as their buffer grows past & drains below the limit
+        self.stdout.set_transport(self)
+        self.stderr.set_transport(self)
+        self._paused_readers = 0
+        self._eof = self._loop.create_future()
+        # the fd of a channel turns readable with o/p on stdout or stderr &
+        # stays so after the EOF
+        self._fileno = channel.fileno()
+        self._loop.add_reader(self._fileno, self._on_readable)
+
+    def _on_readable(self) -> None:
+        """Feed the o/p received so far to the readers till one is full"""
+        while not self._paused_readers and self.channel.recv_ready():
+            self.stdout.feed_data(self.channel.recv(_RECV_BYTES))
+        while (not self._paused_readers and
+               self.channel.recv_stderr_ready()):
+            self.stderr.feed_data(self.channel.recv_stderr(_RECV_BYTES))
+        if self._paused_readers or self.channel.recv_ready() or \
+                self.channel.recv_stderr_ready():
+            return
+        if self.channel.eof_received or self.channel.closed:
+            self._stop_reading()
+
+    def pause_reading(self) -> None:
+        """Stop reading the channel, called by a reader holding too much"""
+        if not self._paused_readers:
+            self._loop.remove_reader(self._fileno)
+        self._paused_readers += 1
+
+    def resume_reading(self) -> None:
+        """Read the channel again, called by a reader read down the limit"""
+        self._paused_readers -= 1
+        if not self._paused_readers and not self._eof.done():
+            self._loop.add_reader(self._fileno, self._on_readable)
+
+    def _stop_reading(self) -> None:
+        """Stop watching the channel & end the readers"""
+        if self._eof.done():
+            return
+        self._loop.remove_reader(self._fileno)
+        self.stdout.feed_eof()
+        self.stderr.feed_eof()
+        self._eof.set_result(None)
+
+    async def wait(self) -> int:
+        """Wait for the cmd to exit & return its exit status
+
+        -1 if the channel closed without one, ex.: the host went down.
+        """
+        await self._eof
+        # the exit status comes right after the EOF
+        return await self._loop.run_in_executor(
+            None, self.channel.recv_exit_status)
+
+    def close(self) -> None:
+        """Close the channel, which ends the cmd if still running"""
+        self._stop_reading()
+        self.channel.close()
+
+
+async def start(host: str, command: str, username: str = None,
+                key_file: str = None) -> AsyncCommandCls:
+    """Start the cmd on the host, return it to read its o/p as it arrives
+
+    username & key_file default to the ssh_user_name & ssh_key_file of the
+    site json. Failures are raised as by cm6_paramiko, ex.: SSHPeerDeadError
+    if the host stopped answering.
+    """
+    loop = asyncio.get_running_loop()
+    client = await loop.run_in_executor(None, functools.partial(
+        cm6_paramiko.connection_pool.get, host=host,
+        username=username or cm1_json_file_flag.deserialized_data[
+            "ssh_user_name"],
+        key_file=key_file or cm1_json_file_flag.deserialized_data[
+            "ssh_key_file"]))
+    channel = await loop.run_in_executor(None, client.open_channel, command)
+    return AsyncCommandCls(channel, command)
+
+
+async def run(host: str, command: str, username: str = None,
+              key_file: str = None,
+              timeout: float = None) -> cm6_paramiko.CommandResult:
+    """Run the cmd on the host, return its CommandResult once it exited
+
+    With `timeout` (secs), the channel is closed & TimeoutError raised if
+    the cmd is not done by then.
+    """
+    async_cmd = await start(host, command, username, key_file)
+    try:
+        stdout, stderr, exit_status = await asyncio.wait_for(asyncio.gather(
+            async_cmd.stdout.read(), async_cmd.stderr.read(),
+            async_cmd.wait()), timeout)
+    finally:
+        async_cmd.close()
+    return cm6_paramiko.CommandResult(command, exit_status, stdout, stderr)
+
+
+def async_ssh_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    json_file = "".join([str(THIS_DIR), '/../../tests/testdata/site_constants'
+                                        '.json'])
+    with open(json_file, encoding="utf-8") as json_constants_fh:
+        cm1_json_file_flag.deserialized_data = json.load(json_constants_fh)
+    hosts = [node['host_ip']
+             for node in cm1_json_file_flag.deserialized_data['nodes']]
+
+    async def run_on_all_hosts():
+        return await asyncio.gather(*(run(host, 'hostname; date')
+                                      for host in hosts))
+
+    for host, result in zip(hosts, asyncio.run(run_on_all_hosts())):
+        print(host, result)
+    cm6_paramiko.connection_pool.close_all()
+
+
+if __name__ == '__main__':
+    async_ssh_standalone_runner()
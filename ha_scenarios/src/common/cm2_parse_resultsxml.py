@@ -18,6 +18,28 @@
 import xml.etree.ElementTree as ET
 import datetime
 import pathlib
+import sys
+
+import numpy as np
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent.parent))  # current directory structure is:
+# <root> > src > common > <common module like the current  one>
+
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm7_tps_timeseries
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm8_results_cache
+
+_SWINGBENCH_NS = '{http://www.dominicgiles.com/swingbench}'
+
+# size of the reads from the results xml file in the streaming mode
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+# version of the parsing & detection logic, to be bumped with any change that
+# alters the decoded readings or the detected windows so that the results
+# cached by the earlier versions are invalidated
+PARSER_VERSION = 2
 
 '''
 1)
@@ -75,10 +97,31 @@ class ParseSwingbenchRunXML:  # pylint: disable=too-few-public-methods,too-many-
     instance_parse_swingbench = ParseSwingbenchRunXML(resultsxml_file=sample_xml_filename)
     instance_parse_swingbench.parse_swingbench_resultsxml()
 
+    For results files from multi-hour soak runs, pass `streaming=True` to the
+    constructor to keep the memory footprint flat irrespective of run length.
+
+    Every outage window of the run (rolling failovers, relocations, periodic
+    faults of a soak test) is available in `outage_windows` as a list of
+    cm7_tps_timeseries.OutageWindow, while workload_start, outage_start,
+    outage_end & outage_duration continue to describe the first outage.
+    Windows of partially degraded throughput are available in
+    `brownout_windows` as a list of cm7_tps_timeseries.BrownoutWindow.
+
+    With `use_cache=True` the decoded TPS series & the windows are stored in
+    a sidecar cache (see cm8_results_cache) next to the results file, or in
+    `cache_dir`, and a later parse of the unchanged file skips the xml
+    parsing altogether. The decoded series is then available in
+    `tps_series` and `cache_hit` tells whether it came from the cache.
 
     """
-    def __init__(self, resultsxml_file: str):
+    def __init__(self, resultsxml_file: str, streaming: bool = False,
+                 use_cache: bool = False, cache_dir: str = None):
         self.resultsxml_file = resultsxml_file
+        self.streaming = streaming
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.cache_hit = False
+        self.tps_series = None
         self.workload_start = 0
         self.outage_start = 0
         self.outage_end = 0
@@ -86,44 +129,65 @@ class ParseSwingbenchRunXML:  # pylint: disable=too-few-public-methods,too-many-
         self.outage_start_tm = None
         self.outage_end_tm = None
         self.outage_duration = None
+        self.outage_windows = []
+        self.brownout_windows = []
+        self._outage_detector = cm7_tps_timeseries.OutageWindowDetector()
+        self._brownout_detector = cm7_tps_timeseries.BrownoutDetector()
+        self._tps_chunks = []
 
     def parse_swingbench_resultsxml(self) -> None:
-        """Instance method that does parsing"""
-        tree = ET.parse(self.resultsxml_file)
+        """Instance method that does parsing
 
-        root = tree.getroot()
+        With `streaming=False` the whole xml tree is built in memory, which is
+        fine for the few minutes long scenario runs. Soak runs lasting many
+        hours should be parsed with `streaming=True`, where the results file
+        is fed to the xml parser in chunks of _STREAM_CHUNK_BYTES and the
+        <TPSReadings> text is consumed as it arrives, so that neither the tree
+        nor the full list of TPS readings is ever held in memory (unless
+        `use_cache=True`, the decoded series is what gets cached).
+        """
+        results_cache = None
+        cached_results = None
+        if self.use_cache:
+            results_cache = cm8_results_cache.ResultsCacheCls(
+                self.resultsxml_file, PARSER_VERSION, self.cache_dir)
+            cached_results = results_cache.load()
 
-        # https://docs.python.org/3/library/xml.etree.elementtree.html#example
-        for i in root.findall('.//{http://www.dominicgiles.com/swingbench'
-                              '}TPSReadings'):
-            # [:-1] to remove the trailing comma that's always in the swingbench data
-            if i.text[-1] == ",":
-                csv_timeseries = i.text[:-1]
-
-        # ts_list = csv_timeseries.split(",")
-        ts_list = [int(i) for i in csv_timeseries.split(",")]  # list comprehension conversion
-
-        idx_end = len(ts_list) - 1
-
-        for i in range(0, idx_end, 2):
-            # Till Swingbench ramps up, the TPS will be all 0s initially
-            if ts_list[i + 1] != 0 and self.outage_start == 0 \
-                    and self.workload_start == 0:
-                self.workload_start = ts_list[i]
-            # after a series of non-zero TPS, the outage contains a value of
-            # 0 for the TPS
-            elif ts_list[i + 1] == 0 and self.outage_start == 0 \
-                    and self.workload_start != 0:
-                self.outage_start = ts_list[i]
-            # after a series of zero TPS, a non-zero value of TPS > 100
-            # indicates end of outage the non-zero TPS continues till the
-            # end of the swingbench test, so exit after traversing the first
-            # non-zero
-            elif ts_list[i + 1] > 100 and self.outage_start != 0 \
-                    and self.workload_start != 0:
-                self.outage_end = ts_list[i]
-                break  # exit after encountering the first timestamp that
-                # specifies end of outage with non-zero TPS
+        if cached_results is not None:
+            self.cache_hit = True
+            self.tps_series = cached_results.tps_series
+            self._load_summary(cached_results.summary)
+        else:
+            # the content parsed is keyed before it is read
+            content_key = None
+            if results_cache is not None:
+                content_key = results_cache.content_key()
+            if self.streaming:
+                self._parse_streaming()
+            else:
+                self._parse_tree()
+
+            self.outage_windows = self._outage_detector.finish()
+            self.brownout_windows = self._brownout_detector.finish()
+            self.workload_start = self._outage_detector.workload_start
+
+        if results_cache is not None and not self.cache_hit:
+            self.tps_series = np.concatenate(self._tps_chunks) if \
+                self._tps_chunks else np.empty((0, 2), dtype=np.int64)
+            self._tps_chunks = []
+            results_cache.store(self.tps_series, self._summary(),
+                                content_key)
+
+        # the first outage window is the outage caused by the fault injection
+        # An outage still ongoing at the end of the run has no outage_end (0)
+        # and its outage_duration is counted till the last TPS reading
+        if self.outage_windows:
+            first_outage = self.outage_windows[0]
+            self.outage_start = first_outage.start
+            self.outage_end = 0 if first_outage.ongoing else first_outage.end
+            self.outage_duration = first_outage.duration
+        else:
+            self.outage_duration = 0.0
 
         self.workload_start_tm = datetime.datetime.fromtimestamp(
             self.workload_start / 1000)
@@ -131,7 +195,6 @@ class ParseSwingbenchRunXML:  # pylint: disable=too-few-public-methods,too-many-
             self.outage_start / 1000)
         self.outage_end_tm = datetime.datetime.fromtimestamp(
             self.outage_end / 1000)
-        self.outage_duration = (self.outage_end - self.outage_start) / 1000
 
         # print statement for helping with reviews, will be converted to logger
         # once logger class is reviwed and merged into codebase
@@ -142,14 +205,132 @@ class ParseSwingbenchRunXML:  # pylint: disable=too-few-public-methods,too-many-
             f'workload_start_tm: {self.workload_start_tm}, '
             f'outage_start_tm: {self.outage_start_tm}, '
             f'outage_end_tm: {self.outage_end_tm}, '
-            f'outage_duration: {self.outage_duration} secs')
+            f'outage_duration: {self.outage_duration} secs, '
+            f'outage_windows: {len(self.outage_windows)}, '
+            f'brownout_windows: {len(self.brownout_windows)}, '
+            f'cache_hit: {self.cache_hit}')
+        for window in self.outage_windows + self.brownout_windows:
+            print(window)
+
+    def _parse_tree(self) -> None:
+        """Parse the whole xml tree and scan all the TPS readings at once"""
+        tree = ET.parse(self.resultsxml_file)
+
+        root = tree.getroot()
+
+        # no <TPSReadings> => no readings, as with the streaming parse
+        csv_timeseries = ''
+        # https://docs.python.org/3/library/xml.etree.elementtree.html#example
+        for i in root.findall(f'.//{_SWINGBENCH_NS}TPSReadings'):
+            csv_timeseries = i.text
+
+        # (timestamp, TPS) pairs decoded straight into a (n, 2) int64 array
+        tps_series, _ = cm7_tps_timeseries.decode_tps_readings(csv_timeseries)
+
+        if len(tps_series):
+            self._scan_tps_series(tps_series)
+
+    def _parse_streaming(self) -> None:
+        """Feed the results file to the xml parser chunk by chunk
+
+        The parser target only keeps the trailing partial token of the
+        <TPSReadings> text between chunks.
+        """
+        target = _TPSReadingsTarget(self._scan_tps_series)
+        parser = ET.XMLParser(target=target)
+
+        with open(self.resultsxml_file, 'rb') as resultsxml_fh:
+            while True:
+                chunk = resultsxml_fh.read(_STREAM_CHUNK_BYTES)
+                if not chunk:
+                    parser.close()
+                    break
+                parser.feed(chunk)
+
+    def _scan_tps_series(self, tps_series) -> None:
+        """Hand a (n, 2) array of readings over to the detectors.
+
+        The detectors keep the state of a window still open at the end of
+        the array, so the readings may be handed over in several consecutive
+        chunks.
+        """
+        self._outage_detector.feed(tps_series)
+        self._brownout_detector.feed(tps_series)
+        if self.use_cache:
+            self._tps_chunks.append(tps_series)
+
+    def _summary(self) -> dict:
+        """Detected windows in a json serializable form for the cache"""
+        return {
+            'workload_start': self.workload_start,
+            'outage_windows': [list(window) for window in self.outage_windows],
+            'brownout_windows': [list(window) for window in
+                                 self.brownout_windows],
+        }
+
+    def _load_summary(self, summary: dict) -> None:
+        """Restore the detected windows from a cached summary"""
+        self.workload_start = summary['workload_start']
+        self.outage_windows = [cm7_tps_timeseries.OutageWindow(*window)
+                               for window in summary['outage_windows']]
+        self.brownout_windows = [cm7_tps_timeseries.BrownoutWindow(*window)
+                                 for window in summary['brownout_windows']]
+
+
+class _TPSReadingsTarget:
+    """ElementTree parser target that consumes <TPSReadings> incrementally.
+
+    The expat parser hands the text of an element over in pieces through the
+    `data()` callback. Each piece, cut at its last comma, is decoded into a
+    (n, 2) array of complete `timestamp, TPS` pairs that is passed on to
+    `consume_series`; an incomplete trailing token or an unpaired timestamp
+    is carried over to the next piece. No elements are built at all.
+    """
+
+    def __init__(self, consume_series):
+        self.consume_series = consume_series
+        self._in_tps_readings = False
+        self._partial_text = ''
+        self._unpaired = None
+
+    def start(self, tag, attrib) -> None:  # pylint: disable=unused-argument
+        """Start consuming text once the <TPSReadings> tag opens"""
+        if tag == f'{_SWINGBENCH_NS}TPSReadings':
+            self._in_tps_readings = True
+
+    def end(self, tag) -> None:
+        """Flush the last token once the <TPSReadings> tag closes"""
+        if tag == f'{_SWINGBENCH_NS}TPSReadings':
+            self._consume_text(self._partial_text)
+            self._partial_text = ''
+            self._in_tps_readings = False
+
+    def data(self, data: str) -> None:
+        """Consume the received piece of text up to its last comma"""
+        if not self._in_tps_readings:
+            return
+
+        text = self._partial_text + data
+        last_comma = text.rfind(',')
+        # the text after the last comma may continue in the next piece
+        self._partial_text = text[last_comma + 1:]
+        if last_comma != -1:
+            self._consume_text(text[:last_comma])
+
+    def close(self) -> None:
+        """Nothing is built by this target, so there is nothing to return"""
+        return None
+
+    def _consume_text(self, text: str) -> None:
+        tps_series, self._unpaired = cm7_tps_timeseries.decode_tps_readings(
+            text, self._unpaired)
+        if len(tps_series):
+            self.consume_series(tps_series)
 
 
 def parser_standalone_runner():
     """ standalone runner to run this module as a script independently """
 
-    THIS_DIR = pathlib.Path(__file__).absolute().parent # pylint: disable=invalid-name
-
     sample_xml_filename = THIS_DIR/'../../tests/testdata/1661415592_Aug2522_011952.xml'
 
     instance_parse_swingbench = ParseSwingbenchRunXML(
@@ -37,11 +37,21 @@ The above will be in addition to the following 2:
 
 
 """
+import concurrent.futures
+import gzip
+import hashlib
 import pathlib
 import sys
 import datetime
 import json
 import itertools
+import shlex
+import time
+
+try:
+    import zstandard
+except ImportError:  # optional, excerpts are compressed with gzip without it
+    zstandard = None
 
 THIS_DIR = pathlib.Path(__file__).absolute().parent
 sys.path.append(str(THIS_DIR.parent.parent))
@@ -54,13 +64,391 @@ sys.path.append(str(THIS_DIR.parent.parent))
 # pylint: disable-next=import-error,wrong-import-position
 from src.common import cm6_paramiko, cm1_json_file_flag
 
+# upper bound of the DB hosts reached over SSH at the same time
+MAX_CONCURRENT_HOSTS = 8
+
+# exec => `sudo` & `tail` over an exec channel, sftp => ranged SFTP reads of
+# the logs the SSH user may read, exec for the others
+TRANSPORTS = ('exec', 'sftp')
+
+# bytes right before the HWM whose md5 is recorded along with it
+_HWM_CHECK_BYTES = 256
+
+# Shell function printing the md5 of the _HWM_CHECK_BYTES bytes of a file
+# ($1) right before an offset ($2), ex.: its HWM. A log copied & truncated
+# in place keeps its inode & may have regrown past its HWM by the time of
+# the excerpt, only these bytes then tell it from the log of the HWM.
+_HWM_MD5_FUNCTION = """\
+hwm_md5() {{
+  n=$(($2 < {check_bytes} ? $2 : {check_bytes}))
+  tail -c +$(($2 - n + 1)) "$1" 2>/dev/null | head -c "$n" | md5sum |
+    cut -c 1-32
+}}
+"""
+
+# Remote script printing the HWM of each log given as argument, ex.:
+# 1669912 2883604 1656981700 9e107d9d372bb6826bd81d3542a419d6 <log>
+# => size, inode, mtime (epoch secs), md5 of the bytes before the size
+_HWM_SCRIPT = """\
+for f; do
+  hwm=$(/usr/bin/stat -c '%s %i %Y' "$f") || continue
+  echo "$hwm $(hwm_md5 "$f" "${hwm%% *}") $f"
+done
+"""
+
+# Remote script printing the bytes of a log appended since its HWM. If the
+# log was rotated meanwhile, the bytes past the HWM are in the rotated file
+# & the current file holds only bytes written since, so neither is read in
+# full. The log is taken as rotated unless it has the inode of the HWM, is
+# at least as large & has the md5 of the HWM. The rotated file is found by:
+# * its inode, when the log was moved aside & a new one created,
+# * being the newest sibling named <log>* at least as large as the HWM,
+#   modified since it & with its md5, when the log was copied & truncated
+#   in place.
+_EXCERPT_SCRIPT = """\
+f={logfile}; hwm={size}; ino={inode}; mtime={mtime}; md5={md5}
+set -- $(stat -c '%i %s' "$f" 2>/dev/null)
+if [ "$1" = "$ino" ] && [ "$2" -ge "$hwm" ] &&
+   [ "$(hwm_md5 "$f" "$hwm")" = "$md5" ]; then
+  exec tail -c +$((hwm + 1)) "$f"
+fi
+dir=$(dirname "$f")
+if [ "$1" = "$ino" ]; then
+  old=$(find "$dir" -maxdepth 1 -type f -name "$(basename "$f")?*" \\
+        ! -size -"$hwm"c -newermt "@$((mtime - 1))" -printf '%T@ %p\\n' |
+        sort -rn | cut -d' ' -f2- | while IFS= read -r g; do
+          if [ "$(hwm_md5 "$g" "$hwm")" = "$md5" ]; then echo "$g"; break; fi
+        done)
+else
+  old=$(find "$dir" -maxdepth 1 -type f -inum "$ino" -print -quit)
+fi
+echo "$f was rotated, bytes past the HWM read from: ${{old:-<not found>}}" >&2
+if [ -n "$old" ]; then tail -c +$((hwm + 1)) "$old"; fi
+if [ -e "$f" ]; then cat "$f"; fi
+"""
+
+# Remote script printing the lines of a log timestamped inside a window, for
+# runs whose HWMs are gone. The log is binary searched by byte offset for
+# the window start & end: each probe seeks with `tail -c +N` & reads at
+# most a block up to the next timestamp line, so the O(log(size)) probes
+# read a block each instead of the whole log. A probe finding no timestamp
+# line in its block only widens the bytes searched. These bytes are then
+# read once more, printing the lines from the first timestamp at or past
+# the window start till the first one past the window end. The timestamp
+# lines are those of the 12.2+ logs, ex.:
+# 2022-07-04T17:43:28.123456-07:00 => ASM & RDBMS alert logs
+# 2022-07-04 17:43:28.123 [OCSSD(12345)]CRS-1601: ... => CRS alert log
+# `date` turns the timestamps into epoch secs, by their UTC offset when they
+# carry one, as the instance TZ may differ from that of the host, else in
+# the TZ of the host, which the CRS logs are written in. The timestamps
+# read past the probes go through a single `date -f -`.
+# The rotated siblings named <log>* written to since the window start are
+# searched too, oldest first, the compressed ones can't be. Unless a log
+# was last written before the window start, the script fails if the window
+# starts before the first line of the oldest log searched, as its start was
+# then rotated away or never logged.
+_WINDOW_SCRIPT = """\
+f={logfile}; start={start_epoch}; end={end_epoch}; block={block_bytes}
+[ -e "$f" ] || {{ echo "$f: no such file" >&2; exit 1; }}
+re='^[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+re="$re[T ][0-9][0-9]:[0-9][0-9]:[0-9][0-9]"
+# the timestamp of a timestamp line, without its fraction of a sec
+stamp='\\([0-9-]*[T ][0-9:]*\\)[.0-9]*'
+stamp="$stamp"'\\([+-][0-9][0-9]:[0-9][0-9]\\)\\{{0,1\\}}'
+# epoch secs of the timestamp lines of stdin
+epochs='grep -a "$re" | sed "s/$stamp.*/\\1\\2/" | date -f - +%s'
+export re stamp epochs
+# epoch secs of the 1st timestamp line after the line holding byte $2 of
+# log $1, empty if none within a block
+probe() {{
+  tail -c +$(($2 + 1)) "$1" | head -c "$block" | tail -n +2 |
+    grep -a -m 1 "$re" | sh -c "$epochs"
+}}
+# narrow lo & hi down to a block, the 1st timestamp after lo being before
+# $1, that after hi at or past it; a probe without any is taken as $2
+bisect() {{
+  lo=0; hi=$size
+  while [ $((hi - lo)) -gt "$block" ]; do
+    mid=$(((lo + hi) / 2)); probes=$((probes + 1))
+    t=$(probe "$g" "$mid")
+    if [ -n "$t" ] && [ "$t" -lt "$1" ] || {{ [ -z "$t" ] && [ "$2" = lo ]; }}
+    then
+      lo=$mid
+    else
+      hi=$mid
+    fi
+  done
+}}
+window() {{
+  g=$1; size=$(stat -c %s "$g") || return 1; probes=0
+  bisect "$start" hi; from=$lo
+  bisect $((end + 1)) lo; to=$((hi + block))
+  echo "$g: window $start - $end in bytes $from - $to after $probes probes" >&2
+  region="tail -c +$((from + 1)) \\"\\$g\\" | head -c $((to - from))"
+  export g region
+  # the epochs of the timestamp lines are read along with them
+  sh -c "$region" | awk -v start="$start" -v end="$end" '
+    BEGIN {{ epochs = ENVIRON["region"] " | " ENVIRON["epochs"] }}
+    $0 ~ ENVIRON["re"] {{
+      if ((epochs | getline secs) <= 0 || secs > end) exit
+      if (secs >= start) on = 1 }}
+    on'
+}}
+base=$(basename "$f")
+siblings() {{
+  find "$(dirname "$f")" -maxdepth 1 -type f \\
+    \\( -name "$base" -o -name "$base?*" \\) "$@"
+}}
+# a log last written before the window start holds the lines before it
+older=$(siblings ! -newermt "@$start" -print -quit)
+siblings ! -name '*.gz' ! -name '*.bz2' ! -name '*.xz' ! -name '*.zst' \\
+  -newermt "@$start" -printf '%T@ %p\\n' | sort -n | cut -d' ' -f2- | {{
+  rc=0; oldest=
+  while IFS= read -r g; do
+    if [ -z "$oldest" ] && [ -z "$older" ]; then
+      ts=$(head -c "$block" "$g" | grep -a -m 1 "$re")
+      t=$(printf '%s\\n' "$ts" | sh -c "$epochs")
+      if [ -n "$t" ] && [ "$t" -gt "$start" ]; then
+        echo "window before the start of the log, 1st line of $g: $ts" >&2
+        rc=2
+      fi
+    fi
+    oldest=${{oldest:-$g}}
+    window "$g" || rc=1
+  done
+  [ -n "$oldest" ] || echo "$f: not written to since the window start" >&2
+  exit $rc
+}}
+"""
+
+# the binary search of _WINDOW_SCRIPT stops once the window start is known
+# within this many bytes, read in full from there
+_WINDOW_BLOCK_BYTES = 64 * 1024
+
+# bytes read from the SSH channel at a time
+_CHUNK_BYTES = 64 * 1024
+
+# Start of the stream of excerpt_host_script(): a random boundary drawn on
+# the host, so that it is not found in any log, not even in one logging
+# the sudo cmd lines
+_BOUNDARY_SCRIPT = """\
+b=$(od -An -N 16 -tx1 /dev/urandom | tr -d ' \\n') && [ -n "$b" ] || exit 1
+echo "$b"
+"""
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def compress_command() -> str:
+    """Remote command compressing its stdin with zstd if there, else gzip
+
+    zstd is only picked if the zstandard package is installed locally to
+    decompress it. The local side tells the format by its magic bytes.
+    """
+    if zstandard is None:
+        return 'gzip -c'
+    return ('if command -v zstd >/dev/null 2>&1; then zstd -c -q; '
+            'else gzip -c; fi')
+
+
+class _CountingReader:
+    """File-like reader of a channel counting the bytes read from it.
+
+    Bytes peeked at are handed back by unread() & read again first.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+        self._unread = b''
+
+    def read(self, size: int = _CHUNK_BYTES) -> bytes:
+        """Read at most size bytes, b'' at the end of the channel"""
+        if self._unread:
+            data, self._unread = self._unread[:size], self._unread[size:]
+            return data
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def unread(self, data: bytes) -> None:
+        """Hand data back to be read again first"""
+        self._unread = data + self._unread
+
+
+def _read_chunks(reader):
+    """Iterate over a reader in chunks of at most _CHUNK_BYTES"""
+    while True:
+        chunk = reader.read(_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decompressed_reader(reader: _CountingReader):
+    """File-like reader of the decompressed data of a gzip or zstd stream
+
+    The format is told by its magic bytes. Data is decompressed as it is
+    read, at most the size asked for at a time.
+    """
+    magic = reader.read(len(_ZSTD_MAGIC))
+    reader.unread(magic)
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=reader, mode='rb')
+    if magic.startswith(_ZSTD_MAGIC) and zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(
+            reader, read_size=_CHUNK_BYTES)
+    raise ValueError(f'Excerpt neither gzip nor zstd compressed: {magic!r}')
+
+
+def hwm_script() -> str:
+    """Shell script printing the HWMs of the logs given as its arguments"""
+    return (_HWM_MD5_FUNCTION.format(check_bytes=_HWM_CHECK_BYTES) +
+            _HWM_SCRIPT)
+
+
+def excerpt_script(logfile: str, size: str, inode: str, mtime: str,
+                   md5: str) -> str:
+    """Shell script printing the bytes of logfile appended since its HWM"""
+    return (_HWM_MD5_FUNCTION.format(check_bytes=_HWM_CHECK_BYTES) +
+            _EXCERPT_SCRIPT.format(logfile=shlex.quote(logfile),
+                                   size=int(size), inode=int(inode),
+                                   mtime=int(mtime), md5=shlex.quote(md5)))
+
+
+def window_script(logfile: str, start_epoch: float, end_epoch: float,
+                  block_bytes: int = _WINDOW_BLOCK_BYTES) -> str:
+    """Shell script printing the lines of logfile inside a time window"""
+    return _WINDOW_SCRIPT.format(logfile=shlex.quote(logfile),
+                                 start_epoch=int(start_epoch),
+                                 end_epoch=int(end_epoch),
+                                 block_bytes=int(block_bytes))
+
+
+def outage_time_window(outage_windows: list, margin_secs: float) -> tuple:
+    """(start, end) epoch secs spanning all outage windows plus a margin
+
+    outage_windows is the list of cm7_tps_timeseries.OutageWindow (epoch
+    ms) of ParseSwingbenchRunXML, None is returned if it is empty.
+    """
+    if not outage_windows:
+        return None
+    return (min(window.start for window in outage_windows) / 1000 -
+            margin_secs,
+            max(window.end for window in outage_windows) / 1000 +
+            margin_secs)
+
+
+def grep_command(regexes: list, context_lines: int = 0) -> str:
+    """Command keeping the lines matching any of the extended regexes
+
+    Along with `context_lines` lines before & after each, like `grep -C`.
+    """
+    return " ".join(
+        ['grep -a -E'] +
+        ([f'-C {int(context_lines)}'] if context_lines else []) +
+        [f'-e {shlex.quote(regex)}' for regex in regexes])
+
+
+def excerpt_host_script(local_filename_scripts: list,
+                        filters: dict = None) -> str:
+    """Shell script streaming all excerpts of a host to stdout
+
+    local_filename_scripts is a list of (local filename, script) tuples,
+    the script printing the excerpt, see excerpt_script() &
+    window_script(). The logs are excerpted one after another, each sent
+    as it is read, as a member named after its local filename, followed by
+    the members `<local filename>.stderr` & `<local filename>.rc` (exit
+    status) of the script, see read_members(). That takes a single command
+    for all the logs of a host, whose o/p starts flowing right away & is
+    never staged on the host. The excerpts are copied straight to the o/p,
+    the processes started are per log, not per chunk of it.
+
+    filters is an optional dict of local filename => grep_command() that
+    the excerpt of that log is filtered with on the host, before transfer.
+    """
+    filters = filters or {}
+    lines = [_BOUNDARY_SCRIPT,
+             'err=$(mktemp) || exit 1',
+             "trap 'rm -f \"$err\"' EXIT",
+             # the excerpts go to fd 3 while the exit statuses are captured
+             'exec 3>&1']
+    for local_filename, script in local_filename_scripts:
+        member = shlex.quote(local_filename)
+        excerpt = f'{{ ( {script}) 2>> "$err"; echo $? >&4; }}'
+        if local_filename in filters:
+            # grep exits with 1 when no line matched, which is no error
+            excerpt = (f'{excerpt} | {{ {filters[local_filename]} '
+                       f'2>> "$err"; grep_rc=$?; '
+                       f'[ $grep_rc -le 1 ] || echo $grep_rc >&4; }}')
+        # the last exit status echoed is that of the excerpt
+        lines.extend([
+            ': > "$err"',
+            f'printf \'%s %s\\n\' "$b" {member}',
+            f'rc=$({{ {excerpt} >&3; }} 4>&1 | tail -n 1)',
+            f'printf \'%s %s\\n\' "$b" {member}.stderr',
+            'cat "$err"',
+            f'printf \'%s %s\\n%s\\n\' "$b" {member}.rc "${{rc:-1}}"'])
+    # the end of the stream, told from one cut short
+    lines.append('printf \'%s \\n\' "$b"')
+    return '\n'.join(lines) + '\n'
+
+
+def read_members(stream):
+    """Iterate over the (member, data) pieces sent by excerpt_host_script()
+
+    The stream starts with the line "<boundary>", then each member with the
+    line "<boundary> <member>" & its data runs up to the next boundary. The
+    line "<boundary> " ends the stream. The data is handed out as it is
+    read, b'' ending a member. ValueError is raised if the stream ends
+    inside a member.
+    """
+    buffer = b''
+    while b'\n' not in buffer:
+        chunk = stream.read(_CHUNK_BYTES)
+        if not chunk:
+            if buffer:
+                raise ValueError(f'Excerpts cut in their boundary: '
+                                 f'{buffer!r}')
+            return
+        buffer += chunk
+    boundary, buffer = buffer.split(b'\n', 1)
+    marker = boundary + b' '
+    member = None
+    while True:
+        start = buffer.find(marker)
+        end = buffer.find(b'\n', start) if start >= 0 else -1
+        if end >= 0:
+            if start and member is None:
+                raise ValueError(f'Excerpts not starting with a member: '
+                                 f'{buffer[:80]!r}')
+            if start:
+                yield member, buffer[:start]
+            if member is not None:
+                yield member, b''
+            member = buffer[start + len(marker):end].decode(errors='replace')
+            buffer = buffer[end + 1:]
+            if not member:
+                return
+            continue
+        # hand out the data that cannot be part of a boundary
+        keep = start if start >= 0 else max(len(buffer) - len(marker) + 1, 0)
+        if keep and member is not None:
+            yield member, buffer[:keep]
+            buffer = buffer[keep:]
+        chunk = stream.read(_CHUNK_BYTES)
+        if not chunk:
+            raise ValueError(f'Excerpts cut in {member or "their start"}')
+        buffer += chunk
+
 
 class ExcerptorCls:
     """Provides methods to: 1) record HWMs & 2) after failover excerpt content.
 
     ExcerptorCls has a method generate_get_hwm_groupby_host() to generate
     high watermarks and another excerpt_logs() to use the geenrated HWMs and
-    then extract just the changed lines.
+    then extract just the bytes appended since.
 
     The generate_get_hwm_groupby_host() will be invoked prior to triggering a
     given failure scenario. Once the scenario has caused the outage that is
@@ -68,17 +456,39 @@ class ExcerptorCls:
     to pull the remote Oracle logs in the BMX db backend hosts to the local
     control-node's location where all logs will be generated for a given run of
     a failure scenario.
+
+    The nodes are reached concurrently, at most `max_workers` of them at the
+    same time. With `compress`, the excerpts are compressed on the DB hosts
+    (zstd or gzip) & decompressed locally as they arrive, which pays off
+    over slow links to the control-node. With the `sftp` transport, the logs
+    the SSH user may read are excerpted with pipelined SFTP reads instead,
+    which run at the bandwidth of the link.
+
+    For a run whose HWMs are gone, excerpt_logs_in_window() excerpts the
+    lines logged inside a time window instead, ex.: around the outages of
+    the run.
     """
 
-    def __init__(self, run_id: str, log_location: str):
+    def __init__(self, run_id: str, log_location: str,
+                 max_workers: int = MAX_CONCURRENT_HOSTS,
+                 compress: bool = False, transport: str = 'exec'):
+        if transport not in TRANSPORTS:
+            raise ValueError(f'transport {transport} is not one of '
+                             f'{TRANSPORTS}')
         self.run_id = run_id
+        self.max_workers = max_workers
+        self.compress = compress
+        self.transport = transport
         self.log_location = log_location
         self.tail_cmds_dict = {}
         self.ssh_username = cm1_json_file_flag.deserialized_data["ssh_user_name"]
         self.ssh_key = cm1_json_file_flag.deserialized_data["ssh_key_file"]
         self.deserialized_data = cm1_json_file_flag.deserialized_data
+        # optional, ex.: {"context_lines": 2, "crs": ["CRS-[0-9]+"], ...}
+        self.excerpt_filters = self.deserialized_data.get("excerpt_filters",
+                                                          {})
 
-    def generate_get_hwm_groupby_host(self):
+    def generate_get_hwm_groupby_host(self) -> dict:
         """Record high watermarks of all alert logs in all DB backend hosts.
 
         The input site-constants.json contains all the Oracle log files that
@@ -87,95 +497,155 @@ class ExcerptorCls:
         remotely reach via SSH into the remote nodes and record the high
         watermarks for each of the logfile of interest.
 
+        A high watermark is the size in bytes of the logfile, taken with
+        `stat` which, unlike counting the lines, does not read the file. The
+        inode & the mtime (epoch secs) are recorded along with it to find
+        the file back if it was rotated by the time of excerpt_logs(), plus
+        the md5 of the last bytes before the HWM to tell a log copied &
+        truncated in place, see hwm_script().
+
         The high watermarks generated will be held in a dict data structure of
         a list of tuples that is grouped/keyed by the hostname. Ex.:
         {
           '172.16.110.1': [
-            ('/u01/app/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log', '16699'),
-            ('/u01/app/diag/crs/at--svr005/crs/trace/alert.log', '217206'),
-            ('/u01/app/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log', '74373')
+            ('/u01/app/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log', '1669912',
+             '2883604', '1656981700', '9e107d9d372bb6826bd81d3542a419d6'),
+            ('/u01/app/diag/crs/at--svr005/crs/trace/alert.log', '21720613',
+             '2883712', '1656981757', 'e4d909c290d0fb1ca068ffaddf22cbd0'),
+            ('/u01/app/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log', '7437301',
+             '3014725', '1656981702', 'd174ab98d277d9f5a5611c2c9f419d9f')
           ],
           '172.16.110.2': [
-            ('/u01/app/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log', '27358'),
-            ('/u01/app/diag/crs/at--svr006/crs/trace/alert.log', '3907'),
-            ('/u01/app/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log', '86297')
+            ('/u01/app/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log', '2735866',
+             '2883605', '1656981698', '0cc175b9c0f1b6a831c399e269772661'),
+            ('/u01/app/diag/crs/at--svr006/crs/trace/alert.log', '390714',
+             '2883713', '1656981755', '92eb5ffee6ae2fec3ad71c777531578f'),
+            ('/u01/app/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log', '8629790',
+             '3014726', '1656981704', '4a8a08f09d37b73795649038408b5f33')
           ]
         }
 
+        A node that fails does not stop the HWMs of the others from being
+        recorded; it is left out of tail_cmds_dict & the failures are
+        returned as a dict of the host_ip to the error, ex.:
+        {'172.16.110.2': "SSHConnectError('172.16.110.2', ...)"}
+
         Erring on the side of over-documentation, the code below may have an
         occasional variable expansion provided for ease of review process,
         which shall be removed before publishing.
         """
 
-        for _, dict_node_details in enumerate(
-                self.deserialized_data["nodes"]):
-
-            # Ex.:
-            # _ = 0 (the node number in the json file's dict)
-
-            # dict_node_details =  {
-            # 'node_name': 'at-3793329-svr005',
-            # 'host_ip': '172.16.110.1',
-            # 'dict_oracle_logs': {
-            #   'node1_asm_log': '/u01/app//+asm/+ASM1/trace/alert_+ASM1.log',
-            #   'node1_crs_log': '/u01/crs/at--svr005/crs/trace/alert.log',
-            #   'node1_db_log': '/u01/app/orcl/orcl1/trc/alert_orcl1.log'}
-            # }
-
-            host_ip = dict_node_details['host_ip']
-            dict_nodes_logs_node = dict_node_details['dict_oracle_logs']
-
-            _cmd_hw_markers_wc = ['sudo /bin/wc -l']
-            _cmd_hw_markers_log = list(dict_nodes_logs_node.values())
-
-            cmd_hw_markers = " ".join(list(itertools.chain(
-                _cmd_hw_markers_wc,
-                _cmd_hw_markers_log
-            )))
-
-            # Ex.: cmd_hw_markers =
-            # sudo /bin/wc -l  /u01/app/asm/+asm/+ASM1/trace/alert_+ASM1.log
-            # /u01/crs/at-3793329-svr005/crs/trace/alert.log
-            # /u01/app/oracle/orcl/orcl1/trc/alert_orcl1.log
-
-            # Instantiate paramiko client object and get the high watermarks
-            # of ASM, CRS, RDBMS alert logs via remote SSH commands
-            host_ssh_clientobj = cm6_paramiko.ClientCls(host=host_ip,
-                                                        username=self.ssh_username,
-                                                        key_file=self.ssh_key)
-            op_cmd_hw_markers = host_ssh_clientobj.store_op_to_py_variables(
-                cmd_hw_markers)
-
-            # Ex.: op_cmd_hw_markers
-            #  27358 /u01/app/oracle/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log
-            #   3907 /u01/app/oracle/diag/crs/at--svr006/crs/trace/alert.log
-            #  86297 /u01/app/oracle/rdbms/orcl/orcl2/trace/alert_orcl2.log
-            # 117562 total
-
-            host_ssh_clientobj.garbage_clean()
-
-            # convert op_cmd1_hw_markers from str to list, splitting on \n
-            op_cmd_hw_markers = op_cmd_hw_markers.split('\n')[
-                                :-2]
-
-            # Ex. op_cmd_hw_markers=
-            # ['  27358 /u01/app/oracle//asm/+asm/+ASM2/trace/alert_+ASM2.log',
-            # '   3907 /u01/app/oracle/diag/crs/at-/crs/trace/alert.log',
-            # '  86297 /u01/app//diag/rdbms/orcl/orcl2/trace/alert_orcl2.log']
-
-            tail_cmds_node = []
-            for line in op_cmd_hw_markers:
-                hwm_filename_list = line.split()
-                # split on whitespace:
-                # ['12058', '/u01/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log']
-
-                # append as a tuple
-                tail_cmds_node.append((hwm_filename_list[1],
-                                       hwm_filename_list[0]))
-
-            self.tail_cmds_dict[host_ip] = tail_cmds_node
-
-    def excerpt_logs(self) -> None:
+        nodes = self.deserialized_data["nodes"]
+        started = time.monotonic()
+        hwm_per_host = {}
+        failures = {}
+
+        # each node costs an SSH handshake & a `stat`, so run them
+        # concurrently: the wall time is that of the slowest node instead of
+        # the sum of all nodes
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(len(nodes), self.max_workers) or 1
+        ) as executor:
+            future_to_host = {
+                executor.submit(self._get_hwm_for_node, node): node['host_ip']
+                for node in nodes}
+            for future in concurrent.futures.as_completed(future_to_host):
+                host_ip = future_to_host[future]
+                try:
+                    hwm_per_host[host_ip] = future.result()[1]
+                # an unreachable node fails its own HWMs only, ex.:
+                # cm6_paramiko.SSHConnectError
+                # pylint: disable-next=broad-except
+                except Exception as inst:
+                    print(f'Failed to record the high watermarks of '
+                          f'{host_ip}: {inst!r}')
+                    failures[host_ip] = repr(inst)
+
+        # filled in the order of the nodes in the json file
+        for node in nodes:
+            if node['host_ip'] in hwm_per_host:
+                self.tail_cmds_dict[node['host_ip']] = \
+                    hwm_per_host[node['host_ip']]
+
+        print(f'High watermarks of {len(nodes)} nodes recorded in '
+              f'{time.monotonic() - started:.1f} secs, '
+              f'{len(failures)} failed: {sorted(failures)}')
+        return failures
+
+    def _get_hwm_for_node(self, dict_node_details: dict) -> tuple:
+        """Record the high watermarks of the alert logs of a single host.
+
+        Returns a tuple of the host_ip & the list of
+        (logfile, size, inode, mtime, md5) tuples of that host, see
+        generate_get_hwm_groupby_host().
+        """
+        # Ex.:
+        # dict_node_details =  {
+        # 'node_name': 'at-3793329-svr005',
+        # 'host_ip': '172.16.110.1',
+        # 'dict_oracle_logs': {
+        #   'node1_asm_log': '/u01/app//+asm/+ASM1/trace/alert_+ASM1.log',
+        #   'node1_crs_log': '/u01/crs/at--svr005/crs/trace/alert.log',
+        #   'node1_db_log': '/u01/app/orcl/orcl1/trc/alert_orcl1.log'}
+        # }
+
+        host_ip = dict_node_details['host_ip']
+        dict_nodes_logs_node = dict_node_details['dict_oracle_logs']
+
+        # size in bytes, inode, mtime & md5 of the bytes before the size
+        _cmd_hw_markers_stat = ["sudo sh -c", shlex.quote(hwm_script()), "sh"]
+        _cmd_hw_markers_log = [shlex.quote(logfile) for logfile in
+                               dict_nodes_logs_node.values()]
+
+        cmd_hw_markers = " ".join(list(itertools.chain(
+            _cmd_hw_markers_stat,
+            _cmd_hw_markers_log
+        )))
+
+        # Ex.: cmd_hw_markers =
+        # sudo sh -c '<hwm_script()>' sh
+        # /u01/app/asm/+asm/+ASM1/trace/alert_+ASM1.log
+        # /u01/crs/at-3793329-svr005/crs/trace/alert.log
+        # /u01/app/oracle/orcl/orcl1/trc/alert_orcl1.log
+
+        # Get the pooled paramiko client object, kept connected for the
+        # fault injection & the excerpts, and get the high watermarks
+        # of ASM, CRS, RDBMS alert logs via remote SSH commands
+        host_ssh_clientobj = cm6_paramiko.connection_pool.get(
+            host=host_ip, username=self.ssh_username, key_file=self.ssh_key)
+        op_cmd_hw_markers = host_ssh_clientobj.store_op_to_py_variables(
+            cmd_hw_markers)
+
+        # Ex.: op_cmd_hw_markers (md5s shortened)
+        # 2735866 2883605 1656981698 0cc1..2661 /u01/app/asm/+ASM2/alert.log
+        # 390714 2883713 1656981755 92eb..578f /u01/app/crs/svr006/alert.log
+        # 8629790 3014726 1656981704 4a8a..5f33 /u01/app/orcl2/alert.log
+
+        # convert op_cmd1_hw_markers from str to list, splitting on \n
+        op_cmd_hw_markers = op_cmd_hw_markers.splitlines()
+
+        # Ex. op_cmd_hw_markers=
+        # ['2735866 2883605 1656981698 0cc1..2661 /u01/app/asm/+ASM2/alert.log',
+        # '390714 2883713 1656981755 92eb..578f /u01/app/crs/svr006/alert.log',
+        # '8629790 3014726 1656981704 4a8a..5f33 /u01/app/orcl2/alert.log']
+
+        tail_cmds_node = []
+        for line in op_cmd_hw_markers:
+            if not line.strip():
+                continue
+            hwm_filename_list = line.split(maxsplit=4)
+            # split on whitespace:
+            # ['2735866', '2883605', '1656981698',
+            #  '0cc175b9c0f1b6a831c399e269772661',
+            #  '/u01/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log']
+
+            # append as a tuple of logfile, size, inode, mtime, md5
+            tail_cmds_node.append((hwm_filename_list[4],
+                                   *hwm_filename_list[:4]))
+
+        return host_ip, tail_cmds_node
+
+    def excerpt_logs(self, apply_filters: bool = False) -> dict:
         """Excerpt the remote files from BMX DB backend hosts onto local files.
 
         The remote log file locations & high watermarks are as per
@@ -189,45 +659,339 @@ class ExcerptorCls:
         run_id & log_location
 
         For ex.: output from:
-        'sudo tail -n +16699 /u01/diag/+asm/+ASM1/trace/alert_+ASM1.log'
+        'sudo tail -c +1669913 /u01/diag/+asm/+ASM1/trace/alert_+ASM1.log'
         will be written to: <log_location>/<run_id>_node1_asm_log
 
+        `tail -c +N` seeks to the byte right after the HWM, so only the data
+        appended since is read, however large the log is. If the log was
+        rotated since its HWM, the tail of the rotated file & the new file
+        are excerpted instead, see excerpt_script().
+
         The user-friendly local file name is `node1_asm_log` for
         `alert_+ASM1.log` as input in the `site_constants.json` file.
-        """
-
-        for node_number, dict_node_details in enumerate(
-                self.deserialized_data["nodes"]):
-
-            host_ip = dict_node_details['host_ip']
-            dict_nodes_logs_node = dict_node_details['dict_oracle_logs']
-
-            host_ssh_clientobj = cm6_paramiko.ClientCls(host=host_ip,
-                                                        username=self.ssh_username,
-                                                        key_file=self.ssh_key)
-
-            for log_hwm_tuple in self.tail_cmds_dict[host_ip]:
-                # use dict comprehension to match the absolute filename with
-                # local filename like node2_asm_log
-                local_filename = [k for k, v in dict_nodes_logs_node.items() if
-                                  v == log_hwm_tuple[0]][0]
-
-                op_file_nm = str(
-                    pathlib.PurePath(self.log_location,
-                                     "_".join([self.run_id, local_filename])))
-
-                command = "".join(["sudo tail -n +", log_hwm_tuple[1], " ",
-                                   log_hwm_tuple[0]])
 
-                stdout_raw, stderr_raw = host_ssh_clientobj.run_remote_cmd(
-                    command)
-                stdout_bstr, _ = stdout_raw.read(), stderr_raw.read()
-
-                with open(op_file_nm, "a", encoding='utf-8') as file:
-                    file.write(stdout_bstr.decode())
-
-            # close the client
-            host_ssh_clientobj.garbage_clean()
+        With apply_filters, only the lines matching the regexes for the log
+        type (asm, crs or db, from the local filename like node1_crs_log) in
+        the `excerpt_filters` of the site json are kept, along with
+        `context_lines` lines around each. The filtering is done on the DB
+        host, so only those lines are transferred. They land in
+        <log_location>/<run_id>_<local filename>_filtered, so the full
+        excerpts can still be pulled later with apply_filters=False as the
+        high watermarks are kept.
+
+        The nodes are excerpted concurrently. All the logs of a node are
+        pulled with a single command, which streams them one after another
+        to be demultiplexed into the local files, see
+        excerpt_host_script(). A log or node that fails does not
+        stop the others from being excerpted; the failures are returned as a
+        dict of the local file name to the error, ex.:
+        {'node2_crs_log': 'NoValidConnectionsError(...)'}
+        """
+        nodes = self.deserialized_data["nodes"]
+        started = time.monotonic()
+        failures = {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(len(nodes), self.max_workers) or 1
+        ) as executor:
+            for node_failures in executor.map(self._excerpt_node_logs, nodes,
+                                              [apply_filters] * len(nodes)):
+                failures.update(node_failures)
+
+        print(f'Logs of {len(nodes)} nodes excerpted in '
+              f'{time.monotonic() - started:.1f} secs, '
+              f'{len(failures)} failed: {sorted(failures)}')
+        return failures
+
+    def excerpt_logs_in_window(self, start_epoch: float, end_epoch: float,
+                               apply_filters: bool = False) -> dict:
+        """Excerpt the lines of all logs timestamped inside a time window.
+
+        This needs no HWM, so it works for a run analysed after the fact,
+        with the window taken from its results xml, ex.:
+
+            window = outage_time_window(
+                parse_swingbench_run.outage_windows, margin_secs=300)
+            excerptor_inst.excerpt_logs_in_window(*window)
+
+        start_epoch & end_epoch are epoch secs. Each log is binary searched
+        on its DB host for the window start by the timestamp lines, so only
+        O(log(size)) small reads are done before the lines of the window,
+        which alone are transferred, see window_script(). Lines up to the
+        first timestamp line past the window end are included. The rotated
+        siblings of a log are searched too, a log whose lines at the window
+        start are gone fails, with the lines found excerpted still.
+
+        The excerpts land in <log_location>/<run_id>_<local filename>_window
+        (`_window_filtered` with apply_filters, see excerpt_logs()). The
+        nodes are excerpted concurrently over exec & the failures are
+        returned as by excerpt_logs().
+        """
+        nodes = self.deserialized_data["nodes"]
+        started = time.monotonic()
+        failures = {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(len(nodes), self.max_workers) or 1
+        ) as executor:
+            for node_failures in executor.map(
+                    self._excerpt_node_logs, nodes,
+                    [apply_filters] * len(nodes),
+                    [(start_epoch, end_epoch)] * len(nodes)):
+                failures.update(node_failures)
+
+        print(f'Logs of {len(nodes)} nodes excerpted for the window '
+              f'{datetime.datetime.fromtimestamp(start_epoch)} - '
+              f'{datetime.datetime.fromtimestamp(end_epoch)} in '
+              f'{time.monotonic() - started:.1f} secs, '
+              f'{len(failures)} failed: {sorted(failures)}')
+        return failures
+
+    def _excerpt_node_logs(self, dict_node_details: dict,
+                           apply_filters: bool = False,
+                           window: tuple = None) -> dict:
+        """Excerpt all the logs of a single host, return the failures
+
+        The logs are excerpted since their HWMs, or inside the window of
+        (start_epoch, end_epoch) if given.
+        """
+        started = time.monotonic()
+        host_ip = dict_node_details['host_ip']
+
+        # the excerpts are named after the local filename like node2_asm_log
+        if window is None and host_ip not in self.tail_cmds_dict:
+            print(f'No high watermark recorded for {host_ip}, its logs are '
+                  f'not excerpted')
+            return dict.fromkeys(dict_node_details['dict_oracle_logs'],
+                                 'no high watermark recorded')
+        if window is None:
+            local_filenames = {v: k for k, v in
+                               dict_node_details['dict_oracle_logs'].items()}
+            local_filename_log_tuples = [
+                (local_filenames[log_hwm_tuple[0]], *log_hwm_tuple)
+                for log_hwm_tuple in self.tail_cmds_dict[host_ip]]
+        else:
+            local_filename_log_tuples = list(
+                dict_node_details['dict_oracle_logs'].items())
+        # local filename => 0 once excerpted, else None or the error
+        exit_statuses = dict.fromkeys(
+            local_filename for local_filename, *_ in local_filename_log_tuples)
+        filters = (self._filters_by_local_filename(exit_statuses)
+                   if apply_filters else {})
+        op_file_nms = {
+            local_filename: self._op_file_nm(
+                local_filename, *(['window'] if window else []),
+                *(['filtered'] if local_filename in filters else []))
+            for local_filename in exit_statuses}
+
+        readers = []
+        try:
+            # reconnected by the pool if the connection of the HWMs is down
+            host_ssh_clientobj = cm6_paramiko.connection_pool.get(
+                host=host_ip, username=self.ssh_username,
+                key_file=self.ssh_key)
+            exec_tuples = local_filename_log_tuples
+            if self.transport == 'sftp' and window is None:
+                # filtered logs can only be filtered by the exec command
+                exec_tuples = [tuple_ for tuple_ in local_filename_log_tuples
+                               if tuple_[0] in filters]
+                exec_tuples += self._excerpt_over_sftp(
+                    host_ssh_clientobj, host_ip,
+                    [tuple_ for tuple_ in local_filename_log_tuples
+                     if tuple_[0] not in filters], exit_statuses, readers,
+                    op_file_nms)
+            if exec_tuples:
+                self._excerpt_over_exec(
+                    host_ssh_clientobj, host_ip,
+                    [(local_filename,
+                      excerpt_script(*log_tuple) if window is None else
+                      window_script(*log_tuple, *window))
+                     for local_filename, *log_tuple in exec_tuples],
+                    exit_statuses, readers, op_file_nms, filters)
+        # an unreachable node or a broken stream fails the logs not excerpted
+        # yet but not the other nodes, ex.: cm6_paramiko.SSHConnectError
+        # pylint: disable-next=broad-except
+        except Exception as inst:
+            print(f'Failed to excerpt the logs of {host_ip}: {inst!r}')
+            for local_filename, exit_status in exit_statuses.items():
+                if exit_status is None:
+                    exit_statuses[local_filename] = repr(inst)
+
+        print(f'Excerpted the logs of {host_ip} in '
+              f'{time.monotonic() - started:.1f} secs, '
+              f'{sum(reader.bytes_read for reader in readers)} bytes '
+              f'transferred')
+        return {local_filename: exit_status or 'missing from the excerpts'
+                for local_filename, exit_status in exit_statuses.items()
+                if exit_status != 0}
+
+    def _filters_by_local_filename(self, local_filenames) -> dict:
+        """grep_command() per local filename whose log type has regexes"""
+        filters = {}
+        for local_filename in local_filenames:
+            # ex.: node1_crs_log => crs
+            log_type = local_filename.rsplit('_', 2)[-2]
+            if self.excerpt_filters.get(log_type):
+                filters[local_filename] = grep_command(
+                    self.excerpt_filters[log_type],
+                    self.excerpt_filters.get('context_lines', 0))
+        return filters
+
+    def _op_file_nm(self, local_filename: str, *suffixes) -> str:
+        """Path of the local file an excerpt is appended to
+
+        Ex.: <log_location>/<run_id>_node1_crs_log_window_filtered
+        """
+        return str(pathlib.PurePath(self.log_location, "_".join(
+            [self.run_id, local_filename, *suffixes])))
+
+    def _excerpt_over_exec(self, host_ssh_clientobj, host_ip: str,
+                           local_filename_scripts: list,
+                           exit_statuses: dict, readers: list,
+                           op_file_nms: dict, filters: dict = None) -> None:
+        """Excerpt logs of a host with `sudo` in a single remote command"""
+        command = " ".join(["sudo sh -c", shlex.quote(excerpt_host_script(
+            local_filename_scripts, filters))])
+        if self.compress:
+            command = " | ".join([command, compress_command()])
+
+        stdout_raw, stderr_raw = host_ssh_clientobj.run_remote_cmd(command)
+        reader = _CountingReader(stdout_raw)
+        readers.append(reader)
+        try:
+            with host_ssh_clientobj.typed_read_errors('the excerpt cmd'):
+                self._demux_excerpts(
+                    _decompressed_reader(reader) if self.compress else reader,
+                    host_ip, exit_statuses, op_file_nms)
+                stderr_bstr = stderr_raw.read()
+        except ValueError:
+            # a stream cut short by a killed cmd is reported as such
+            host_ssh_clientobj.check_exited('the excerpt cmd',
+                                            stdout_raw.channel)
+            raise
+        # the excerpts are cut short if the host died or the cmd was killed
+        host_ssh_clientobj.check_exited('the excerpt cmd', stdout_raw.channel)
+        if stderr_bstr:
+            print(f'stderr of the excerpts from {host_ip}: '
+                  f'{stderr_bstr.decode(errors="replace").strip()}')
+
+    def _excerpt_over_sftp(self, host_ssh_clientobj, host_ip: str,
+                           local_filename_hwm_tuples: list,
+                           exit_statuses: dict, readers: list,
+                           op_file_nms: dict) -> list:
+        """Excerpt logs of a host readable without `sudo` over SFTP
+
+        Returns the logs left to be excerpted over exec: those the SSH user
+        may not read & those rotated since their HWM, as the rotated file is
+        found by its inode, which SFTP does not tell. A log copied &
+        truncated in place keeps its inode, it is told by the md5 of the
+        bytes before its HWM, read first.
+        """
+        # stat without sudo, the logs the SSH user may not reach are missing
+        op_cmd_stat = host_ssh_clientobj.store_op_to_py_variables(" ".join(
+            ["/usr/bin/stat -c '%s %i %n'"] +
+            [shlex.quote(logfile) for _, logfile, *_ in
+             local_filename_hwm_tuples] + ['2>/dev/null']))
+        size_inode = {}
+        for line in op_cmd_stat.splitlines():
+            if line.strip():
+                size, inode, logfile = line.split(maxsplit=2)
+                size_inode[logfile] = (int(size), inode)
+
+        exec_tuples = []
+        for local_filename_hwm_tuple in local_filename_hwm_tuples:
+            local_filename, logfile, size, inode, _, md5 = \
+                local_filename_hwm_tuple
+            current_size, current_inode = size_inode.get(logfile, (-1, None))
+            if current_inode != inode or current_size < int(size):
+                exec_tuples.append(local_filename_hwm_tuple)
+                continue
+            check_offset = max(int(size) - _HWM_CHECK_BYTES, 0)
+            try:
+                remote_file = host_ssh_clientobj.open_file_range(
+                    logfile, check_offset)
+            except PermissionError:
+                exec_tuples.append(local_filename_hwm_tuple)
+                continue
+
+            reader = _CountingReader(remote_file)
+            readers.append(reader)
+            try:
+                with remote_file:
+                    if hashlib.md5(reader.read(
+                            int(size) - check_offset)).hexdigest() != md5:
+                        # copied & truncated, then regrown past the HWM
+                        exec_tuples.append(local_filename_hwm_tuple)
+                        continue
+                    with open(op_file_nms[local_filename], "ab") as file:
+                        for chunk in _read_chunks(reader):
+                            file.write(chunk)
+            # a log failing mid-read fails this log only
+            # pylint: disable-next=broad-except
+            except Exception as inst:
+                print(f'Failed to excerpt {local_filename} from {host_ip} '
+                      f'over SFTP: {inst!r}')
+                exit_statuses[local_filename] = repr(inst)
+                continue
+            exit_statuses[local_filename] = 0
+            print(f'Excerpted {reader.bytes_read} bytes of {local_filename} '
+                  f'from {host_ip} over SFTP')
+
+        if exec_tuples:
+            print(f'Excerpting {[tuple_[0] for tuple_ in exec_tuples]} from '
+                  f'{host_ip} over exec with sudo')
+        return exec_tuples
+
+    def _demux_excerpts(self, stream, host_ip: str, exit_statuses: dict,
+                        op_file_nms: dict) -> None:
+        """Append each excerpt of the stream of a host to its file
+
+        The excerpts are copied as they arrive, a chunk at a time, so the
+        memory used does not grow with the excerpts & the bytes are written
+        as they are, whether valid utf-8 or not. exit_statuses is updated
+        with 0 for each excerpt script that succeeded, else with its error.
+        Each excerpt goes to its file in op_file_nms.
+        """
+        written = {}
+        # local filename.stderr|rc => their bytes received so far
+        status_bstr = {}
+        file = None
+        try:
+            for member, data in read_members(stream):
+                local_filename, suffix = member, ''
+                if member.endswith(('.stderr', '.rc')):
+                    local_filename, suffix = member.rsplit('.', 1)
+                if local_filename not in exit_statuses:
+                    continue
+
+                if suffix == 'rc' and not data:
+                    # the rc is the last member of an excerpt
+                    exit_status = int(status_bstr.get(member, b'1'))
+                    stderr = status_bstr.get(f'{local_filename}.stderr',
+                                             b'').decode(
+                                                 errors='replace').strip()
+                    print(f'Excerpted {written.get(local_filename, 0)} bytes '
+                          f'of {local_filename} from {host_ip}, exit status '
+                          f'{exit_status}'
+                          + (f', stderr: {stderr}' if stderr else ''))
+                    exit_statuses[local_filename] = exit_status and (
+                        f'exit status {exit_status}: {stderr}')
+                elif suffix:
+                    status_bstr[member] = status_bstr.get(member, b'') + data
+                else:
+                    if file is None:
+                        file = open(op_file_nms[local_filename], "ab")
+                        written[local_filename] = 0
+                    if data:
+                        file.write(data)
+                        written[local_filename] += len(data)
+                    else:
+                        # end of the excerpt, whose file exists even if empty
+                        file.close()
+                        file = None
+        finally:
+            if file is not None:
+                file.close()
 
 
 def excerptor_standalone_runner():
@@ -247,6 +1011,7 @@ def excerptor_standalone_runner():
     excerptor_inst = ExcerptorCls(run_id, log_location)
     excerptor_inst.generate_get_hwm_groupby_host()
     # excerptor_inst.excerpt_logs()
+    cm6_paramiko.connection_pool.close_all()
 
 
 if __name__ == '__main__':
@@ -21,11 +21,11 @@ tns connection is established to the BMX DB hosts scan name.
 `run_id` and `log_location` controls where the output files get written to.
 """
 
-from subprocess import Popen
+from subprocess import Popen, PIPE, TimeoutExpired
 import itertools
 import pathlib
-import time
 import sys
+import time
 import datetime
 import json
 
@@ -33,6 +33,11 @@ THIS_DIR = pathlib.Path(__file__).absolute().parent
 sys.path.append(str(THIS_DIR.parent.parent))  # current directory structure is:
 # <root> > src > common > <common module like the current  one>
 from src.common import cm1_json_file_flag
+from src.common.cm10_charbench_monitor import LiveOutageMonitorCls
+from src.common.cm11_file_watch import wait_for_file
+
+# closing tag of a completely written results xml
+_RESULTS_XML_END = b'</Results>'
 
 
 class Swingbench:
@@ -43,12 +48,20 @@ class Swingbench:
     (1) generate_swingbench_tokens => constructs tokens to subprocess.Popen()
     (2) run_swingbench => runs the Swingbench binary in the background as a
     non-blocking call
+    (3) stop_swingbench => ends the running workload ahead of its runtime,
+    ex.: once the outage of the scenario has been recovered from
+    (4) wait_for_completion => blocks till the workload exited and its
+    results xml is completely written
     """
 
     def __init__(self, rt_hhmm: str, run_id: str, log_location: str) -> None:
         self.rt_hhmm = rt_hhmm
         self.run_id = run_id
         self.log_location = log_location
+        self.swingbench_process = None  # Popen handle of the running workload
+        self.live_monitor = None  # tails the verbose output of the workload
+        self.sb_results_xml_filename = pathlib.PurePath(
+            self.log_location, "".join([self.run_id, ".xml"])).as_posix()
 
         self.swingbench_binary = [cm1_json_file_flag.deserialized_data[
             "swingbench_binary_location"]]
@@ -79,11 +92,7 @@ class Swingbench:
 
         # ex.: sb_option_results_xml = ['-r',
         # '/home/swingbench/bin/1672193927_Dec2722_181847.xml']
-        sb_results_xml_filename = pathlib.PurePath(self.log_location,
-                                                   "".join([self.run_id, ".xml"
-                                                            ])).as_posix()
-
-        sb_option_results_xml = ['-r', sb_results_xml_filename]
+        sb_option_results_xml = ['-r', self.sb_results_xml_filename]
 
         # Ex.: swingbench_runtime = "-rt 0:30"
         # swingbench runtime differs based on scenario being tested
@@ -105,12 +114,16 @@ class Swingbench:
 
         return list(swingbench_cmd_tokens)
 
-    def run_swingbench(self, swingbench_cmd_tokens) -> None:
+    def run_swingbench(self, swingbench_cmd_tokens,
+                       max_rampup_secs: float = 180) -> bool:
         """ Method that starts swingbench workload.
 
         Swingbench is started from the control-node with the runtime swingbench
         argument based on scenario and other swingbench arguments based on the
-        config values in json file """
+        config values in json file.
+
+        Returns True once the workload reached a steady state, False if it
+        did not within `max_rampup_secs` (or exited before) """
 
         sb_runlog = pathlib.PurePath(self.log_location, "".join(
             [self.run_id, "_swingbench_timeseries"])).as_posix()
@@ -118,18 +131,96 @@ class Swingbench:
         # Calling sp.run() is a blocking call
         # while sp.Popen is not
         # Using Popen to run the swingbench in background
+        # stdin is kept open, charbench ends the run when it reads a newline
         with open(sb_runlog, "a", encoding="utf-8") as file_handle:
-            Popen(swingbench_cmd_tokens, stdout=file_handle)
+            # pylint: disable-next=consider-using-with
+            self.swingbench_process = Popen(swingbench_cmd_tokens,
+                                            stdout=file_handle, stdin=PIPE)
 
-        # Sleep for 90secs until the Swingbench load is ramped to full TPS.
+        # Block until the Swingbench load is ramped to a steady TPS.
         # Note that this doesn't change anything in the xml parser logic,
         # as we are still going to get 0s at the beginning of the xml file
 
         # We do blocking call here so that when scenarios are introduced by
         # main() module, failovers are triggered only after full ramp up of the
-        # Swingbench workload.
-        print('Waiting 90 seconds for SwingBench to ramp up')
-        time.sleep(90)
+        # Swingbench workload. A fixed wait was either too long for a warm
+        # cluster or too short for a slow one, skewing the measured outage.
+        self.live_monitor = LiveOutageMonitorCls(sb_runlog)
+        print(f'Waiting up to {max_rampup_secs} seconds for SwingBench to '
+              f'ramp up to a steady TPS')
+        steady = self.live_monitor.wait_steady(
+            max_rampup_secs,
+            is_running=lambda: self.swingbench_process.poll() is None)
+        steady_state = self.live_monitor.steady_state_detector
+        if steady:
+            print(f'SwingBench reached a steady TPS of {steady_state.mean:.1f} '
+                  f'(cv: {steady_state.cv:.3f})')
+        else:
+            print(f'SwingBench did not reach a steady TPS within '
+                  f'{max_rampup_secs} seconds, continuing anyway')
+        return steady
+
+    def stop_swingbench(self, grace_secs: float = 60) -> None:
+        """ Method that ends the running workload ahead of its runtime.
+
+        charbench is asked to end the run the same way as interactively
+        ("Hit Return to Terminate Run..."), so that it still writes the
+        results xml. It is only terminated if it did not exit within
+        `grace_secs`.
+        """
+        if self.swingbench_process is None or \
+                self.swingbench_process.poll() is not None:
+            return
+
+        print('Stopping SwingBench ahead of its runtime')
+        try:
+            self.swingbench_process.stdin.write(b'\n')
+            self.swingbench_process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.swingbench_process.wait(timeout=grace_secs)
+        except TimeoutExpired:
+            print(f'SwingBench did not exit within {grace_secs} secs, '
+                  f'terminating it')
+            self.swingbench_process.terminate()
+            self.swingbench_process.wait()
+
+    def wait_for_completion(self, timeout_secs: float) -> bool:
+        """ Method that blocks till the results of the workload exist.
+
+        Waits for the charbench process to exit & then for its results xml
+        to be completely written, woken up by inotify rather than sleeping
+        for the worst case. Returns False if either did not happen within
+        `timeout_secs`, the process is left running in that case.
+        """
+        deadline = time.monotonic() + timeout_secs
+        if self.swingbench_process is not None:
+            try:
+                self.swingbench_process.wait(timeout=timeout_secs)
+            except TimeoutExpired:
+                print(f'SwingBench still running after {timeout_secs} secs')
+                return False
+
+        if not wait_for_file(self.sb_results_xml_filename,
+                             max(deadline - time.monotonic(), 0),
+                             is_complete=results_xml_complete):
+            print(f'{self.sb_results_xml_filename} not completely written '
+                  f'within {timeout_secs} secs')
+            return False
+        return True
+
+
+def results_xml_complete(results_xml_file: str) -> bool:
+    """ True once the results xml exists & ends with its closing tag """
+    try:
+        with open(results_xml_file, 'rb') as results_xml_fh:
+            results_xml_fh.seek(0, 2)
+            size = results_xml_fh.tell()
+            results_xml_fh.seek(max(size - 64, 0))
+            return results_xml_fh.read().rstrip().endswith(_RESULTS_XML_END)
+    except FileNotFoundError:
+        return False
 
 
 def swingbench_standalone_runner() -> None:
@@ -22,14 +22,131 @@ from main() & other scenario() modules with the relevant parameters:
 2) run_remote_cmd() => run cmd in ssh-ed host and return raw streams
 3) store_op_to_py_variables() => run cmd in ssh-ed host & return processed o/p.
                                  This method helps to keep the code DRY.
+4) open_file_range() => open a remote file over SFTP from a byte offset, with
+                        the reads pipelined, as an alternative to `tail`
+                        over an exec channel.
+5) is_healthy() => check the connection is still up before reusing it.
+6) submit() => run a cmd on a channel of its own & return a future of its
+               CommandResult, so that several cmds run on a host at once
+               (ex.: a sampler, a log tail & the fault injection) over the
+               single SSH connection of the host.
+7) stream_lines() => run a cmd & iterate over the lines of its stdout &
+                     stderr as they arrive, each with its time of receipt.
+8) open_channel() => exec a cmd on a channel of its own & return the
+                     channel, for the caller to read.
+
+Failures are raised as SSHError subclasses: SSHConnectError when the host
+cannot be connected to within the connect, banner & auth timeouts,
+SSHCommandError when a cmd cannot be run & SSHPeerDeadError when the host
+stopped answering under an open connection, ex.: after a kernel panic. A
+dead host is detected within `dead_peer_secs` rather than the minutes of
+the OS TCP timeout, see ClientCls.
+
+Connecting costs a TCP & an SSH handshake, a key exchange and the public key
+authentication. So, instead of a ClientCls per phase of a run (HWMs, fault
+injection, excerpts), the phases share the connected clients of the
+process-wide `connection_pool`, keyed by (host, username, key_file, port):
+
+host_ssh_clientobj = cm6_paramiko.connection_pool.get(
+    host='172.16.30.1', username='ansible9', key_file='/home/.ssh/pvtkey')
+
+A pooled client found down is reconnected by get(). warm() connects to all
+nodes ahead, ex.: during the Swingbench ramp up, so that the fault injection
+does not wait on a handshake. close_all() closes the pooled clients.
 """
 
+import concurrent.futures
+import contextlib
+import io
 import json
 import pathlib
-from paramiko import SSHClient, RSAKey, AutoAddPolicy
+import select
+import socket
+import threading
+import time
+import typing
+from paramiko import SSHClient, SSHException, RSAKey, AutoAddPolicy
 
 THIS_DIR = pathlib.Path(__file__).absolute().parent # pylint: disable=invalid-name
 
+# bytes received from a channel at a time by submit()
+_RECV_BYTES = 32 * 1024
+
+
+class SSHError(Exception):
+    """Base of the errors connecting to or running cmds in a host."""
+
+    def __init__(self, host: str, message: str):
+        super().__init__(f'{host}: {message}')
+        self.host = host
+
+
+class SSHConnectError(SSHError):
+    """The host could not be connected to, authenticated with or in time."""
+
+
+class SSHCommandError(SSHError):
+    """A cmd could not be started in the host or its o/p read in full."""
+
+
+class SSHPeerDeadError(SSHError):
+    """The host stopped answering on an open connection."""
+
+
+class CommandResult(typing.NamedTuple):
+    """Outcome of a cmd run by ClientCls.submit()."""
+    command: str
+    exit_status: int
+    stdout: bytes
+    stderr: bytes
+
+
+class ReceivedLine(typing.NamedTuple):
+    """A line of o/p from ClientCls.stream_lines() & when it was received.
+
+    stream     => 'stdout' or 'stderr'
+    line       => the bytes of the line, without its newline
+    monotonic  => time.monotonic() at receipt, to measure intervals
+    wall_clock => time.time() at receipt (epoch secs), to correlate with the
+                  TPS readings (epoch ms) of the workload
+    """
+    stream: str
+    line: bytes
+    monotonic: float
+    wall_clock: float
+
+
+class LineStreamCls:
+    """Lines of a cmd running on a channel, as they arrive.
+
+    Iterating yields a ReceivedLine per line of stdout or stderr, stamped
+    with the time the chunk completing it was received. Once the iteration
+    is over, the channel is closed & exit_status holds the exit status of
+    the cmd (-1 if the channel closed without one).
+    """
+
+    def __init__(self, channel, chunks):
+        self.channel = channel
+        self.exit_status = None
+        self._chunks = chunks
+
+    def __iter__(self):
+        pending = {'stdout': b'', 'stderr': b''}
+        received_at = {}
+        try:
+            for stream, data, monotonic, wall_clock in self._chunks:
+                *lines, pending[stream] = (pending[stream] + data).split(b'\n')
+                received_at[stream] = (monotonic, wall_clock)
+                for line in lines:
+                    yield ReceivedLine(stream, line, monotonic, wall_clock)
+            # the last lines of a cmd may lack a newline
+            for stream, line in pending.items():
+                if line:
+                    yield ReceivedLine(stream, line, *received_at[stream])
+            self.exit_status = self.channel.recv_exit_status()
+        finally:
+            self.channel.close()
+
 
 class ClientCls:
     """ Provides paramiko client object to the caller and instance methods.
@@ -51,42 +168,408 @@ class ClientCls:
     stdout_bstr, stderr_bstr = stdout_raw.read(), stderr_raw.read()
     output_hostname_cmd = host_ssh_clientobj.store_op_to_py_variables(hostname)
     host_ssh_clientobj.garbage_clean()
+
+    The timeouts below are the defaults, each can be given to the
+    constructor. A host going away under an open connection (kernel panic,
+    reset, HBA failure) is detected by:
+    * an SSH keepalive sent every `keepalive_secs`, so that there is always
+      data waiting for an acknowledgement from the host,
+    * TCP_USER_TIMEOUT, which drops the connection once data stayed
+      unacknowledged for `dead_peer_secs` (Linux control nodes), plus TCP
+      keepalives probing the host every `keepalive_secs`.
+    The transport is then closed & the cmds on it fail with SSHPeerDeadError.
     """
+    # secs for the TCP connect, the SSH banner & the authentication each
+    connect_timeout = 10
+    banner_timeout = 10
+    auth_timeout = 10
+    keepalive_secs = 5
+    dead_peer_secs = 15
+    # secs without o/p after which reading the o/p of run_remote_cmd() fails
     exec_timeout = 30
+    # SFTP read requests kept in flight by open_file_range()
+    sftp_max_concurrent_requests = 64
+    # channels of submit() open at the same time, the cmds submitted beyond
+    # wait for one to be done; kept below the default MaxSessions (10) of
+    # sshd, which leaves room for run_remote_cmd() & SFTP
+    max_concurrent_channels = 8
 
-    def __init__(self, host, username, key_file, port=22):
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, host, username, key_file, port=22,
+                 connect_timeout=None, banner_timeout=None, auth_timeout=None,
+                 keepalive_secs=None, dead_peer_secs=None, exec_timeout=None):
+        self.host = host
         self.username = username
         self.key_file = key_file
+        for name, value in [('connect_timeout', connect_timeout),
+                            ('banner_timeout', banner_timeout),
+                            ('auth_timeout', auth_timeout),
+                            ('keepalive_secs', keepalive_secs),
+                            ('dead_peer_secs', dead_peer_secs),
+                            ('exec_timeout', exec_timeout)]:
+            if value is not None:
+                setattr(self, name, value)
+        self.sftp = None
+        # pooled clients are shared by threads, the SFTP session is opened
+        # once for all of them
+        self._sftp_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
         self.pkey = RSAKey.from_private_key_file(key_file)
         self.client = SSHClient()
         self.client.set_missing_host_key_policy(AutoAddPolicy())
-        self.client.connect(host, port, username=username, pkey=self.pkey)
+        try:
+            self.client.connect(host, port, username=username, pkey=self.pkey,
+                                timeout=self.connect_timeout,
+                                banner_timeout=self.banner_timeout,
+                                auth_timeout=self.auth_timeout)
+        except (SSHException, OSError) as inst:
+            self.client.close()
+            raise SSHConnectError(
+                host, f'could not connect to port {port}: {inst!r}') from inst
+        self._detect_dead_peer()
+
+    def _detect_dead_peer(self) -> None:
+        """Set up the keepalives & the TCP timeouts of the connection"""
+        transport = self.client.get_transport()
+        transport.set_keepalive(self.keepalive_secs)
+        sock = transport.sock
+        if not isinstance(sock, socket.socket):
+            return  # ex.: a proxy command
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # the TCP_* options are Linux specific
+        for option, value in [
+                ('TCP_USER_TIMEOUT', int(self.dead_peer_secs * 1000)),
+                ('TCP_KEEPIDLE', max(int(self.keepalive_secs), 1)),
+                ('TCP_KEEPINTVL', max(int(self.keepalive_secs), 1)),
+                ('TCP_KEEPCNT', max(int(self.dead_peer_secs //
+                                        self.keepalive_secs), 1))]:
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option),
+                                value)
 
     def garbage_clean(self):
         """ Close the SSHClient object and remove the object """
+        if self._executor is not None:
+            # the cmds still running end with the transport closed below
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._sftp_lock:
+            if self.sftp is not None:
+                self.sftp.close()
+                self.sftp = None
         if self.client is not None:
             self.client.close()
             self.client = None
 
+    def is_healthy(self) -> bool:
+        """True if the transport is up & a message can still be sent on it
+
+        An SSH ignore message is sent, which costs no round trip; it fails
+        once the transport or its socket got closed.
+        """
+        transport = (self.client.get_transport()
+                     if self.client is not None else None)
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        # pylint: disable-next=broad-except
+        except Exception:
+            return False
+        return True
+
     def run_remote_cmd(self, command: str) -> tuple:
-        """exec the cmd, return the raw stdout/stderr to the caller"""
+        """exec the cmd, return the raw stdout/stderr to the caller
+
+        Raises SSHPeerDeadError if the connection is down, else
+        SSHCommandError if the cmd could not be started. The o/p is to be
+        read within typed_read_errors() & then check_exited() called, so
+        that o/p cut short is not taken for the full o/p, ex.:
+
+        stdout_raw, _ = host_ssh_clientobj.run_remote_cmd(command)
+        with host_ssh_clientobj.typed_read_errors(command):
+            stdout_bstr = stdout_raw.read()
+        exit_status = host_ssh_clientobj.check_exited(command,
+                                                      stdout_raw.channel)
+        """
         try:
             _, stdout, stderr = self.client.exec_command(
                 command, timeout=self.exec_timeout)
-        # exceptions for failing remote SSH commands will be varied
-        # we want to catch and report any unexpected error to caller
+        # exceptions for failing remote SSH commands will be varied, they
+        # are reported to the caller as one of the SSHError
         # pylint: disable-next=broad-except
         except Exception as inst:
-            print(inst.args)
-            exit(1)
+            self._raise_if_peer_dead(inst)
+            raise SSHCommandError(self.host,
+                                  f'{command} failed: {inst!r}') from inst
         return stdout, stderr
 
+    @contextlib.contextmanager
+    def typed_read_errors(self, command: str):
+        """Raise the failures reading the o/p of the cmd as SSHError
+
+        A read of the ChannelFiles of run_remote_cmd() raises socket.timeout
+        once no o/p came for exec_timeout secs: SSHPeerDeadError is raised
+        instead if the connection is down, else SSHCommandError.
+        """
+        try:
+            yield
+        except (socket.timeout, SSHException) as inst:
+            self._raise_if_peer_dead(inst)
+            raise SSHCommandError(
+                self.host,
+                f'{command} failed reading its o/p: {inst!r}') from inst
+
+    def check_exited(self, command: str, channel) -> int:
+        """Return the exit status of a cmd of run_remote_cmd() once read
+
+        The ChannelFiles of a channel lost mid-cmd, ex.: the keepalive found
+        the host dead, read as at their EOF. So once the o/p was read,
+        SSHPeerDeadError is raised if the connection is down. A cmd that
+        sent no exit status was terminated by a signal, sshd sending the
+        signal instead (paramiko does not keep it): SSHCommandError is
+        raised, as its o/p may be cut short too.
+        """
+        # returns once the exit status came or the channel closed
+        exit_status = channel.recv_exit_status()
+        self._raise_if_peer_dead()
+        if exit_status == -1:
+            raise SSHCommandError(
+                self.host, f'{command} sent no exit status, it was '
+                f'terminated by a signal')
+        return exit_status
+
+    def _raise_if_peer_dead(self, cause: Exception = None) -> None:
+        """Raise SSHPeerDeadError if the transport of the client is down"""
+        transport = (self.client.get_transport()
+                     if self.client is not None else None)
+        if transport is None or not transport.is_active():
+            raise SSHPeerDeadError(
+                self.host, f'connection lost: '
+                f'{transport.get_exception() if transport else None!r}'
+            ) from cause
+
+    def submit(self, command: str,
+               timeout: float = None) -> concurrent.futures.Future:
+        """Run the cmd on a channel of its own, return a future of its result
+
+        Each cmd gets a channel multiplexed over the single transport of the
+        client, so the cmds submitted run concurrently on the host without
+        any more SSH handshakes, ex.:
+
+        sampler_future = host_ssh_clientobj.submit('vmstat 1 120')
+        kill_future = host_ssh_clientobj.submit('sudo kill -9 1234')
+        print(kill_future.result().exit_status)
+
+        The future resolves to a CommandResult once the cmd exited, with
+        stdout & stderr read as they arrive, or raises the error that kept
+        the cmd from running. With `timeout` (secs), the channel is closed
+        & TimeoutError raised if the cmd is not done by then.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrent_channels,
+                    thread_name_prefix=f'ssh-{self.host}')
+            return self._executor.submit(self._run_on_channel, command,
+                                         timeout)
+
+    def _run_on_channel(self, command: str, timeout: float) -> CommandResult:
+        """exec the cmd on a new channel & collect its o/p till it exited"""
+        channel = self.open_channel(command)
+        try:
+            output = {'stdout': io.BytesIO(), 'stderr': io.BytesIO()}
+            for stream, data, _, _ in self._recv_chunks(channel, command,
+                                                        timeout):
+                output[stream].write(data)
+            return CommandResult(command, channel.recv_exit_status(),
+                                 output['stdout'].getvalue(),
+                                 output['stderr'].getvalue())
+        finally:
+            channel.close()
+
+    def stream_lines(self, command: str,
+                     timeout: float = None) -> LineStreamCls:
+        """exec the cmd on a new channel, return its lines as they arrive
+
+        Unlike run_remote_cmd(), whose o/p can only be read in full once
+        the cmd is done, each line is handed out as soon as it is received,
+        stamped with its time of receipt, ex.:
+
+        line_stream = host_ssh_clientobj.stream_lines('sudo kill -9 1234')
+        for received in line_stream:
+            print(received.wall_clock, received.stream, received.line)
+        print(line_stream.exit_status)
+
+        With `timeout` (secs), the iteration raises TimeoutError if the cmd
+        is not done by then.
+        """
+        channel = self.open_channel(command)
+        return LineStreamCls(channel, self._recv_chunks(channel, command,
+                                                        timeout))
+
+    def open_channel(self, command: str):
+        """Open a new channel on the transport & exec the cmd on it
+
+        The channel is for the caller to read & close, ex.: cm12_async_ssh
+        reads it from an event loop. SSHCommandError is raised if the cmd
+        cannot be run, SSHPeerDeadError if the host stopped answering.
+        """
+        try:
+            channel = self.client.get_transport().open_session(
+                timeout=self.exec_timeout)
+        # pylint: disable-next=broad-except
+        except Exception as inst:
+            self._raise_if_peer_dead(inst)
+            raise SSHCommandError(self.host,
+                                  f'{command} failed: {inst!r}') from inst
+        try:
+            channel.exec_command(command)
+        # pylint: disable-next=broad-except
+        except Exception as inst:
+            channel.close()
+            self._raise_if_peer_dead(inst)
+            raise SSHCommandError(self.host,
+                                  f'{command} failed: {inst!r}') from inst
+        return channel
+
+    def _recv_chunks(self, channel, command: str, timeout: float):
+        """Yield (stream, data, monotonic, wall_clock) as received till EOF
+
+        stream is 'stdout' or 'stderr', the times are those of receipt.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # stdout & stderr are drained alike: an unread one would fill the
+        # window of the channel & stall the cmd
+        while True:
+            while channel.recv_ready():
+                data = channel.recv(_RECV_BYTES)
+                yield 'stdout', data, time.monotonic(), time.time()
+            while channel.recv_stderr_ready():
+                data = channel.recv_stderr(_RECV_BYTES)
+                yield 'stderr', data, time.monotonic(), time.time()
+            if (channel.eof_received or channel.closed) and not (
+                    channel.recv_ready() or channel.recv_stderr_ready()):
+                if not channel.eof_received:
+                    # closed under the cmd, ex.: the dead peer detected
+                    self._raise_if_peer_dead()
+                return
+            remaining_secs = (None if deadline is None else
+                              deadline - time.monotonic())
+            if remaining_secs is not None and remaining_secs <= 0:
+                raise TimeoutError(f'{command} not done within '
+                                   f'{timeout} secs on {self.host}')
+            # readable as soon as o/p or the EOF arrives
+            select.select([channel], [], [], remaining_secs)
+
+    def open_file_range(self, path: str, offset: int):
+        """Open a remote file over SFTP for reading from the byte offset
+
+        The reads up to the size of the file at the time of the call are
+        requested ahead, many at a time (see sftp_max_concurrent_requests),
+        so that reading runs at the speed of the link rather than paying a
+        round trip per read; bytes appended later are read as well. The file
+        is read with the permissions of the SSH user, so files that need
+        `sudo` to be read raise PermissionError: run_remote_cmd() is the way
+        to read those. Use as a context manager:
+
+        with host_ssh_clientobj.open_file_range(logfile, 1669912) as file:
+            chunk = file.read(65536)
+        """
+        with self._sftp_lock:
+            if self.sftp is None:
+                self.sftp = self.client.open_sftp()
+            sftp = self.sftp
+        remote_file = sftp.open(path, 'rb')
+        try:
+            file_size = remote_file.stat().st_size
+            remote_file.seek(offset)
+            remote_file.prefetch(file_size, self.sftp_max_concurrent_requests)
+        except BaseException:
+            remote_file.close()
+            raise
+        return remote_file
+
     # Additional facility
     # function to run facts gathering commands and return decoded stdout
     def store_op_to_py_variables(self, command: str) -> str:
-        """exec the cmd, return the utf-decoded text to the caller"""
+        """exec the cmd, return the utf-decoded text to the caller
+
+        Raises SSHError if the o/p could not be read in full, see
+        check_exited().
+        """
         stdout, _ = self.run_remote_cmd(command)
-        return stdout.read().decode()
+        with self.typed_read_errors(command):
+            output = stdout.read()
+        self.check_exited(command, stdout.channel)
+        return output.decode()
+
+
+class ConnectionPoolCls:
+    """Process-wide pool of connected ClientCls, one per host & credentials.
+
+    get() hands out the pooled client of (host, username, key_file, port),
+    connecting it on first use & reconnecting it if it is no longer healthy.
+    The pooled clients are shared, so the callers do not garbage_clean()
+    them; close_all() does once the run is over.
+
+    Different hosts are connected concurrently, while concurrent get() of
+    the same host wait for a single connection. client_options are the
+    keyword args the clients are constructed with, ex.:
+    {'connect_timeout': 5, 'dead_peer_secs': 10}, see ClientCls.
+    """
+
+    def __init__(self, **client_options):
+        self.client_options = client_options
+        self._clients = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, username, key_file, port=22) -> ClientCls:
+        """Return the connected client of the host, connecting if needed"""
+        key = (host, username, str(key_file), port)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_healthy():
+                print(f'Reconnecting to {host}, the pooled SSH connection '
+                      f'is down')
+                client.garbage_clean()
+                client = None
+            if client is None:
+                client = ClientCls(host=host, username=username,
+                                   key_file=key_file, port=port,
+                                   **self.client_options)
+                self._clients[key] = client
+            return client
+
+    def warm(self, hosts: list, username, key_file, port=22) -> dict:
+        """Connect to all hosts concurrently, return the failures by host
+
+        Ex.: {'172.16.30.2': "TimeoutError('timed out')"}, the hosts that
+        failed are connected again by their next get().
+        """
+        failures = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(hosts) or 1) as executor:
+            futures = {executor.submit(self.get, host, username, key_file,
+                                       port): host for host in hosts}
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    failures[futures[future]] = repr(future.exception())
+        return failures
+
+    def close_all(self) -> None:
+        """Close all the pooled clients"""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.garbage_clean()
+
+
+connection_pool = ConnectionPoolCls()
 
 
 # Following code is to do unit test of just this module independently
@@ -0,0 +1,421 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module with vectorized NumPy operations on the Swingbench TPS timeseries
+
+The <TPSReadings> of a Swingbench results xml are decoded straight into a
+2-column int64 array, one row per reading:
+
+    array([[1658003925819,             0],     <= [epoch ms timestamp, TPS]
+           [1658003926819,             0],
+           ...
+           [1658003963829,           127],
+           ...])
+
+Besides the outages (zero TPS), brownouts (partially degraded TPS) are
+detected against a rolling baseline.
+
+All searches over the series are done with boolean masks, `argmax` and run
+length encoding instead of a per-sample Python loop, so that even multi-day
+series are processed in milliseconds.
+"""
+import typing
+
+import numpy as np
+
+# column positions in the decoded (timestamp, TPS) array
+TIMESTAMP_COL = 0
+TPS_COL = 1
+
+# a TPS above this value after a series of zero TPS marks the end of outage
+RECOVERY_TPS = 100
+
+
+def decode_tps_readings(csv_timeseries: str,
+                        unpaired: np.ndarray = None) -> tuple:
+    """Decode comma separated readings into a (n, 2) int64 array.
+
+    `csv_timeseries` is the text of <TPSReadings>, or a piece of it that ends
+    on a complete token, ex.: '1658003925819, 0,1658003926819, 0,'
+
+    An odd reading out (a timestamp whose TPS value has not been seen yet) is
+    returned as the second element of the tuple, so it can be handed back in
+    as `unpaired` along with the next piece of text. None (the text of an
+    empty <TPSReadings/>) or blank text decodes into a (0, 2) array.
+    """
+    # blank tokens, ex.: after the trailing comma, are no readings
+    values = np.array([token for token in (csv_timeseries or '').split(',')
+                       if token.strip()], dtype=np.int64)
+    if unpaired is not None and unpaired.size:
+        values = np.concatenate((unpaired, values))
+
+    paired_len = values.size - values.size % 2
+    return values[:paired_len].reshape(-1, 2), values[paired_len:]
+
+
+class OutageWindow(typing.NamedTuple):
+    """One window of zero TPS, from outage start to outage end.
+
+    start             => epoch ms of the first zero TPS reading of the window
+    end               => epoch ms of the first reading with TPS >
+                         RECOVERY_TPS after start, or of the last reading of
+                         the run if `ongoing`
+    duration          => (end - start) in seconds
+    zero_tps_readings => count of zero TPS readings inside the window, the
+                         others being the low TPS readings of the recovery
+    ongoing           => True if the run ended while still in the outage
+    """
+    start: int
+    end: int
+    duration: float
+    zero_tps_readings: int
+    ongoing: bool
+
+
+class OutageWindowDetector:
+    """Run-length based detector of every outage window in a TPS series.
+
+    Each reading after workload start (the first non-zero TPS) is classified
+    as entering an outage (TPS == 0), leaving it (TPS > RECOVERY_TPS) or
+    neither, in which case the reading inherits the state of the preceding
+    reading. The resulting in-outage mask is run-length encoded and each run
+    of True is one outage window. Everything is done with vectorized
+    operations in a single linear pass over the series.
+
+    The series may be fed in consecutive chunks, the state of a window still
+    open at the end of a chunk is carried over to the next one:
+
+        detector = OutageWindowDetector()
+        for tps_series in chunks:
+            detector.feed(tps_series)
+        outage_windows = detector.finish()
+    """
+
+    def __init__(self):
+        self.workload_start = 0
+        self.outage_windows = []
+        self._in_outage = False
+        self._open_start = 0
+        self._open_zero_tps_readings = 0
+        self._last_timestamp = 0
+
+    @property
+    def in_outage(self) -> bool:
+        """True while the readings fed so far end inside an outage window"""
+        return self._in_outage
+
+    @property
+    def open_window_start(self) -> int:
+        """Epoch ms start of the outage window still open, 0 if none"""
+        return self._open_start if self._in_outage else 0
+
+    def feed(self, tps_series: np.ndarray) -> None:
+        """Detect the outage windows opened or closed in a chunk of readings"""
+        if not len(tps_series):
+            return
+
+        timestamps = tps_series[:, TIMESTAMP_COL]
+        tps = tps_series[:, TPS_COL]
+        self._last_timestamp = int(timestamps[-1])
+
+        # Till Swingbench ramps up, the TPS will be all 0s initially
+        if self.workload_start == 0:
+            started = tps != 0
+            idx = int(started.argmax())
+            if not started[idx]:
+                return
+            self.workload_start = int(timestamps[idx])
+            timestamps, tps = timestamps[idx:], tps[idx:]
+
+        in_outage = self._in_outage_mask(tps)
+
+        # run-length encode the mask: +1 marks the reading where a run of
+        # True starts and -1 the first reading after it (the recovery)
+        edges = np.diff(np.concatenate(
+            ([self._in_outage], in_outage, [False])).astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        if self._in_outage:
+            # the window carried over from the preceding chunk
+            run_starts = np.concatenate(([0], run_starts))
+
+        # zero TPS readings of every run, summed over [run start, run end);
+        # the appended 0 keeps a run end equal to len(tps) a valid index
+        bounds = np.column_stack((run_starts, run_ends)).ravel()
+        zero_tps_readings = np.add.reduceat(
+            np.append(tps == 0, False).astype(np.int64), bounds)[::2] \
+            if bounds.size else []
+
+        for run_idx, (run_start, run_end) in enumerate(
+                zip(run_starts, run_ends)):
+            window_start = int(timestamps[run_start])
+            window_zero_tps_readings = int(zero_tps_readings[run_idx])
+            if run_idx == 0 and self._in_outage:
+                window_start = self._open_start
+                window_zero_tps_readings += self._open_zero_tps_readings
+
+            if run_end == len(tps):
+                # still in the outage at the end of this chunk
+                self._open_start = window_start
+                self._open_zero_tps_readings = window_zero_tps_readings
+                break
+
+            window_end = int(timestamps[run_end])
+            self.outage_windows.append(OutageWindow(
+                window_start, window_end, (window_end - window_start) / 1000,
+                window_zero_tps_readings, False))
+
+        self._in_outage = bool(in_outage[-1])
+
+    def finish(self) -> list:
+        """Close a window still open at the end of the run & return them all"""
+        if self._in_outage:
+            self.outage_windows.append(OutageWindow(
+                self._open_start, self._last_timestamp,
+                (self._last_timestamp - self._open_start) / 1000,
+                self._open_zero_tps_readings, True))
+            self._in_outage = False
+        return self.outage_windows
+
+    def _in_outage_mask(self, tps: np.ndarray) -> np.ndarray:
+        """Forward fill the last enter/leave outage decision per reading"""
+        decision = np.full(tps.shape, -1, dtype=np.int8)
+        decision[tps == 0] = 1
+        decision[tps > RECOVERY_TPS] = 0
+
+        # index of the last reading (at or before each reading) that took
+        # a decision, -1 while no decision has been taken in this chunk
+        decided_idx = np.where(decision != -1, np.arange(tps.size), -1)
+        np.maximum.accumulate(decided_idx, out=decided_idx)
+
+        return np.where(decided_idx >= 0, decision[decided_idx] == 1,
+                        self._in_outage)
+
+
+def find_outage_windows(tps_series: np.ndarray) -> list:
+    """Return the OutageWindow list of a whole (n, 2) array of readings"""
+    detector = OutageWindowDetector()
+    detector.feed(tps_series)
+    return detector.finish()
+
+
+class BrownoutWindow(typing.NamedTuple):
+    """One window of degraded, but non-zero, throughput.
+
+    start        => epoch ms of the first degraded reading of the window
+    end          => epoch ms of the first reading no longer degraded, or of
+                    the last reading of the run if `ongoing`
+    duration     => (end - start) in seconds
+    baseline_tps => rolling baseline TPS at the start of the window
+    min_tps      => lowest TPS seen inside the window
+    depth        => 1 - (mean TPS inside the window / baseline_tps),
+                    ex.: 0.4 for a window where TPS dropped by 40%
+    ongoing      => True if the run ended while still degraded
+    """
+    start: int
+    end: int
+    duration: float
+    baseline_tps: float
+    min_tps: int
+    depth: float
+    ongoing: bool
+
+
+class BrownoutDetector:
+    """Rolling baseline detector of partial throughput degradation.
+
+    Outages (TPS == 0) are covered by OutageWindowDetector, the costly events
+    in production however are often brownouts like a 40% drop of TPS for a
+    minute during a CRS reconfiguration. For each reading after workload
+    start two trailing means are compared:
+    * smoothed TPS => mean over the last `smoothing_window` readings, which
+                      evens out the reading to reading jitter
+    * baseline TPS => mean of the non-zero readings among the
+                      `baseline_window` readings preceding the smoothing
+                      window
+
+    A brownout starts at the first reading with a non-zero TPS whose
+    smoothed TPS is more than `min_drop` below the baseline. The baseline is
+    then frozen at that value, so that the brownout does not drag its own
+    baseline down, and the brownout ends at the first reading whose smoothed
+    TPS is back within `min_drop` of the frozen baseline. Brownouts lasting
+    at least `min_duration_secs` are reported as BrownoutWindow. A TPS
+    sliding towards an outage opens a brownout that encloses the outage
+    (min_tps is 0 then), the recovery ramp after an outage is usually a
+    brownout of its own.
+
+    Both means are differences of integer cumulative sums and the end of a
+    brownout is searched for in exponentially growing blocks, so detection
+    stays O(n) and gives identical results irrespective of how the series
+    is chunked.
+
+    The series may be fed in consecutive chunks, exactly like with
+    OutageWindowDetector.
+    """
+
+    def __init__(self, smoothing_window: int = 10, baseline_window: int = 300,
+                 min_drop: float = 0.3, min_duration_secs: float = 10):
+        self.smoothing_window = smoothing_window
+        self.baseline_window = baseline_window
+        self.min_drop = min_drop
+        self.min_duration_secs = min_duration_secs
+        self.workload_start = 0
+        self.brownout_windows = []
+        # readings needed ahead of a reading to compute both of its means
+        self._history_len = smoothing_window + baseline_window - 1
+        self._history = np.empty(0, dtype=np.int64)
+        self._open_window = None  # [start, baseline, min TPS, sum, count]
+        self._last_timestamp = 0
+
+    def feed(self, tps_series: np.ndarray) -> None:
+        """Detect the brownout windows opened or closed in a chunk"""
+        if not len(tps_series):
+            return
+
+        timestamps = tps_series[:, TIMESTAMP_COL]
+        tps = tps_series[:, TPS_COL]
+        self._last_timestamp = int(timestamps[-1])
+
+        # the ramp up readings would drag the baseline down
+        if self.workload_start == 0:
+            started = tps != 0
+            idx = int(started.argmax())
+            if not started[idx]:
+                return
+            self.workload_start = int(timestamps[idx])
+            timestamps, tps = timestamps[idx:], tps[idx:]
+
+        smoothed, baseline = self._trailing_means(tps)
+        threshold = (1 - self.min_drop) * baseline
+        with np.errstate(invalid='ignore'):
+            brownout_starts = np.flatnonzero((tps != 0) &
+                                             (smoothed < threshold))
+
+        pos = 0
+        while pos < len(tps):
+            if self._open_window is None:
+                next_start = np.searchsorted(brownout_starts, pos)
+                if next_start == len(brownout_starts):
+                    break
+                pos = int(brownout_starts[next_start])
+                self._open_window = [int(timestamps[pos]),
+                                     float(baseline[pos]), int(tps[pos]), 0,
+                                     0]
+
+            end = _first_at_or_above(
+                smoothed, pos,
+                (1 - self.min_drop) * self._open_window[1])
+            if end > pos:
+                window_tps = tps[pos:end]
+                self._open_window[2] = min(self._open_window[2],
+                                           int(window_tps.min()))
+                self._open_window[3] += int(window_tps.sum())
+                self._open_window[4] += window_tps.size
+
+            if end == len(tps):
+                # still degraded at the end of this chunk
+                break
+            self._close_window(int(timestamps[end]), False)
+            pos = end
+
+    def finish(self) -> list:
+        """Close a window still open at the end of the run & return them all"""
+        if self._open_window is not None:
+            self._close_window(self._last_timestamp, True)
+        return self.brownout_windows
+
+    def _trailing_means(self, tps: np.ndarray) -> tuple:
+        """Smoothed & baseline TPS trailing each reading of a chunk
+
+        The readings carried over from the preceding chunks are prepended, so
+        the trailing windows of the first readings of the chunk are complete.
+        The baseline is NaN while its window has fewer than
+        `smoothing_window` non-zero readings.
+        """
+        history_len = self._history.size
+        values = np.concatenate((self._history, tps))
+        self._history = values[-self._history_len:]
+
+        cumsum = np.concatenate(([0], np.cumsum(values)))
+        nonzero_cumsum = np.concatenate(([0], np.cumsum(values != 0)))
+
+        # cumsum positions bounding the trailing windows of each new reading
+        upto = np.arange(history_len, values.size) + 1
+        smoothing_from = np.maximum(upto - self.smoothing_window, 0)
+        baseline_from = np.maximum(
+            upto - self.smoothing_window - self.baseline_window, 0)
+
+        smoothed = (cumsum[upto] - cumsum[smoothing_from]) / (
+            upto - smoothing_from)
+
+        baseline_sum = cumsum[smoothing_from] - cumsum[baseline_from]
+        baseline_count = (nonzero_cumsum[smoothing_from] -
+                          nonzero_cumsum[baseline_from])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            baseline = np.where(baseline_count >= self.smoothing_window,
+                                baseline_sum / baseline_count, np.nan)
+        return smoothed, baseline
+
+    def _close_window(self, end: int, ongoing: bool) -> None:
+        start, baseline_tps, min_tps, tps_sum, tps_count = self._open_window
+        self._open_window = None
+        duration = (end - start) / 1000
+        if duration < self.min_duration_secs:
+            return
+        self.brownout_windows.append(BrownoutWindow(
+            start, end, duration, round(baseline_tps, 2), min_tps,
+            round(1 - tps_sum / tps_count / baseline_tps, 3), ongoing))
+
+
+def _first_at_or_above(values: np.ndarray, pos: int, threshold: float) -> int:
+    """Index of the first value >= threshold from pos on, len(values) if none
+
+    The values are compared in exponentially growing blocks, so the cost is
+    proportional to the distance to the index found, not to len(values).
+    """
+    block_len = 256
+    while pos < len(values):
+        block = values[pos:pos + block_len] >= threshold
+        idx = int(block.argmax())
+        if block[idx]:
+            return pos + idx
+        pos += block_len
+        block_len *= 2
+    return len(values)
+
+
+def find_brownout_windows(tps_series: np.ndarray, **detector_kwargs) -> list:
+    """Return the BrownoutWindow list of a whole (n, 2) array of readings"""
+    detector = BrownoutDetector(**detector_kwargs)
+    detector.feed(tps_series)
+    return detector.finish()
+
+
+def tps_timeseries_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    sample_csv_timeseries = ''.join(
+        [f'{1658003925819 + i * 1000}, {tps},' for i, tps in
+         enumerate([0, 0, 120, 118, 0, 0, 0, 45, 121, 119])])
+
+    tps_series, _ = decode_tps_readings(sample_csv_timeseries)
+    print(tps_series)
+    print(find_outage_windows(tps_series))
+    print(find_brownout_windows(tps_series, smoothing_window=1,
+                                baseline_window=2, min_duration_secs=1))
+
+
+if __name__ == '__main__':
+    tps_timeseries_standalone_runner()
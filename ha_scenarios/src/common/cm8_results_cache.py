@@ -0,0 +1,236 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for the sidecar cache of parsed Swingbench results
+
+Re-analysing an archive of run directories would otherwise re-parse every
+<run_id>.xml from scratch. Next to each parsed results file 2 sidecar files
+are written:
+* <run_id>.xml.tps.npy       => the decoded (n, 2) int64 TPS series, loaded
+                                back memory-mapped
+* <run_id>.xml.summary.json  => the cache key & the computed outage summary
+
+ex.:
+    logs/1661415592_Aug2522_011952_instancedown/
+        1661415592_Aug2522_011952.xml
+        1661415592_Aug2522_011952.xml.tps.npy
+        1661415592_Aug2522_011952.xml.summary.json
+
+The cache key is the sha256 of the results file content plus the parser
+version. An entry whose key does not match (results file rewritten, parser
+logic changed) is stale and ignored, so it gets overwritten on the next
+store. As hashing a large results file costs about as much as parsing it,
+the size & mtime of the results file are recorded along with the hash and
+the file is only re-hashed when either of them changed. When the content
+turns out to be the same (file touched or copied around), the new size &
+mtime are recorded, so the file is not re-hashed on the next loads.
+
+The key of an entry is taken before the results file is parsed & the entry
+is only stored if the file is unchanged since, so that the results of a
+file still being written are never recorded under the key of other content.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import typing
+
+import numpy as np
+
+# size of the reads while hashing the results xml file
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+_TPS_SUFFIX = '.tps.npy'
+_SUMMARY_SUFFIX = '.summary.json'
+
+
+class CachedResults(typing.NamedTuple):
+    """A valid cache entry of a results file.
+
+    tps_series => (n, 2) int64 array of (epoch ms timestamp, TPS) readings,
+                  memory-mapped read-only
+    summary    => dict the parser stored along with the series
+    """
+    tps_series: np.ndarray
+    summary: dict
+
+
+class ContentKey(typing.NamedTuple):
+    """Key of the content of a results file, taken before it is parsed.
+
+    sha256   => hex digest of the content
+    size     => st_size of the file when it was hashed
+    mtime_ns => st_mtime_ns of the file when it was hashed
+    """
+    sha256: str
+    size: int
+    mtime_ns: int
+
+
+class ResultsCacheCls:
+    """Load & store the sidecar cache entry of one Swingbench results file.
+
+    By default the sidecar files live next to the results file, `cache_dir`
+    places them elsewhere (ex.: for a read-only archive of runs):
+
+        results_cache = ResultsCacheCls(resultsxml_file, parser_version=1)
+        cached_results = results_cache.load()
+        if cached_results is None:
+            content_key = results_cache.content_key()
+            ...  # parse the results file
+            results_cache.store(tps_series, summary, content_key)
+    """
+
+    def __init__(self, resultsxml_file: str, parser_version: int,
+                 cache_dir: str = None):
+        self.resultsxml_file = pathlib.Path(resultsxml_file)
+        self.parser_version = parser_version
+        sidecar_dir = pathlib.Path(cache_dir) if cache_dir else \
+            self.resultsxml_file.parent
+        self.tps_file = sidecar_dir / (self.resultsxml_file.name + _TPS_SUFFIX)
+        self.summary_file = sidecar_dir / (self.resultsxml_file.name +
+                                           _SUMMARY_SUFFIX)
+        # the key hashed by load(), reused by content_key()
+        self._content_key = None
+
+    def load(self) -> typing.Optional[CachedResults]:
+        """Return the cache entry, None if it is missing or stale"""
+        try:
+            with open(self.summary_file, encoding='utf-8') as summary_fh:
+                cache_entry = json.load(summary_fh)
+        except (OSError, ValueError):
+            return None
+
+        if cache_entry.get('parser_version') != self.parser_version:
+            return None
+
+        resultsxml_stat = self.resultsxml_file.stat()
+        stat_changed = (
+            cache_entry.get('size') != resultsxml_stat.st_size or
+            cache_entry.get('mtime_ns') != resultsxml_stat.st_mtime_ns)
+        # touched or copied around, still valid if the content is the same
+        if stat_changed and \
+                cache_entry.get('sha256') != self.content_key().sha256:
+            return None
+
+        try:
+            tps_series = np.load(self.tps_file, mmap_mode='r',
+                                 allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+        if stat_changed:
+            cache_entry['size'] = resultsxml_stat.st_size
+            cache_entry['mtime_ns'] = resultsxml_stat.st_mtime_ns
+            try:
+                self._write_summary(cache_entry)
+            except OSError as err:
+                print(f'Could not refresh the results cache of '
+                      f'{self.resultsxml_file}: {err}')
+        return CachedResults(tps_series, cache_entry['summary'])
+
+    def store(self, tps_series: np.ndarray, summary: dict,
+              content_key: ContentKey) -> None:
+        """Write the sidecar files, replacing a stale entry atomically
+
+        content_key is that of the content parsed, see content_key(). The
+        entry is not stored if the results file changed since, ex.: it was
+        still being written. The summary (json) is written last, so a
+        partially written entry is never taken for a valid one. Failing to
+        write the cache (ex.: a read-only archive) does not fail the
+        analysis.
+        """
+        resultsxml_stat = self.resultsxml_file.stat()
+        if (resultsxml_stat.st_size, resultsxml_stat.st_mtime_ns) != \
+                (content_key.size, content_key.mtime_ns):
+            print(f'Not caching the results of {self.resultsxml_file}, it '
+                  f'changed while it was parsed')
+            return
+        cache_entry = {
+            'parser_version': self.parser_version,
+            'sha256': content_key.sha256,
+            'size': content_key.size,
+            'mtime_ns': content_key.mtime_ns,
+            'summary': summary,
+        }
+        try:
+            self.tps_file.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write(self.tps_file,
+                          lambda fh: np.save(fh, np.ascontiguousarray(
+                              tps_series, dtype=np.int64)))
+            self._write_summary(cache_entry)
+        except OSError as err:
+            print(f'Could not write the results cache of '
+                  f'{self.resultsxml_file}: {err}')
+
+    def _write_summary(self, cache_entry: dict) -> None:
+        """Replace the summary (json) sidecar by the cache entry"""
+        _atomic_write(self.summary_file,
+                      lambda fh: fh.write(json.dumps(cache_entry).encode()))
+
+    def content_key(self) -> ContentKey:
+        """ContentKey of the results file as it is now
+
+        The file is only hashed again if its size or mtime changed since
+        the last call, ex.: the one of load().
+        """
+        resultsxml_stat = self.resultsxml_file.stat()
+        if self._content_key is None or \
+                (self._content_key.size, self._content_key.mtime_ns) != \
+                (resultsxml_stat.st_size, resultsxml_stat.st_mtime_ns):
+            # stat before hashing: a write meanwhile changes the mtime
+            self._content_key = ContentKey(self.content_hash(),
+                                           resultsxml_stat.st_size,
+                                           resultsxml_stat.st_mtime_ns)
+        return self._content_key
+
+    def content_hash(self) -> str:
+        """sha256 hex digest of the results file content"""
+        sha256 = hashlib.sha256()
+        with open(self.resultsxml_file, 'rb') as resultsxml_fh:
+            while True:
+                chunk = resultsxml_fh.read(_HASH_CHUNK_BYTES)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+
+def _atomic_write(target_file: pathlib.Path, write_content) -> None:
+    """Write through a temporary file renamed over the target when complete"""
+    tmp_file = target_file.with_name(f'.{target_file.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp_file, 'wb') as tmp_fh:
+            write_content(tmp_fh)
+        os.replace(tmp_file, target_file)
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+
+
+def results_cache_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    this_dir = pathlib.Path(__file__).absolute().parent
+    sample_xml_filename = this_dir/'../../tests/testdata/1661415592_Aug2522_011952.xml'
+
+    results_cache = ResultsCacheCls(sample_xml_filename, parser_version=0,
+                                    cache_dir='/tmp')
+    print(f'content hash: {results_cache.content_hash()}')
+    print(f'cached results: {results_cache.load()}')
+
+
+if __name__ == '__main__':
+    results_cache_standalone_runner()
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module that analyses a whole archive of scenario run directories
+
+Every scenario run creates a log location under --log_dest of the form
+<log_dest>/<run_id>_<scenario>, holding the Swingbench results xml named
+<run_id>.xml and the runlog named <run_id>_runlog, ex.:
+
+    logs/
+        1658003923_Jul1622_133843_oracleinst_down/
+            1658003923_Jul1622_133843.xml
+            1658003923_Jul1622_133843_runlog
+            ...
+        1661415592_Aug2522_011952_testing/
+            ...
+
+find_runs() walks an archive root for such run directories and
+analyse_runs() parses their results files across a process pool sized to
+the cores. Each run is parsed in its own worker independently of the
+others, so the throughput grows about linearly with the cores. The outcome
+is one row per run, written out as a single CSV summary table by
+write_summary_table().
+"""
+import concurrent.futures
+import contextlib
+import csv
+import os
+import pathlib
+import re
+import sys
+import typing
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent.parent))  # current directory structure is:
+# <root> > src > common > <common module like the current  one>
+
+# pylint: disable-next=import-error,wrong-import-position
+from src.common.cm2_parse_resultsxml import ParseSwingbenchRunXML
+
+# <run_id>_<scenario>, ex.: 1658003923_Jul1622_133843_oracleinst_down
+_RUN_DIR_PATTERN = re.compile(
+    r'^(?P<run_id>\d+_[A-Z][a-z]{2}\d{4}_\d{6})_(?P<scenario>\w+)$')
+
+# the node under fault injection as logged by main to the runlog
+_NODE_PATTERNS = [re.compile(r'Fault injection node: (?P<node>\S+)'),
+                  re.compile(r"'node_ip_to_test': '(?P<node>[^']+)'")]
+
+SUMMARY_COLUMNS = ['run_id', 'scenario', 'node', 'workload_start',
+                   'outage_start', 'outage_end', 'outage_duration',
+                   'outage_window_count', 'total_outage_secs',
+                   'outage_windows', 'brownout_window_count', 'error']
+
+
+class RunDir(typing.NamedTuple):
+    """One scenario run directory of the archive."""
+    run_id: str
+    scenario: str
+    path: str
+
+
+def run_dir_of(run_path: str) -> RunDir:
+    """RunDir of a <run_id>_<scenario> directory, None for other names"""
+    match = _RUN_DIR_PATTERN.match(os.path.basename(os.path.normpath(
+        run_path)))
+    if match is None:
+        return None
+    return RunDir(match['run_id'], match['scenario'], run_path)
+
+
+def find_runs(archive_root: str) -> list:
+    """Return a RunDir for every run directory holding its results xml
+
+    The walk does not descend into the run directories themselves.
+    """
+    runs = []
+    for dirpath, dirnames, _ in os.walk(archive_root):
+        for dirname in list(dirnames):
+            run = run_dir_of(os.path.join(dirpath, dirname))
+            if run is None:
+                continue
+            dirnames.remove(dirname)
+            if os.path.isfile(os.path.join(run.path, f'{run.run_id}.xml')):
+                runs.append(run)
+    return sorted(runs)
+
+
+def analyse_run(run: RunDir, use_cache: bool = True,
+                cache_dir: str = None) -> dict:
+    """Parse the results xml of one run into a row of the summary table
+
+    A run failing to parse gets a row with the `error` column filled in, so
+    a single corrupt results file does not abort the whole archive.
+    """
+    row = dict.fromkeys(SUMMARY_COLUMNS, '')
+    row.update(run_id=run.run_id, scenario=run.scenario,
+               node=_node_under_test(run))
+
+    parse_swingbench_run = ParseSwingbenchRunXML(
+        resultsxml_file=os.path.join(run.path, f'{run.run_id}.xml'),
+        streaming=True, use_cache=use_cache, cache_dir=cache_dir)
+    try:
+        # the per-run summary printed by the parser would flood the console
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            parse_swingbench_run.parse_swingbench_resultsxml()
+    except Exception as err:  # pylint: disable=broad-except
+        row['error'] = f'{type(err).__name__}: {err}'
+        return row
+
+    outage_windows = parse_swingbench_run.outage_windows
+    row.update(
+        workload_start=parse_swingbench_run.workload_start,
+        outage_start=parse_swingbench_run.outage_start,
+        outage_end=parse_swingbench_run.outage_end,
+        outage_duration=parse_swingbench_run.outage_duration,
+        outage_window_count=len(outage_windows),
+        total_outage_secs=round(
+            sum(window.duration for window in outage_windows), 3),
+        # start-end[+ if ongoing] of each window, ex.: 1658004016839-
+        # 1658004072851;1658004101851-1658004102851
+        outage_windows=';'.join(
+            f'{window.start}-{window.end}{"+" if window.ongoing else ""}'
+            for window in outage_windows),
+        brownout_window_count=len(parse_swingbench_run.brownout_windows))
+    return row
+
+
+def analyse_runs(runs: list, workers: int = None, use_cache: bool = True,
+                 cache_dir: str = None) -> list:
+    """Analyse the runs across a pool of `workers` processes (default cores)
+
+    The rows are returned in the order of `runs`.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(runs) <= 1:
+        return [analyse_run(run, use_cache, cache_dir) for run in runs]
+
+    # several runs per task keeps the inter-process overhead low on an
+    # archive of thousands of small results files, while leaving enough
+    # tasks for the workers to balance out uneven run lengths
+    chunksize = max(1, len(runs) // (workers * 8))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(analyse_run, runs, [use_cache] * len(runs),
+                             [cache_dir] * len(runs), chunksize=chunksize))
+
+
+def write_summary_table(rows: list, summary_file: str) -> None:
+    """Write the rows as a CSV table with a SUMMARY_COLUMNS header"""
+    with open(summary_file, 'w', newline='', encoding='utf-8') as summary_fh:
+        writer = csv.DictWriter(summary_fh, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _node_under_test(run: RunDir) -> str:
+    """Node of the fault injection as found in the runlog, '' if unknown"""
+    runlog_file = os.path.join(run.path, f'{run.run_id}_runlog')
+    try:
+        with open(runlog_file, encoding='utf-8', errors='replace') as runlog_fh:
+            for line in runlog_fh:
+                for node_pattern in _NODE_PATTERNS:
+                    match = node_pattern.search(line)
+                    if match:
+                        return match['node']
+    except OSError:
+        pass
+    return ''
+
+
+def bulk_analyzer_standalone_runner() -> None:
+    """ standalone runner to run this module as a script independently """
+    archive_root = THIS_DIR/'../../logs'
+
+    runs = find_runs(archive_root)
+    print(f'{len(runs)} runs found under {archive_root}')
+    for row in analyse_runs(runs):
+        print(row)
+
+
+if __name__ == '__main__':
+    bulk_analyzer_standalone_runner()
@@ -14,6 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+import time
+
 from src.common import cm1_json_file_flag, cm2_parse_resultsxml, \
     cm6_paramiko
 from src.common.cm1_json_file_flag import deserialized_data
@@ -33,31 +36,33 @@ def cmds_scenario_oracleinst_down() -> list:
 
 
 def run_scenario_oracleinst_down(cmds_list_oracleinst_down: list, node_ip_to_test: str) -> list:
+    """Run the cmds on the node, logging each line of o/p as it is received
+
+    The lines are logged & returned with their wall-clock time of receipt (epoch secs, to be correlated with the
+    TPS readings of the workload) & the time elapsed since the cmd was sent, ex.: to tell to the ms when PMON died.
+    Returns a list of (command, exit status, list of cm6_paramiko.ReceivedLine), one per command.
+    """
     ssh_username = deserialized_data["ssh_user_name"]
     ssh_key = deserialized_data["ssh_key_file"]
-    host_ssh_clientobj = cm6_paramiko.ClientCls(host=node_ip_to_test, username=ssh_username,
-                                                                        key_file=ssh_key)
+    # pooled & warmed during the Swingbench ramp up, so no handshake is paid here
+    host_ssh_clientobj = cm6_paramiko.connection_pool.get(host=node_ip_to_test, username=ssh_username,
+                                                          key_file=ssh_key)
 
-    # initialize a list of tuples to hold stdout and stderr from each command executed
-    stdout_stderr = []  # not going to work, as we need the asctime stamp immediately... storing in list to unpack
-    # later not going to get the timestamp
+    # one (command, exit status, received lines) tuple per command executed
+    cmds_received_lines = []
 
     for command in cmds_list_oracleinst_down:
-        logger_name.debug("\n", "#" * 20, "Running command:", command, )
-        stdout_raw, stderr_raw = host_ssh_clientobj.run_remote_cmd(command)
-        stdout_stderr.append((stdout_raw, stderr_raw))  # to be removed
-        logger_name.debug("stdout: ", stdout_raw.read().decode())  # debug
-        logger_name.debug("stderr: ", stderr_raw.read().decode())  # debug
-        stdout_bstr, stderr_bstr = stdout_raw.read(), stderr_raw.read()
-        logger_name.debug(stdout_bstr)
-        logger_name.debug(stderr_bstr)
-
-        if stdout_bstr:
-            logger_name.info(f'stdout of shutdown command run is {stdout_bstr}')
-
-        if stderr_bstr:
-            logger_name.info(f'stderr of shutdown command run is {stderr_bstr}')
-
-    host_ssh_clientobj.garbage_clean()
-    return stdout_stderr
+        logger_name.debug(f'{"#" * 20} Running command: {command}')
+        sent_monotonic = time.monotonic()
+        line_stream = host_ssh_clientobj.stream_lines(command)
+        received_lines = []
+        for received in line_stream:
+            received_lines.append(received)
+            received_tm = datetime.datetime.fromtimestamp(received.wall_clock).isoformat(timespec='milliseconds')
+            logger_name.info(f'{received.stream} of shutdown command run at {received_tm} '
+                             f'(+{received.monotonic - sent_monotonic:.3f}s): '
+                             f'{received.line.decode(errors="replace")}')
+        logger_name.debug(f'exit status of shutdown command run: {line_stream.exit_status}')
+        cmds_received_lines.append((command, line_stream.exit_status, received_lines))
 
+    return cmds_received_lines
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the synthetic results xml generator & the parser benchmark"""
+import pathlib
+import shutil
+import sys
+import tempfile
+from absl.testing import absltest
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable=import-error,wrong-import-position
+from benchmarks import bm0_synthetic_resultsxml
+from benchmarks import bm1_parse_resultsxml
+from src.common.cm2_parse_resultsxml import ParseSwingbenchRunXML
+# pylint: enable=import-error,wrong-import-position
+
+
+class TestSyntheticResultsXML(absltest.TestCase):
+    """ Test the generated outages are exactly what the parser finds """
+
+    def test_generated_outages_parsed_back(self):
+        " Assert every generated outage is parsed back in both parse modes"
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        resultsxml_file = pathlib.Path(workdir, 'synthetic_2h.xml')
+        # 2 hours spread over several write blocks, 3 outages of 45s
+        outages = bm0_synthetic_resultsxml.periodic_outages(
+            7200, every_secs=2400, outage_secs=45)
+        bm0_synthetic_resultsxml.write_resultsxml(resultsxml_file, 7200,
+                                                  outages)
+
+        for streaming in [False, True]:
+            parse_swingbench_run = ParseSwingbenchRunXML(
+                resultsxml_file=resultsxml_file, streaming=streaming)
+            parse_swingbench_run.parse_swingbench_resultsxml()
+
+            start_ts = bm0_synthetic_resultsxml.START_TS
+            self.assertEqual(
+                parse_swingbench_run.workload_start,
+                start_ts + bm0_synthetic_resultsxml.RAMP_UP_SECS * 1000)
+            self.assertEqual(
+                [(window.start, window.end, window.duration)
+                 for window in parse_swingbench_run.outage_windows],
+                [(start_ts + offset_secs * 1000,
+                  start_ts + (offset_secs + 45) * 1000, 45.0)
+                 for offset_secs in [600, 3000, 5400]])
+
+
+class TestFindRegressions(absltest.TestCase):
+    """ Test the comparison of the measurements against a baseline """
+
+    baseline = {'24h/tree': {'secs': 0.03, 'peak_mib': 10.0},
+                '1h/tree': {'secs': 0.001, 'peak_mib': 0.5}}
+
+    def test_regressions_found(self):
+        " Assert a slower parse & a larger peak memory are both reported"
+        regressions = bm1_parse_resultsxml.find_regressions(
+            {'24h/tree': {'secs': 0.06, 'peak_mib': 20.0},
+             '7d/tree': {'secs': 9.0, 'peak_mib': 900.0}},
+            self.baseline, tolerance=0.25)
+
+        self.assertLen(regressions, 2)
+        self.assertStartsWith(regressions[0], '24h/tree secs')
+        self.assertStartsWith(regressions[1], '24h/tree peak_mib')
+
+    def test_noise_not_reported(self):
+        " Assert growth within tolerance or the noise floor is ignored"
+        regressions = bm1_parse_resultsxml.find_regressions(
+            {'24h/tree': {'secs': 0.035, 'peak_mib': 11.0},
+             '1h/tree': {'secs': 0.002, 'peak_mib': 0.8}},
+            self.baseline, tolerance=0.25)
+
+        self.assertEqual(regressions, [])
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the live outage detection from the verbose charbench output"""
+import datetime
+import pathlib
+import shutil
+import sys
+import tempfile
+from absl.testing import absltest
+from unittest.mock import patch
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable-next=import-error,wrong-import-position
+from src.common.cm10_charbench_monitor import LiveOutageMonitorCls
+# pylint: disable-next=import-error,wrong-import-position
+from src.common.cm10_charbench_monitor import SteadyStateDetector
+
+_HEADER = 'Time      Users       TPM      TPS     Errors\n'
+
+
+def _charbench_lines(tps_values: list, first_secs_of_day: int = 49125) -> str:
+    """ Build charbench -v output with one line per second """
+    lines = []
+    for i, tps in enumerate(tps_values):
+        time_of_day = datetime.timedelta(
+            seconds=(first_secs_of_day + i) % 86400)
+        hours, remainder = divmod(time_of_day.seconds, 3600)
+        lines.append(f'{hours:02}:{remainder // 60:02}:{remainder % 60:02}  '
+                     f'[60/60]  {tps * 60:>7}  {tps:>7}        0\n')
+    return ''.join(lines)
+
+
+class TestSteadyStateDetector(absltest.TestCase):
+    """ Test the rolling mean & variance readiness test """
+
+    # the steady part jitters between 110 & 129 like the testdata runs
+    steady_tps = [110 + (i * 7) % 20 for i in range(60)]
+
+    def _first_steady(self, tps_values: list) -> int:
+        detector = SteadyStateDetector(window_readings=20)
+        for idx, tps in enumerate(tps_values):
+            if detector.feed(tps):
+                return idx
+        return -1
+
+    def test_steady_after_rampup(self):
+        " Assert steady once 2 windows of jittering TPS were seen"
+        rampup_tps = [0, 0, 19, 43, 71, 98]
+
+        # the last window is past the ramp up, the one before mostly too
+        self.assertBetween(self._first_steady(rampup_tps + self.steady_tps),
+                           len(rampup_tps) + 19, len(rampup_tps) + 39)
+
+    def test_slow_rampup_and_dips_not_steady(self):
+        " Assert a slow linear ramp up & a window with a dip are not steady"
+        self.assertEqual(self._first_steady(list(range(0, 120, 2))), -1)
+
+        # steady only once the dip left the last window
+        dipped_tps = list(self.steady_tps)
+        dipped_tps[30] = 27
+        self.assertEqual(self._first_steady(dipped_tps), 50)
+
+    def test_rolling_sums_match_recomputed(self):
+        " Assert the O(1) rolling mean & cv equal numpy on the last window"
+        detector = SteadyStateDetector(window_readings=20)
+        tps_values = list(range(0, 200, 3)) + self.steady_tps
+        for tps in tps_values:
+            detector.feed(tps)
+
+        last_window = tps_values[-20:]
+        mean = sum(last_window) / 20
+        self.assertAlmostEqual(detector.mean, mean)
+        self.assertAlmostEqual(
+            detector.cv,
+            (sum((tps - mean) ** 2 for tps in last_window) / 20) ** 0.5 /
+            mean)
+
+
+class TestLiveOutageMonitor(absltest.TestCase):
+    """ Test outage start, recovery & sustained recovery tracking """
+
+    # ramp up, an outage of 4s, recovery held for 5s
+    tps_values = [0, 0, 120, 118, 0, 0, 0, 45, 121, 119, 122, 124, 120, 118]
+
+    def test_outage_and_sustained_recovery(self):
+        " Assert recovery is only sustained stop_after_recovery_secs later"
+        monitor = LiveOutageMonitorCls('unused', stop_after_recovery_secs=3)
+        monitor.feed_text(_HEADER)
+        states = []
+        for line in _charbench_lines(self.tps_values).splitlines(True):
+            monitor.feed_text(line)
+            states.append((monitor.in_outage, monitor.recovery_sustained()))
+
+        self.assertEqual([in_outage for in_outage, _ in states],
+                         [False] * 4 + [True] * 4 + [False] * 6)
+        self.assertEqual(states.index((False, True)), 11)  # 3s after 121
+        self.assertLen(monitor.outage_windows, 1)
+        self.assertEqual(monitor.outage_windows[0].duration, 4.0)
+
+    def test_lines_split_across_reads(self):
+        " Assert partial lines are stitched together & noise is skipped"
+        monitor = LiveOutageMonitorCls('unused', stop_after_recovery_secs=3)
+        text = ('Results will be written to 1.xml\nHit Return to Terminate '
+                'Run...\n\n' + _HEADER + _charbench_lines(self.tps_values))
+        for i in range(0, len(text), 7):
+            monitor.feed_text(text[i:i + 7])
+
+        self.assertTrue(monitor.recovery_sustained())
+        self.assertLen(monitor.outage_windows, 1)
+
+    def test_midnight_rollover(self):
+        " Assert readings past midnight are dated the next day"
+        monitor = LiveOutageMonitorCls('unused', stop_after_recovery_secs=3,
+                                       run_date=datetime.date(2022, 7, 16))
+        monitor.feed_text(_HEADER + _charbench_lines(self.tps_values,
+                                                     first_secs_of_day=86398))
+
+        self.assertEqual(monitor.outage_windows[0].duration, 4.0)
+
+    @patch('src.common.cm10_charbench_monitor._POLL_INTERVAL_SECS', 0.01)
+    def test_watch(self):
+        " Assert watch returns early on recovery & on workload exit"
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        sb_timeseries_file = pathlib.Path(tmp_dir, '1_swingbench_timeseries')
+        sb_timeseries_file.write_text(_HEADER + _charbench_lines(
+            self.tps_values))
+
+        monitor = LiveOutageMonitorCls(sb_timeseries_file,
+                                       stop_after_recovery_secs=3)
+        self.assertTrue(monitor.watch(timeout_secs=5))
+
+        # never sustained long enough & charbench exited
+        monitor = LiveOutageMonitorCls(sb_timeseries_file,
+                                       stop_after_recovery_secs=60)
+        self.assertFalse(monitor.watch(timeout_secs=5,
+                                       is_running=lambda: False))
+        self.assertLen(monitor.outage_windows, 1)
+
+    @patch('src.common.cm10_charbench_monitor._POLL_INTERVAL_SECS', 0.01)
+    def test_watch_continues_after_wait_steady(self):
+        " Assert the readings after steady state are only consumed once"
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        sb_timeseries_file = pathlib.Path(tmp_dir, '1_swingbench_timeseries')
+        steady_tps = TestSteadyStateDetector.steady_tps
+        sb_timeseries_file.write_text(_HEADER + _charbench_lines(
+            [0, 0] + steady_tps + [0, 0, 0] + steady_tps))
+
+        monitor = LiveOutageMonitorCls(sb_timeseries_file,
+                                       stop_after_recovery_secs=10)
+        self.assertTrue(monitor.wait_steady(timeout_secs=5))
+        self.assertEqual(monitor.outage_windows, [])
+
+        self.assertTrue(monitor.watch(timeout_secs=5))
+        self.assertLen(monitor.outage_windows, 1)
+        self.assertEqual(monitor.outage_windows[0].duration, 3.0)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for waiting on a file to be written"""
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from absl.testing import absltest
+from unittest.mock import patch
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm11_file_watch
+
+
+class TestWaitForFile(absltest.TestCase):
+    """ Test the wait returns as soon as the file is complete """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.results_xml_file = pathlib.Path(self.tmp_dir, '1.xml')
+
+    def _write_later(self, delay_secs: float) -> threading.Thread:
+        """ Write the file in 2 steps from a thread, like a slow writer """
+        def write():
+            time.sleep(delay_secs)
+            with open(self.results_xml_file, 'w', encoding='utf-8') as xml_fh:
+                xml_fh.write('<Results>')
+                xml_fh.flush()
+                time.sleep(delay_secs)
+                xml_fh.write('</Results>')
+        writer = threading.Thread(target=write)
+        writer.start()
+        self.addCleanup(writer.join)
+        return writer
+
+    def _is_complete(self, file_path) -> bool:
+        return (os.path.exists(file_path) and
+                pathlib.Path(file_path).read_text().endswith('</Results>'))
+
+    def test_woken_up_when_written(self):
+        " Assert the wait ends once the file is closed, not at the timeout"
+        self._write_later(0.2)
+
+        started = time.monotonic()
+        self.assertTrue(cm11_file_watch.wait_for_file(
+            self.results_xml_file, timeout_secs=30,
+            is_complete=self._is_complete))
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_already_written(self):
+        " Assert an existing file returns right away"
+        self.results_xml_file.write_text('<Results></Results>')
+
+        self.assertTrue(cm11_file_watch.wait_for_file(self.results_xml_file,
+                                                      timeout_secs=0))
+
+    def test_timeout(self):
+        " Assert False once the timeout elapsed without the file"
+        started = time.monotonic()
+        self.assertFalse(cm11_file_watch.wait_for_file(self.results_xml_file,
+                                                       timeout_secs=0.3))
+        self.assertBetween(time.monotonic() - started, 0.3, 5)
+
+    @patch('src.common.cm11_file_watch._POLL_INTERVAL_SECS', 0.05)
+    @patch('src.common.cm11_file_watch.InotifyCls',
+           side_effect=OSError('inotify is not available'))
+    def test_polling_without_inotify(self, mocked_inotify):
+        " Assert the file is polled where inotify is not available"
+        self._write_later(0.1)
+
+        self.assertTrue(cm11_file_watch.wait_for_file(
+            self.results_xml_file, timeout_secs=30,
+            is_complete=self._is_complete))
+        self.assertTrue(mocked_inotify.called)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the asyncio layer running cmds in remote BMX DB backends"""
+import asyncio
+import os
+import pathlib
+import sys
+import threading
+from unittest.mock import patch, Mock
+from absl.testing import absltest
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+
+# pylint: disable=import-error,wrong-import-position
+from src.common import cm12_async_ssh
+from src.common.cm6_paramiko import (ClientCls, CommandResult,
+                                     SSHPeerDeadError)
+# pylint: enable=import-error,wrong-import-position
+
+
+class _FakeChannel:
+    """Channel whose o/p is fed by the test, readable like a paramiko one
+
+    Its fd is readable while o/p is buffered & for good after the EOF.
+    cmds maps a cmd to its (exit status, stdout, stderr), fed with the EOF
+    as soon as it is exec-ed; other cmds are fed by the test with feed().
+    """
+
+    def __init__(self, cmds: dict = None):
+        self.cmds = cmds or {}
+        self.closed = False
+        self.eof_received = False
+        self.exit_status = -1
+        self._stdout = self._stderr = b''
+        self._lock = threading.Lock()
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+
+    def exec_command(self, command):
+        if command in self.cmds:
+            exit_status, stdout, stderr = self.cmds[command]
+            self.feed(stdout, stderr, exit_status)
+
+    def feed(self, stdout=b'', stderr=b'', exit_status=None):
+        """Buffer o/p & then the EOF & the exit status if given"""
+        with self._lock:
+            self._stdout += stdout
+            self._stderr += stderr
+            if exit_status is not None:
+                self.eof_received = True
+                self.exit_status = exit_status
+            os.write(self._write_fd, b'x')
+
+    def fileno(self):
+        return self._read_fd
+
+    def recv_ready(self):
+        return bool(self._stdout)
+
+    def recv_stderr_ready(self):
+        return bool(self._stderr)
+
+    def recv(self, nbytes):
+        with self._lock:
+            data, self._stdout = self._stdout[:nbytes], self._stdout[nbytes:]
+            self._clear_event()
+        return data
+
+    def recv_stderr(self, nbytes):
+        with self._lock:
+            data, self._stderr = self._stderr[:nbytes], self._stderr[nbytes:]
+            self._clear_event()
+        return data
+
+    def _clear_event(self):
+        if not (self._stdout or self._stderr or self.eof_received):
+            try:
+                os.read(self._read_fd, 4096)
+            except BlockingIOError:
+                pass
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+
+
+class TestAsyncSSH(absltest.TestCase):
+    """Test run() & start() against fake channels of pooled clients"""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.channels = []
+        self.cmds = {}
+        self.hosts_got = []
+
+        def get(host, username, key_file):
+            self.hosts_got.append((host, username, key_file))
+            client = Mock(spec=ClientCls)
+            client.open_channel.side_effect = self.open_channel
+            return client
+
+        patcher = patch('src.common.cm6_paramiko.connection_pool.get',
+                        side_effect=get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_channels)
+
+    def open_channel(self, command):
+        """Open a fake channel running the cmd, among those of the test"""
+        self.channels.append(_FakeChannel(self.cmds))
+        self.channels[-1].exec_command(command)
+        return self.channels[-1]
+
+    def close_channels(self):
+        for channel in self.channels:
+            channel.close()
+
+    def test_run_on_several_hosts_concurrently(self):
+        """Each cmd gets its CommandResult, the o/p read off the channels"""
+        self.cmds.update({'hostname': (0, b'svr005\n', b''),
+                          'ls /nothing': (2, b'', b'ls: no such file\n')})
+
+        async def run_all():
+            return await asyncio.gather(
+                cm12_async_ssh.run('192.16.30.1', 'hostname', 'oracle',
+                                   '/home/.ssh/id_rsa'),
+                cm12_async_ssh.run('192.16.30.2', 'ls /nothing', 'oracle',
+                                   '/home/.ssh/id_rsa'))
+
+        self.assertEqual(asyncio.run(run_all()), [
+            CommandResult('hostname', 0, b'svr005\n', b''),
+            CommandResult('ls /nothing', 2, b'', b'ls: no such file\n')])
+        self.assertCountEqual(self.hosts_got, [
+            ('192.16.30.1', 'oracle', '/home/.ssh/id_rsa'),
+            ('192.16.30.2', 'oracle', '/home/.ssh/id_rsa')])
+        self.assertTrue(all(channel.closed for channel in self.channels))
+
+    def test_lines_iterated_as_they_arrive(self):
+        """Lines split across receives come out whole, in order"""
+
+        async def tail():
+            async_cmd = await cm12_async_ssh.start(
+                '192.16.30.1', 'tail -f alert.log', 'oracle', 'key')
+            channel = self.channels[-1]
+            loop = asyncio.get_running_loop()
+            loop.call_soon(channel.feed, b'ORA-00603\nCRS-16')
+            lines = []
+            async for line in async_cmd.stdout:
+                lines.append(line)
+                if len(lines) == 1:
+                    # the 2nd line is completed only after the 1st was read
+                    loop.call_soon(channel.feed, b'01\n', b'warning\n', 0)
+            stderr = await async_cmd.stderr.read()
+            exit_status = await async_cmd.wait()
+            async_cmd.close()
+            return lines, stderr, exit_status
+
+        self.assertEqual(asyncio.run(tail()), (
+            [b'ORA-00603\n', b'CRS-1601\n'], b'warning\n', 0))
+
+    def test_streams_need_no_thread_per_channel(self):
+        """Dozens of open streams are driven by the loop, not by threads"""
+
+        async def open_streams():
+            async_cmds = await asyncio.gather(*(
+                cm12_async_ssh.start(f'192.16.30.{i}', 'tail -f alert.log',
+                                     'oracle', 'key') for i in range(60)))
+            threads_with_open_streams = threading.active_count()
+            for channel in self.channels:
+                channel.feed(b'line\n', exit_status=0)
+            lines = await asyncio.gather(*(async_cmd.stdout.readline()
+                                           for async_cmd in async_cmds))
+            for async_cmd in async_cmds:
+                async_cmd.close()
+            return threads_with_open_streams, lines
+
+        threads_with_open_streams, lines = asyncio.run(open_streams())
+
+        self.assertEqual(lines, [b'line\n'] * 60)
+        self.assertLess(threads_with_open_streams, 60)
+
+    def test_run_times_out_and_closes_channel(self):
+        """A cmd not done in time raises TimeoutError & its channel closes"""
+        with self.assertRaises((TimeoutError, asyncio.TimeoutError)):
+            asyncio.run(cm12_async_ssh.run('192.16.30.1', 'sleep 600',
+                                           'oracle', 'key', timeout=0.2))
+        self.assertTrue(self.channels[-1].closed)
+
+    def test_failures_of_the_pooled_client_raised(self):
+        """The typed errors of cm6_paramiko opening the channel come out"""
+        with patch.object(self, 'open_channel',
+                          side_effect=SSHPeerDeadError('192.16.30.1',
+                                                       'connection lost')):
+            with self.assertRaises(SSHPeerDeadError):
+                asyncio.run(cm12_async_ssh.run('192.16.30.1', 'date',
+                                               'oracle', 'key'))
+
+    @patch('src.common.cm12_async_ssh._LINE_LIMIT_BYTES', 1024)
+    @patch('src.common.cm12_async_ssh._RECV_BYTES', 256)
+    def test_channel_not_read_past_what_is_consumed(self):
+        """The o/p not read yet stays in the channel, not in the readers"""
+        output = bytes(range(256)) * 400
+
+        async def read_slowly():
+            async_cmd = await cm12_async_ssh.start(
+                '192.16.30.1', 'cat big.trc', 'oracle', 'key')
+            channel = self.channels[-1]
+            channel.feed(output, b'warning\n', 0)
+            for _ in range(10):
+                await asyncio.sleep(0)
+            # pylint: disable-next=protected-access
+            left_in_channel = len(channel._stdout)
+            stdout = await async_cmd.stdout.read()
+            stderr = await async_cmd.stderr.read()
+            exit_status = await async_cmd.wait()
+            async_cmd.close()
+            return left_in_channel, stdout, stderr, exit_status
+
+        left_in_channel, stdout, stderr, exit_status = asyncio.run(
+            read_slowly())
+
+        self.assertGreaterEqual(left_in_channel, len(output) - 3 * 1024)
+        self.assertEqual((stdout, stderr, exit_status),
+                         (output, b'warning\n', 0))
+
+
+if __name__ == '__main__':
+    absltest.main()
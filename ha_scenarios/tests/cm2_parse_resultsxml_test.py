@@ -16,8 +16,11 @@
 
 """Tests for parser module that processes xml output file from Swingbench"""
 import pathlib
+import shutil
 import sys
+import tempfile
 from absl.testing import absltest
+from unittest.mock import patch
 
 THIS_DIR = pathlib.Path(__file__).absolute().parent
 sys.path.append(str(THIS_DIR.parent))
@@ -77,6 +80,25 @@ class TestParseSwingbenchXML(absltest.TestCase):
         self.assertEqual(instance_parse_swingbench_run_xml_cls.outage_duration,
                          (1658004072851 - 1658004016839) / 1000)
 
+    def test_every_outage_window_xmlfile2(self):
+        " Assert the short dips after the first outage are reported as well"
+        sample_xml_filename = THIS_DIR/'testdata/1658003923_Jul1622_133843.xml'
+
+        instance_parse_swingbench_run_xml_cls = ParseSwingbenchRunXML(
+            resultsxml_file=sample_xml_filename)
+        instance_parse_swingbench_run_xml_cls.parse_swingbench_resultsxml()
+        outage_windows = instance_parse_swingbench_run_xml_cls.outage_windows
+
+        self.assertLen(outage_windows, 9)
+        self.assertEqual(
+            (outage_windows[0].start, outage_windows[0].end),
+            (instance_parse_swingbench_run_xml_cls.outage_start,
+             instance_parse_swingbench_run_xml_cls.outage_end))
+        self.assertEqual((outage_windows[-1].start, outage_windows[-1].end,
+                          outage_windows[-1].duration),
+                         (1658005154027, 1658005155027, 1.0))
+        self.assertFalse(any(window.ongoing for window in outage_windows))
+
     def test_calculatedoutage_xmlfile3(self):
         " Assert calculated outage equals actual outage duration"
         sample_xml_filename = THIS_DIR/'testdata/1658297854_Jul1922_231734.xml'
@@ -110,5 +132,109 @@ class TestParseSwingbenchXML(absltest.TestCase):
                          865.149)  # (1658453729205 - 1658452864056) / 1000)
 
 
+class TestParseSwingbenchXMLStreaming(absltest.TestCase):
+    """ Test the streaming mode gives the same results as the tree parser """
+
+    sample_xml_filenames = ['1661415592_Aug2522_011952.xml',
+                            '1658003923_Jul1622_133843.xml',
+                            '1658297854_Jul1922_231734.xml',
+                            '1658452689_Jul2122_181809.xml']
+
+    def assert_streaming_matches_tree(self):
+        """ Parse every sample file both ways and compare the outcome """
+        for sample_xml_filename in self.sample_xml_filenames:
+            tree_parse = ParseSwingbenchRunXML(
+                resultsxml_file=THIS_DIR/'testdata'/sample_xml_filename)
+            tree_parse.parse_swingbench_resultsxml()
+
+            streaming_parse = ParseSwingbenchRunXML(
+                resultsxml_file=THIS_DIR/'testdata'/sample_xml_filename,
+                streaming=True)
+            streaming_parse.parse_swingbench_resultsxml()
+
+            self.assertEqual(streaming_parse.workload_start,
+                             tree_parse.workload_start)
+            self.assertEqual(streaming_parse.outage_start,
+                             tree_parse.outage_start)
+            self.assertEqual(streaming_parse.outage_end,
+                             tree_parse.outage_end)
+            self.assertEqual(streaming_parse.outage_duration,
+                             tree_parse.outage_duration)
+            self.assertEqual(streaming_parse.outage_windows,
+                             tree_parse.outage_windows)
+            self.assertEqual(streaming_parse.brownout_windows,
+                             tree_parse.brownout_windows)
+
+    def test_streaming_matches_tree_parse(self):
+        " Assert default chunk size streaming equals the tree based parse"
+        self.assert_streaming_matches_tree()
+
+    # a 7 byte read size splits the timestamps & TPS values across chunks
+    @patch('src.common.cm2_parse_resultsxml._STREAM_CHUNK_BYTES', 7)
+    def test_streaming_with_tokens_split_across_chunks(self):
+        " Assert tokens split across chunk boundaries are stitched together"
+        self.assert_streaming_matches_tree()
+
+    def test_results_without_tps_readings(self):
+        " Assert a results file without <TPSReadings> parses alike both ways"
+        run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, run_dir)
+        resultsxml_file = pathlib.Path(run_dir)/'1658003923_Jul1622_133843.xml'
+        resultsxml_text = (THIS_DIR/'testdata'/resultsxml_file.name) \
+            .read_text()
+        start = resultsxml_text.index('<TPSReadings>')
+        end = resultsxml_text.index('</TPSReadings>') + len('</TPSReadings>')
+        resultsxml_file.write_text(resultsxml_text[:start] +
+                                   resultsxml_text[end:])
+
+        for streaming in [False, True]:
+            with self.subTest(streaming=streaming):
+                parse = ParseSwingbenchRunXML(
+                    resultsxml_file=resultsxml_file, streaming=streaming)
+                parse.parse_swingbench_resultsxml()
+                self.assertEqual(parse.outage_windows, [])
+                self.assertEqual(parse.brownout_windows, [])
+
+
+
+class TestParseSwingbenchXMLCache(absltest.TestCase):
+    """ Test a re-parse of an unchanged results file is served by the cache """
+
+    def test_reparse_skips_xml_parsing(self):
+        " Assert the second parse is a cache hit with the same outcome"
+        run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, run_dir)
+        sample_xml_filename = pathlib.Path(run_dir,
+                                           '1658003923_Jul1622_133843.xml')
+        shutil.copy(THIS_DIR/'testdata'/sample_xml_filename.name,
+                    sample_xml_filename)
+
+        first_parse = ParseSwingbenchRunXML(
+            resultsxml_file=sample_xml_filename, use_cache=True)
+        first_parse.parse_swingbench_resultsxml()
+        self.assertFalse(first_parse.cache_hit)
+
+        for streaming in [False, True]:
+            with patch('src.common.cm2_parse_resultsxml.ET.parse') as \
+                    mock_parse, \
+                    patch('src.common.cm2_parse_resultsxml.ET.XMLParser') as \
+                    mock_xmlparser:
+                cached_parse = ParseSwingbenchRunXML(
+                    resultsxml_file=sample_xml_filename, streaming=streaming,
+                    use_cache=True)
+                cached_parse.parse_swingbench_resultsxml()
+            mock_parse.assert_not_called()
+            mock_xmlparser.assert_not_called()
+
+            self.assertTrue(cached_parse.cache_hit)
+            for attribute in ['workload_start', 'outage_start', 'outage_end',
+                              'outage_duration', 'outage_windows',
+                              'brownout_windows']:
+                self.assertEqual(getattr(cached_parse, attribute),
+                                 getattr(first_parse, attribute))
+            self.assertEqual(cached_parse.tps_series.tolist(),
+                             first_parse.tps_series.tolist())
+
+
 if __name__ == '__main__':
     absltest.main()
@@ -20,6 +20,15 @@ import os
 import sys
 import json
 import datetime
+import hashlib
+import io
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zoneinfo
 import paramiko
 from absl.testing import absltest
 from unittest.mock import patch, Mock
@@ -30,7 +39,12 @@ THIS_DIR = pathlib.Path(__file__).absolute().parent
 sys.path.append(str(THIS_DIR.parent))
 
 # pylint: disable-next=import-error,wrong-import-position
-from src.common.cm4_excerptor import ExcerptorCls
+from src.common.cm4_excerptor import (ExcerptorCls, excerpt_host_script,
+                                      excerpt_script, grep_command,
+                                      hwm_script, outage_time_window,
+                                      read_members, window_script)
+from src.common.cm6_paramiko import connection_pool
+from src.common.cm7_tps_timeseries import OutageWindow
 
 site_constants_json = "".join([str(THIS_DIR), '/testdata'
                                               '/site_constants'
@@ -38,35 +52,47 @@ site_constants_json = "".join([str(THIS_DIR), '/testdata'
 with open(site_constants_json, encoding="utf-8") as json_constants_fh:
     deserialized_data_inside_test = json.load(json_constants_fh)
 
+
+def _bytes_before_hwm(size: int) -> bytes:
+    """Bytes right before the HWM of size bytes of a mocked log"""
+    return b'-' * min(size, 256)
+
+
+def _md5_before_hwm(size: int) -> str:
+    """md5 of the bytes before the HWM, as recorded by hwm_script()"""
+    return hashlib.md5(_bytes_before_hwm(size)).hexdigest()
+
+
 # Triple quoted string formats inspired from:
 # http://google3/corp/hiring/contrib/code_review_snippets/log_parsing/log_parsing_test.py
-_retval_from_wc_l_host_1 = """\
-1000 /u01/app/oracle/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log
-2000 /u01/app/oracle/diag/crs/at-3793329-svr005/crs/trace/alert.log
-3000 /u01/app/oracle/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log
-117562 total
+_retval_from_stat_host_1 = f"""\
+1000 2883604 1656981700 {_md5_before_hwm(1000)} /u01/app/oracle/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log
+2000 2883712 1656981757 {_md5_before_hwm(2000)} /u01/app/oracle/diag/crs/my-bms-svr005/crs/trace/alert.log
+3000 3014725 1656981702 {_md5_before_hwm(3000)} /u01/app/oracle/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log
 """
 
-_retval_from_wc_l_host_2 = """\
-100 /u01/app/oracle/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log
-200 /u01/app/oracle/diag/crs/at-3793329-svr006/crs/trace/alert.log
-300 /u01/app/oracle/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log
-117562 total
+_retval_from_stat_host_2 = f"""\
+100 2883605 1656981698 {_md5_before_hwm(100)} /u01/app/oracle/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log
+200 2883713 1656981755 {_md5_before_hwm(200)} /u01/app/oracle/diag/crs/my-bms-svr006/crs/trace/alert.log
+300 3014726 1656981704 {_md5_before_hwm(300)} /u01/app/oracle/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log
 """
 
 expected_tail_cmds_dict = {
-    '172.16.110.1': [
-        ('/u01/app/oracle/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log', '1000'),
-        ('/u01/app/oracle/diag/crs/at-3793329-svr005/crs/trace/alert.log',
-         '2000'),
+    '192.16.30.1': [
+        ('/u01/app/oracle/diag/asm/+asm/+ASM1/trace/alert_+ASM1.log', '1000',
+         '2883604', '1656981700', _md5_before_hwm(1000)),
+        ('/u01/app/oracle/diag/crs/my-bms-svr005/crs/trace/alert.log',
+         '2000', '2883712', '1656981757', _md5_before_hwm(2000)),
         ('/u01/app/oracle/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log',
-         '3000')],
-    '172.16.110.2': [
-        ('/u01/app/oracle/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log', '100'),
-        ('/u01/app/oracle/diag/crs/at-3793329-svr006/crs/trace/alert.log',
-         '200'),
+         '3000', '3014725', '1656981702', _md5_before_hwm(3000))],
+    '192.16.30.2': [
+        ('/u01/app/oracle/diag/asm/+asm/+ASM2/trace/alert_+ASM2.log', '100',
+         '2883605', '1656981698', _md5_before_hwm(100)),
+        ('/u01/app/oracle/diag/crs/my-bms-svr006/crs/trace/alert.log',
+         '200', '2883713', '1656981755', _md5_before_hwm(200)),
         (
-        '/u01/app/oracle/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log', '300')],
+        '/u01/app/oracle/diag/rdbms/orcl/orcl2/trace/alert_orcl2.log', '300',
+        '3014726', '1656981704', _md5_before_hwm(300))],
 }
 
 # prefill the contents of the 6 local files that will contain contents from
@@ -122,18 +148,71 @@ mocked_stderr_channel = Mock(spec=paramiko.channel.ChannelStderrFile)
 mocked_stdin_channel.read.return_value = b''
 mocked_stderr_channel.read.return_value = b'Leave No Man Behind-Zimmer'
 
-mocked_stdout_channel1 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel2 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel3 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel4 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel5 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel6 = Mock(spec=paramiko.channel.ChannelFile)
-mocked_stdout_channel1.read.return_value = bytes(_contents_1, 'utf-8')
-mocked_stdout_channel2.read.return_value = bytes(_contents_2, 'utf-8')
-mocked_stdout_channel3.read.return_value = bytes(_contents_3, 'utf-8')
-mocked_stdout_channel4.read.return_value = bytes(_contents_4, 'utf-8')
-mocked_stdout_channel5.read.return_value = bytes(_contents_5, 'utf-8')
-mocked_stdout_channel6.read.return_value = bytes(_contents_6, 'utf-8')
+
+def _mocked_stdout_channel(content: bytes) -> Mock:
+    """Mocked paramiko stdout channel whose read(size) returns the content
+    a piece at a time & then b'' like the actual channel"""
+    mocked_stdout_channel = Mock(spec=paramiko.channel.ChannelFile)
+    mocked_stdout_channel.read.side_effect = io.BytesIO(content).read
+    mocked_stdout_channel.channel = Mock(spec=paramiko.Channel)
+    mocked_stdout_channel.channel.recv_exit_status.return_value = 0
+    return mocked_stdout_channel
+
+
+# the nodes are reached concurrently, so the mocked SSH o/p is looked up by
+# the remote logfile in the command rather than fed in the order of calls
+_retval_from_stat = {
+    'alert_+ASM1.log': _retval_from_stat_host_1,
+    'alert_+ASM2.log': _retval_from_stat_host_2,
+}
+
+# excerpts keyed by local filename, which names their member
+_stdout_from_tail = {
+    'node1_asm_log': bytes(_contents_1, 'utf-8'),
+    'node1_crs_log': bytes(_contents_2, 'utf-8'),
+    'node1_db_log': bytes(_contents_3, 'utf-8'),
+    'node2_asm_log': bytes(_contents_4, 'utf-8'),
+    'node2_crs_log': bytes(_contents_5, 'utf-8'),
+    'node2_db_log': bytes(_contents_6, 'utf-8'),
+}
+
+
+def _mocked_stat(command):
+    """Return the mocked `stat` o/p of the host whose logs are in command"""
+    return [retval for logfile, retval in _retval_from_stat.items()
+            if logfile in command][0]
+
+
+# boundary of the mocked streams of excerpt_host_script()
+_BOUNDARY = b'0123456789abcdef' * 2
+
+
+def _excerpts_stream(excerpts: dict, exit_statuses: dict = None) -> bytes:
+    """Stream as sent by excerpt_host_script() for the excerpts
+
+    excerpts is a dict of local filename => excerpt & exit_statuses a dict
+    of local filename => (exit status, stderr) for the failing ones.
+    """
+    exit_statuses = exit_statuses or {}
+    members = [_BOUNDARY + b'\n']
+    for local_filename, content in excerpts.items():
+        exit_status, stderr = exit_statuses.get(local_filename, (0, b''))
+        for name, data in [(local_filename, content),
+                           (f'{local_filename}.stderr', stderr),
+                           (f'{local_filename}.rc',
+                            f'{exit_status}\n'.encode())]:
+            members.append(_BOUNDARY + f' {name}\n'.encode() + data)
+    members.append(_BOUNDARY + b' \n')
+    return b''.join(members)
+
+
+def _mocked_tail(command, excerpts=None, exit_statuses=None):
+    """Return the mocked streams of the excerpts of the host in command"""
+    excerpts = excerpts or _stdout_from_tail
+    return (_mocked_stdout_channel(_excerpts_stream(
+        {local_filename: content for local_filename, content in
+         excerpts.items() if local_filename in command}, exit_statuses)),
+        mocked_stderr_channel)
 
 
 class TestExcerptorCls(absltest.TestCase):
@@ -170,15 +249,18 @@ class TestExcerptorCls(absltest.TestCase):
             if os.path.exists(path):
                 pathlib.Path(path).unlink()
 
+        # the pooled clients hold the mocked SSHClient of the test
+        connection_pool.close_all()
+
         super(TestExcerptorCls, cls)  # go/gpylint-faq#g-missing-super-call
 
-    # mock the paramiko call and mock the return value from wc -l
+    # mock the paramiko call and mock the return value from stat
     # and confirm that the instance attr tail_cmds_dict is as you expect
     @patch("src.common.cm6_paramiko.RSAKey", spec=True)
     @patch('src.common.cm1_json_file_flag.deserialized_data',
            deserialized_data_inside_test)
     @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
-           side_effect=[_retval_from_wc_l_host_1, _retval_from_wc_l_host_2])
+           side_effect=_mocked_stat)
     @patch('src.common.cm6_paramiko.SSHClient', spec=True)
     def test_inst_attr_for_mocked_ssh_returnvalue(self,
                                                   mocked_paramiko_sshclient,
@@ -188,11 +270,11 @@ class TestExcerptorCls(absltest.TestCase):
         """Confirm that the instance attr tail_cmds_dict is built as expected.
 
         Given a series of return strings from the DB backends as the result of
-        the high watermark probe command `wc -l`, test that the method
+        the high watermark probe command `stat`, test that the method
         generate_get_hwm_groupby_host() correctly constructs the instance attr
         `tail_cmds_dict` based on the foll. returned SSH o/p from remote hosts:
-        _retval_from_wc_l_host_1
-        _retval_from_wc_l_host_2
+        _retval_from_stat_host_1
+        _retval_from_stat_host_2
 
         The mock objects used are:
         1) src.common.cm6_paramiko.RSAKey => so, we don't need an actual
@@ -205,10 +287,12 @@ class TestExcerptorCls(absltest.TestCase):
         3) src.common.cm6_paramiko.ClientCls.store_op_to_py_variables => to
         mock the returned string from paramiko SSHClient processed into a str
         by ClientCls().store_op_to_py_variables method. We use side_effect
-        with a iterable/list of 2 return values instead of return_value because
-        cm6_paramiko.ClientCls.store_op_to_py_variables is called in a `for`
-        that iterates 2 times. If we used return value like:
-        return_value=_retval_from_wc_l_host_1 , the resulting tail_cmds_dict
+        with a function looking up the o/p by the logfiles in the command
+        instead of return_value because
+        cm6_paramiko.ClientCls.store_op_to_py_variables is called once per
+        node, in no given order as the nodes are reached concurrently. If we
+        used return value like:
+        return_value=_retval_from_stat_host_1 , the resulting tail_cmds_dict
         will have repeated values for both host_ip keys.
         4) src.common.cm6_paramiko.SSHClient => mock the connection to an
         external SSH host that is outside the boundary of the code being tested
@@ -219,6 +303,79 @@ class TestExcerptorCls(absltest.TestCase):
         self.assertEqual(ExcerptorCls_obj.tail_cmds_dict,
                          expected_tail_cmds_dict)
 
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_hwm_collected_concurrently_with_bounded_workers(
+            self, mocked_paramiko_sshclient, mocked_rsakey):
+        """Confirm the nodes are probed at the same time, at most max_workers
+
+        The mocked `stat` takes a while & records how many calls are in
+        flight, so the peak tells how many nodes were probed concurrently.
+        """
+        lock = threading.Lock()
+        in_flight = [0]
+        peak_in_flight = [0]
+
+        def slow_stat(command):
+            with lock:
+                in_flight[0] += 1
+                peak_in_flight[0] = max(peak_in_flight[0], in_flight[0])
+            time.sleep(0.2)
+            with lock:
+                in_flight[0] -= 1
+            return _mocked_stat(command)
+
+        for max_workers, expected_peak in [(8, 2), (1, 1)]:
+            peak_in_flight[0] = 0
+            with patch('src.common.cm6_paramiko.ClientCls'
+                       '.store_op_to_py_variables', side_effect=slow_stat):
+                ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location,
+                                                max_workers=max_workers)
+                ExcerptorCls_obj.generate_get_hwm_groupby_host()
+
+            self.assertEqual(peak_in_flight[0], expected_peak)
+            # the dict is keyed in the order of the nodes in the json file
+            self.assertEqual(list(ExcerptorCls_obj.tail_cmds_dict),
+                             ['192.16.30.1', '192.16.30.2'])
+            self.assertEqual(ExcerptorCls_obj.tail_cmds_dict,
+                             expected_tail_cmds_dict)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_hwm_failures_isolated_per_node(self, mocked_paramiko_sshclient,
+                                            mocked_ClientCls_store_op_method,
+                                            mocked_rsakey):
+        """Confirm an unreachable node does not lose the HWMs of the others
+
+        Its failure is returned & its logs are reported as failed by
+        excerpt_logs(), which has no HWM to excerpt them since.
+        """
+        def connect(host, *args, **kwargs):
+            if host == '192.16.30.2':
+                raise TimeoutError(f'{host} unreachable')
+
+        mocked_paramiko_sshclient.return_value.connect.side_effect = connect
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        hwm_failures = ExcerptorCls_obj.generate_get_hwm_groupby_host()
+
+        self.assertEqual(list(hwm_failures), ['192.16.30.2'])
+        self.assertIn('unreachable', hwm_failures['192.16.30.2'])
+        self.assertEqual(ExcerptorCls_obj.tail_cmds_dict, {
+            '192.16.30.1': expected_tail_cmds_dict['192.16.30.1']})
+
+        with patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                   side_effect=_mocked_tail):
+            failures = ExcerptorCls_obj.excerpt_logs()
+        self.assertEqual(failures, dict.fromkeys(
+            ['node2_asm_log', 'node2_crs_log', 'node2_db_log'],
+            'no high watermark recorded'))
+
     # setup test so that you have a file full of song lyrics
     # and simulated HWM is at a given point in the file...assert lines written
     # to local file has those contents
@@ -230,15 +387,9 @@ class TestExcerptorCls(absltest.TestCase):
     @patch('src.common.cm1_json_file_flag.deserialized_data',
            deserialized_data_inside_test)
     @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
-           side_effect=[_retval_from_wc_l_host_1, _retval_from_wc_l_host_2])
+           side_effect=_mocked_stat)
     @patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
-           side_effect=[(mocked_stdout_channel1, mocked_stderr_channel),
-                        (mocked_stdout_channel2, mocked_stderr_channel),
-                        (mocked_stdout_channel3, mocked_stderr_channel),
-                        (mocked_stdout_channel4, mocked_stderr_channel),
-                        (mocked_stdout_channel5, mocked_stderr_channel),
-                        (mocked_stdout_channel6, mocked_stderr_channel)
-                        ])
+           side_effect=_mocked_tail)
     @patch('src.common.cm6_paramiko.SSHClient', spec=True)
     def test_logs_excerpted_with_mocked_ssh_returnvalue(self,
                                                         mocked_paramiko_sshclient,
@@ -255,15 +406,31 @@ class TestExcerptorCls(absltest.TestCase):
         @patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
            return_value=(mocked_stdout_channel1, mocked_stderr_channel)
         will result in all the local files created with same content, which we
-        avoid by feeding a iterable into side_effect that reflects real-life
+        avoid by feeding a function into side_effect that reflects real-life
         results of getting 6 different file excepts (ASM, CRS, DB alert logs
-        from 2 RAC nodes)
+        from 2 RAC nodes) as the stream of the host in the command
 
         """
         ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
         ExcerptorCls_obj.generate_get_hwm_groupby_host()
         ExcerptorCls_obj.excerpt_logs()
 
+        # verify the connection of the HWMs is reused for the excerpts
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 2)
+
+        # verify a single command per host excerpts all its logs, each from
+        # the byte right after its HWM
+        commands = [call.args[0] for call in
+                    mocked_ClientCls_run_remote_cmd.call_args_list]
+        self.assertLen(commands, 2)
+        self.assertIn(
+            'sudo sh -c ' + shlex.quote(excerpt_host_script([
+                (local_filename, excerpt_script(*log_hwm_tuple))
+                for local_filename, log_hwm_tuple in zip(
+                    ['node1_asm_log', 'node1_crs_log', 'node1_db_log'],
+                    expected_tail_cmds_dict['192.16.30.1'])])),
+            commands)
+
         # verify if all the 6 remote files have been excerpted locally
         for path in self.expected_paths:
             self.assertTrue(os.path.exists(path),
@@ -292,6 +459,700 @@ class TestExcerptorCls(absltest.TestCase):
             file_handle.seek(0)
             self.assertNotIn('scarborough fair', file_handle.read())
 
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_failed_node_and_log_do_not_stop_the_others(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_store_op_method,
+            mocked_rsakey):
+        """Confirm that failures are isolated per node & per log file
+
+        The pooled connections drop after the HWMs were recorded, node 2
+        cannot be reconnected & the excerpt script of the node 1 CRS log
+        fails, the other 2 logs of node 1 are excerpted anyway & the
+        failures are returned by excerpt_logs().
+        """
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        ExcerptorCls_obj.generate_get_hwm_groupby_host()
+
+        def connect(host, *args, **kwargs):
+            if host == '192.16.30.2':
+                raise TimeoutError(f'{host} unreachable')
+
+        def tail(command):
+            return _mocked_tail(command, exit_statuses={
+                'node1_crs_log': (1, b'tail: cannot open alert.log')})
+
+        mocked_sshclient_inst = mocked_paramiko_sshclient.return_value
+        mocked_sshclient_inst.get_transport.return_value.is_active \
+            .return_value = False
+        mocked_sshclient_inst.connect.side_effect = connect
+        with patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                   side_effect=tail):
+            failures = ExcerptorCls_obj.excerpt_logs()
+
+        self.assertEqual(sorted(failures), ['node1_crs_log', 'node2_asm_log',
+                                            'node2_crs_log', 'node2_db_log'])
+        self.assertIn('unreachable', failures['node2_asm_log'])
+        self.assertEqual(failures['node1_crs_log'],
+                         'exit status 1: tail: cannot open alert.log')
+        for path in self.expected_paths:
+            self.assertEqual(os.path.exists(path),
+                             path.endswith(('_node1_asm_log', '_node1_crs_log',
+                                            '_node1_db_log')),
+                             msg=path)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_excerpts_cut_short_are_failures(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_store_op_method,
+            mocked_rsakey):
+        """Confirm the excerpts a cmd killed by a signal did not send in
+        full are failures telling so, the ones sent in full are kept"""
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        ExcerptorCls_obj.generate_get_hwm_groupby_host()
+
+        def tail(command):
+            if 'node2_asm_log' not in command:
+                return _mocked_tail(command)
+            # killed while the node2_crs_log excerpt was being sent
+            stream = _excerpts_stream(
+                {local_filename: _stdout_from_tail[local_filename]
+                 for local_filename in ['node2_asm_log', 'node2_crs_log']})
+            stdout_channel = _mocked_stdout_channel(stream[:stream.index(
+                _BOUNDARY + b' node2_crs_log\n') + len(_BOUNDARY) + 20])
+            stdout_channel.channel.recv_exit_status.return_value = -1
+            return stdout_channel, mocked_stderr_channel
+
+        with patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                   side_effect=tail):
+            failures = ExcerptorCls_obj.excerpt_logs()
+
+        self.assertEqual(sorted(failures), ['node2_crs_log', 'node2_db_log'])
+        self.assertIn('signal', failures['node2_crs_log'])
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm4_excerptor._CHUNK_BYTES', 3)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_compressed_excerpts_match_uncompressed(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_store_op_method,
+            mocked_rsakey):
+        """Confirm compressed excerpts land identical to uncompressed ones
+
+        The mocked remote side pipes the excerpts through the actual
+        compress_command() locally, the channel is read 3 bytes at a time
+        to decompress it as a stream.
+        """
+        def compressed_tail(command):
+            excerpt_command, compress_command = command.rsplit(' | ', 1)
+            stdout_channel, _ = _mocked_tail(excerpt_command)
+            compressed = subprocess.run(
+                ['sh', '-c', compress_command],
+                input=stdout_channel.read(), capture_output=True,
+                check=True).stdout
+            return _mocked_stdout_channel(compressed), mocked_stderr_channel
+
+        contents = {}
+        for compress in [False, True]:
+            ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location,
+                                            compress=compress)
+            ExcerptorCls_obj.generate_get_hwm_groupby_host()
+            with patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                       side_effect=compressed_tail if compress
+                       else _mocked_tail):
+                self.assertEqual(ExcerptorCls_obj.excerpt_logs(), {})
+
+            contents[compress] = []
+            for path in self.expected_paths:
+                contents[compress].append(pathlib.Path(path).read_bytes())
+                pathlib.Path(path).unlink()
+
+        self.assertEqual(contents[True], contents[False])
+        self.assertIn(b'The English Army had just won the war',
+                      contents[True][4])
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm4_excerptor._CHUNK_BYTES', 16)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_excerpt_copied_in_bounded_binary_chunks(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_store_op_method,
+            mocked_rsakey):
+        """Confirm excerpts are copied a chunk at a time, byte for byte
+
+        Oracle trace output is not always valid utf-8, the excerpt must
+        land as it is instead of failing to decode.
+        """
+        binary_content = (b'ORA-07445: exception encountered: core dump '
+                          b'[\xff\xfe\x00\x80] [SIGSEGV]\n' * 50)
+        channels = []
+
+        def binary_tail(command):
+            channels.append(_mocked_tail(command, excerpts=dict.fromkeys(
+                _stdout_from_tail, binary_content))[0])
+            return channels[-1], mocked_stderr_channel
+
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        ExcerptorCls_obj.generate_get_hwm_groupby_host()
+        with patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                   side_effect=binary_tail):
+            self.assertEqual(ExcerptorCls_obj.excerpt_logs(), {})
+
+        for path in self.expected_paths:
+            self.assertEqual(pathlib.Path(path).read_bytes(), binary_content)
+        # never read as a whole but in chunks of a bounded size
+        for channel in channels:
+            self.assertEqual({call.args for call in
+                              channel.read.call_args_list}, {(16,)})
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_sftp_transport_falls_back_to_exec(self,
+                                               mocked_paramiko_sshclient,
+                                               mocked_rsakey):
+        """Confirm logs are read over SFTP unless sudo or rotation says exec
+
+        On node 1, the CRS log may not be read by the SSH user & the DB log
+        got rotated (new inode), both are excerpted over exec in a single
+        command. On node 2, the CRS log got copied, truncated & regrown past
+        its HWM (other bytes before the HWM), it is excerpted over exec too.
+        All the other logs are read over SFTP from their HWM.
+        """
+        local_filenames = {
+            logfile: local_filename
+            for node in deserialized_data_inside_test['nodes']
+            for local_filename, logfile in node['dict_oracle_logs'].items()}
+        retval_sizes = {
+            logfile: size for retval in _retval_from_stat.values()
+            for size, *_, logfile in (line.split()
+                                      for line in retval.splitlines())}
+        sftp_reads = []
+
+        def stat(command):
+            retval = _mocked_stat(command)
+            if command.startswith('sudo'):
+                return retval
+            # `%s %i %n` as seen by the SSH user at the time of the excerpts
+            return ''.join(
+                f'{size} {"9999999" if inode == "3014725" else inode} '
+                f'{logfile}\n' for size, inode, _, _, logfile in
+                (line.split() for line in retval.splitlines()))
+
+        def open_file_range(path, offset):
+            local_filename = local_filenames[path]
+            if local_filename == 'node1_crs_log':
+                raise PermissionError(13, 'Permission denied')
+            sftp_reads.append((local_filename, offset))
+            # the bytes before the HWM come first, then the excerpt
+            size = int(retval_sizes[path])
+            if local_filename == 'node2_crs_log':
+                return io.BytesIO(b'+' * size)
+            return io.BytesIO(_bytes_before_hwm(size) +
+                              _stdout_from_tail[local_filename])
+
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location,
+                                        transport='sftp')
+        with patch('src.common.cm6_paramiko.ClientCls'
+                   '.store_op_to_py_variables', side_effect=stat), \
+                patch('src.common.cm6_paramiko.ClientCls.open_file_range',
+                      side_effect=open_file_range), \
+                patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+                      side_effect=_mocked_tail) as mocked_run_remote_cmd:
+            ExcerptorCls_obj.generate_get_hwm_groupby_host()
+            self.assertEqual(ExcerptorCls_obj.excerpt_logs(), {})
+
+        # read from the bytes before the HWM, checked against its md5
+        self.assertCountEqual(sftp_reads, [
+            ('node1_asm_log', 744), ('node2_asm_log', 0),
+            ('node2_crs_log', 0), ('node2_db_log', 44)])
+        exec_commands = ''.join(sorted(
+            call.args[0] for call in mocked_run_remote_cmd.call_args_list))
+        self.assertEqual(mocked_run_remote_cmd.call_count, 2)
+        self.assertIn('node1_crs_log', exec_commands)
+        self.assertIn('node1_db_log', exec_commands)
+        self.assertIn('node2_crs_log', exec_commands)
+        self.assertNotIn('node1_asm_log', exec_commands)
+        self.assertNotIn('node2_db_log', exec_commands)
+        for path, content in zip(self.expected_paths,
+                                 _stdout_from_tail.values()):
+            self.assertEqual(pathlib.Path(path).read_bytes(), content)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.store_op_to_py_variables',
+           side_effect=_mocked_stat)
+    @patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+           side_effect=_mocked_tail)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_filtered_excerpts_filtered_on_the_host(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_run_remote_cmd,
+            mocked_ClientCls_store_op_method, mocked_rsakey):
+        """Confirm the excerpt_filters of the site json are sent to the host
+
+        The filtered excerpts land in the `_filtered` local files, leaving
+        the names of the full excerpts free for a later excerpt_logs().
+        """
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        ExcerptorCls_obj.generate_get_hwm_groupby_host()
+        self.assertEqual(ExcerptorCls_obj.excerpt_logs(apply_filters=True),
+                         {})
+
+        command = mocked_ClientCls_run_remote_cmd.call_args_list[0].args[0]
+        self.assertIn(shlex.quote("grep -a -E -C 2 -e 'CRS-[0-9]+'")[1:-1],
+                      command)
+        for path in self.expected_paths:
+            self.assertFalse(os.path.exists(path), msg=path)
+            filtered_path = path + '_filtered'
+            self.assertTrue(os.path.exists(filtered_path), msg=filtered_path)
+            pathlib.Path(filtered_path).unlink()
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    @patch('src.common.cm6_paramiko.ClientCls.run_remote_cmd',
+           side_effect=_mocked_tail)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_logs_excerpted_in_window_without_hwm(
+            self, mocked_paramiko_sshclient, mocked_ClientCls_run_remote_cmd,
+            mocked_rsakey):
+        """Confirm a time window is excerpted with no HWM recorded
+
+        The window around the outages of the results xml is searched on the
+        hosts & lands in the `_window` local files.
+        """
+        window = outage_time_window(
+            [OutageWindow(1658004483819, 1658004513819, 30.0, 0, False),
+             OutageWindow(1658004603819, 1658004633819, 30.0, 0, False)],
+            margin_secs=300)
+        self.assertEqual(window, (1658004183.819, 1658004933.819))
+
+        ExcerptorCls_obj = ExcerptorCls(self.run_id, self.log_location)
+        self.assertEqual(ExcerptorCls_obj.excerpt_logs_in_window(*window), {})
+
+        commands = [call.args[0] for call in
+                    mocked_ClientCls_run_remote_cmd.call_args_list]
+        self.assertLen(commands, 2)
+        self.assertIn(
+            shlex.quote(window_script(
+                '/u01/app/oracle/diag/rdbms/orcl/orcl1/trace/alert_orcl1.log',
+                *window))[1:-1], ''.join(commands))
+        for path in self.expected_paths:
+            self.assertFalse(os.path.exists(path), msg=path)
+            window_path = path + '_window'
+            self.assertTrue(os.path.exists(window_path), msg=window_path)
+            pathlib.Path(window_path).unlink()
+
+
+class TestExcerptScript(absltest.TestCase):
+    """Run the excerpt script locally against logs rotated after their HWM"""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.logfile = os.path.join(self.log_dir, 'alert_orcl1.log')
+        with open(self.logfile, 'wb') as log_fh:
+            log_fh.write(b'before the HWM\n' * 1000)
+        self.hwm = self.record_hwm(self.logfile)
+
+    def record_hwm(self, path: str) -> tuple:
+        """(size, inode, mtime, md5) of a file, recorded by hwm_script()"""
+        completed = subprocess.run(['sh', '-c', hwm_script(), 'sh', path],
+                                   capture_output=True, check=True)
+        return tuple(completed.stdout.decode().split(maxsplit=4)[:4])
+
+    def append(self, path: str, content: bytes) -> None:
+        """Append content to a file, creating it if needed"""
+        with open(path, 'ab') as log_fh:
+            log_fh.write(content)
+
+    def read_members(self, stdout: bytes) -> dict:
+        """Member => its data, out of the stream sent by a host script"""
+        members = {}
+        for member, data in read_members(io.BytesIO(stdout)):
+            members[member] = members.get(member, b'') + data
+        return members
+
+    def excerpt(self) -> tuple:
+        """stdout & stderr of the excerpt script for the recorded HWM"""
+        completed = subprocess.run(
+            ['sh', '-c', excerpt_script(self.logfile, *self.hwm)],
+            capture_output=True, check=True)
+        return completed.stdout, completed.stderr.decode()
+
+    def test_excerpt_without_rotation(self):
+        """Only the bytes appended since the HWM are excerpted"""
+        self.append(self.logfile, b'outage\n')
+
+        stdout, stderr = self.excerpt()
+
+        self.assertEqual(stdout, b'outage\n')
+        self.assertEqual(stderr, '')
+
+    def test_excerpt_across_log_moved_aside(self):
+        """The rotated file is found by its inode, the new file is added"""
+        self.append(self.logfile, b'outage\n')
+        os.rename(self.logfile, self.logfile + '.1')
+        self.append(self.logfile, b'recovery\n')
+
+        stdout, stderr = self.excerpt()
+
+        self.assertEqual(stdout, b'outage\nrecovery\n')
+        self.assertIn(self.logfile + '.1', stderr)
+
+    def test_excerpt_across_log_copied_and_truncated(self):
+        """The copy is found by name, size & mtime, the truncated file added"""
+        self.append(self.logfile, b'outage\n')
+        shutil.copyfile(self.logfile, self.logfile + '-20220705')
+        with open(self.logfile, 'wb') as log_fh:
+            log_fh.write(b'recovery\n')
+
+        stdout, stderr = self.excerpt()
+
+        self.assertEqual(stdout, b'outage\nrecovery\n')
+        self.assertIn(self.logfile + '-20220705', stderr)
+
+    def test_excerpt_across_log_copied_truncated_and_regrown(self):
+        """A log regrown past its HWM is told by the md5 before the HWM"""
+        self.append(self.logfile, b'outage\n')
+        shutil.copyfile(self.logfile, self.logfile + '-20220705')
+        with open(self.logfile, 'wb') as log_fh:
+            log_fh.write(b'recovery\n' * 2000)
+
+        stdout, stderr = self.excerpt()
+
+        self.assertEqual(stdout, b'outage\n' + b'recovery\n' * 2000)
+        self.assertIn(self.logfile + '-20220705', stderr)
+
+    def test_excerpt_of_new_file_when_rotated_file_is_gone(self):
+        """Without the rotated file, the new file is all that is left"""
+        os.rename(self.logfile, self.logfile + '.1')
+        pathlib.Path(self.logfile + '.1').unlink()
+        self.append(self.logfile, b'recovery\n')
+
+        stdout, stderr = self.excerpt()
+
+        self.assertEqual(stdout, b'recovery\n')
+        self.assertIn('<not found>', stderr)
+
+    def test_host_script_streams_all_excerpts(self):
+        """All the excerpts of a host come in one stream with status"""
+        self.append(self.logfile, b'outage\n')
+        missing_logfile = os.path.join(self.log_dir, 'alert_+ASM1.log')
+
+        completed = subprocess.run(
+            ['sh', '-c', excerpt_host_script([
+                ('node1_db_log', excerpt_script(self.logfile, *self.hwm)),
+                ('node1_asm_log', excerpt_script(
+                    missing_logfile, '0', '1', '0',
+                    hashlib.md5(b'').hexdigest()))])],
+            capture_output=True, check=True)
+
+        members = self.read_members(completed.stdout)
+        self.assertEqual(members['node1_db_log'], b'outage\n')
+        self.assertEqual(members['node1_db_log.rc'], b'0\n')
+        self.assertEqual(members['node1_asm_log'], b'')
+        self.assertIn(b'<not found>', members['node1_asm_log.stderr'])
+
+    def test_host_script_streams_without_staging(self):
+        """A large excerpt goes out as it is read, nothing is left over"""
+        outage = b''.join(f'outage line {i}\n'.encode() for i in range(5000))
+        self.append(self.logfile, outage)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+
+        completed = subprocess.run(
+            ['sh', '-c', excerpt_host_script(
+                [('node1_db_log', excerpt_script(self.logfile, *self.hwm))])],
+            capture_output=True, check=True,
+            env=dict(os.environ, TMPDIR=tmp_dir))
+
+        self.assertEqual(self.read_members(completed.stdout)['node1_db_log'],
+                         outage)
+        # the stderr of the log being excerpted was all that was held
+        self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_host_script_boundary_drawn_per_run(self):
+        """The boundary is drawn on the host, not found in the script"""
+        script = excerpt_host_script([('node1_db_log', 'printf outage')])
+
+        boundaries = [subprocess.run(
+            ['sh', '-c', script], capture_output=True,
+            check=True).stdout.split(b'\n', 1)[0] for _ in range(2)]
+
+        self.assertRegex(boundaries[0], b'^[0-9a-f]{32}$')
+        self.assertNotEqual(boundaries[0], boundaries[1])
+        self.assertNotIn(boundaries[0].decode(), script)
+
+    @patch('src.common.cm4_excerptor._CHUNK_BYTES', 3)
+    def test_read_members_across_chunks(self):
+        """Boundaries split across reads are found, partial ones are data"""
+        excerpt = b'outage ' + _BOUNDARY[:-1] + b' recovery ' + _BOUNDARY[:5]
+        stream = _excerpts_stream({'node1_db_log': excerpt,
+                                   'node1_asm_log': b''},
+                                  {'node1_asm_log': (2, b'not found\n')})
+
+        self.assertEqual(self.read_members(stream), {
+            'node1_db_log': excerpt, 'node1_db_log.stderr': b'',
+            'node1_db_log.rc': b'0\n', 'node1_asm_log': b'',
+            'node1_asm_log.stderr': b'not found\n',
+            'node1_asm_log.rc': b'2\n'})
+        self.assertEqual(self.read_members(b''), {})
+
+    def test_read_members_of_stream_cut_short(self):
+        """A stream without its end is an error, not a short excerpt"""
+        stream = _excerpts_stream({'node1_db_log': b'outage\n'})
+
+        for cut in [len(_BOUNDARY) // 2, len(stream) - 1,
+                    stream.index(b'outage') + 3]:
+            with self.subTest(cut=cut):
+                with self.assertRaisesRegex(ValueError, 'cut'):
+                    self.read_members(stream[:cut])
+
+    def test_host_script_filters_excerpts_with_context(self):
+        """Only the matching lines & their context are sent, no match is ok"""
+        self.append(self.logfile, b''.join(
+            f'trace line {i}\n'.encode() for i in range(10)) +
+            b'ORA-00603: ORACLE server session terminated\n' +
+            b''.join(f'trace line {i}\n'.encode() for i in range(10, 20)))
+        other_logfile = os.path.join(self.log_dir, 'alert_+ASM1.log')
+        self.append(other_logfile, b'')
+        other_hwm = self.record_hwm(other_logfile)
+        self.append(other_logfile, b'trace line\n')
+
+        completed = subprocess.run(
+            ['sh', '-c', excerpt_host_script(
+                [('node1_db_log', excerpt_script(self.logfile, *self.hwm)),
+                 ('node1_asm_log', excerpt_script(other_logfile,
+                                                  *other_hwm))],
+                filters={'node1_db_log': grep_command(['ORA-[0-9]+'], 1),
+                         'node1_asm_log': grep_command(['ORA-[0-9]+'])})],
+            capture_output=True, check=True)
+
+        members = self.read_members(completed.stdout)
+        self.assertEqual(members['node1_db_log'],
+                         b'trace line 9\n'
+                         b'ORA-00603: ORACLE server session terminated\n'
+                         b'trace line 10\n')
+        self.assertEqual(members['node1_db_log.rc'], b'0\n')
+        self.assertEqual(members['node1_asm_log'], b'')
+        self.assertEqual(members['node1_asm_log.rc'], b'0\n')
+
+
+
+class TestWindowScript(absltest.TestCase):
+    """Run the window script locally against logs with timestamp lines"""
+
+    base_epoch = 1658000000  # epoch secs of the 1st entry of the log
+    block_bytes = 256
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.logfile = os.path.join(self.log_dir, 'alert.log')
+
+    def write_log(self, timestamp_line, logfile: str = None,
+                  epochs: range = None) -> dict:
+        """Write an entry every 10 secs for 100 mins, return them by epoch
+
+        timestamp_line formats the local time of an entry, which is followed
+        by two trace lines. The entries of epochs only are written to
+        logfile if given.
+        """
+        entries = {}
+        for epoch in epochs or range(self.base_epoch, self.base_epoch + 6000,
+                                     10):
+            entries[epoch] = (
+                timestamp_line(datetime.datetime.fromtimestamp(epoch)) +
+                f'\ntrace of {epoch}\nmore trace of {epoch}\n').encode()
+        with open(logfile or self.logfile, 'wb') as log_fh:
+            log_fh.write(b''.join(entries.values()))
+        return entries
+
+    def excerpt(self, start_epoch: int, end_epoch: int, returncode: int = 0,
+                env: dict = None) -> tuple:
+        """stdout & the number of probes of the window script
+
+        The stderr of the script is kept in self.stderr.
+        """
+        completed = subprocess.run(
+            ['sh', '-c', window_script(self.logfile, start_epoch, end_epoch,
+                                       self.block_bytes)],
+            capture_output=True, check=False,
+            env=None if env is None else {**os.environ, **env})
+        self.stderr = completed.stderr.decode()
+        self.assertEqual(completed.returncode, returncode, self.stderr)
+        self.assertIn(self.logfile, self.stderr)
+        return completed.stdout, int(
+            self.stderr.split('after ')[-1].split()[0])
+
+    def test_window_of_alert_log_found_in_log_probes(self):
+        """Only the entries inside the window are excerpted, after at most
+        log2(size / block) probes for each of its start & end"""
+        entries = self.write_log(
+            lambda dt: dt.astimezone().isoformat(timespec='microseconds'))
+
+        stdout, probes = self.excerpt(self.base_epoch + 2000,
+                                      self.base_epoch + 2100)
+
+        self.assertEqual(stdout, b''.join(
+            entries[epoch] for epoch in range(self.base_epoch + 2000,
+                                              self.base_epoch + 2110, 10)))
+        self.assertLessEqual(probes, 2 * (os.path.getsize(self.logfile) //
+                                          self.block_bytes).bit_length())
+
+    def test_window_of_crs_log(self):
+        """The timestamps prefixing the CRS log messages are found too"""
+        entries = self.write_log(
+            lambda dt: dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] +
+            ' [CRSD(12345)]CRS-1601: CSSD Reconfiguration complete.')
+
+        stdout, _ = self.excerpt(self.base_epoch + 4995,
+                                 self.base_epoch + 5015)
+
+        self.assertEqual(stdout, entries[self.base_epoch + 5000] +
+                         entries[self.base_epoch + 5010])
+
+    def test_window_across_dst_and_year_boundaries(self):
+        """The timestamps of an instance in a TZ with DST are compared by
+        their UTC offset across its changes & across the new year"""
+        los_angeles = zoneinfo.ZoneInfo('America/Los_Angeles')
+        for self.base_epoch in [
+                1667725200 - 3000,  # 2022-11-06 02:00 PDT => 01:00 PST
+                1647165600 - 3000,  # 2022-03-13 02:00 PST => 03:00 PDT
+                1672560000 - 3000]:  # 2023-01-01 00:00 PST
+            with self.subTest(base_epoch=self.base_epoch):
+                entries = self.write_log(
+                    lambda dt: dt.astimezone(los_angeles).isoformat(
+                        timespec='microseconds'))
+
+                stdout, _ = self.excerpt(self.base_epoch + 2950,
+                                         self.base_epoch + 3050,
+                                         env={'TZ': 'UTC'})
+
+                self.assertEqual(stdout, b''.join(
+                    entries[epoch] for epoch in range(self.base_epoch + 2950,
+                                                      self.base_epoch + 3060,
+                                                      10)))
+
+    def test_window_of_crs_log_across_dst(self):
+        """The CRS timestamps are in the local time of the host, a local
+        time skipped by DST does not throw the search off"""
+        los_angeles = zoneinfo.ZoneInfo('America/Los_Angeles')
+        self.base_epoch = 1647165600 - 3000  # 2022-03-13 02:00 PST => PDT
+        entries = self.write_log(
+            lambda dt: dt.astimezone(los_angeles).strftime(
+                '%Y-%m-%d %H:%M:%S.%f')[:-3] +
+            ' [CRSD(12345)]CRS-1601: CSSD Reconfiguration complete.')
+
+        stdout, _ = self.excerpt(self.base_epoch + 2990,
+                                 self.base_epoch + 3010,
+                                 env={'TZ': 'America/Los_Angeles'})
+
+        self.assertEqual(stdout, b''.join(
+            entries[epoch] for epoch in range(self.base_epoch + 2990,
+                                              self.base_epoch + 3020, 10)))
+
+    def test_window_across_trace_longer_than_probes(self):
+        """A trace without timestamp lines longer than the reads of the
+        probes only widens the bytes searched"""
+        entries = self.write_log(
+            lambda dt: dt.astimezone().isoformat(timespec='microseconds'))
+        for epoch in (self.base_epoch + 2000, self.base_epoch + 4000):
+            entries[epoch] += b'trace dump\n' * (10 * self.block_bytes // 11)
+        with open(self.logfile, 'wb') as log_fh:
+            log_fh.write(b''.join(entries.values()))
+
+        for start, end in [(2000, 2020), (1990, 2000), (3990, 4010)]:
+            stdout, _ = self.excerpt(self.base_epoch + start,
+                                     self.base_epoch + end)
+            self.assertEqual(stdout, b''.join(
+                entries[epoch] for epoch in range(self.base_epoch + start,
+                                                  self.base_epoch + end + 10,
+                                                  10)))
+
+    def test_window_of_alert_log_in_another_tz(self):
+        """The UTC offset of the timestamps is honoured, the instance may
+        run in another TZ than the host"""
+        entries = self.write_log(
+            lambda dt: dt.astimezone(datetime.timezone.utc).isoformat(
+                timespec='microseconds'))
+
+        stdout, _ = self.excerpt(self.base_epoch + 2000,
+                                 self.base_epoch + 2010,
+                                 env={'TZ': 'America/Los_Angeles'})
+
+        self.assertEqual(stdout, entries[self.base_epoch + 2000] +
+                         entries[self.base_epoch + 2010])
+
+    def test_window_across_rotated_log(self):
+        """The rotated logs written to since the window start are searched
+        before the log"""
+        def timestamp_line(dt):
+            return dt.astimezone().isoformat(timespec='microseconds')
+        rotated = self.logfile + '.1'
+        entries = self.write_log(
+            timestamp_line, rotated,
+            range(self.base_epoch, self.base_epoch + 3000, 10))
+        os.utime(rotated, (self.base_epoch + 2990,) * 2)
+        # compressed & earlier rotated logs are not searched
+        for name, mtime in (('.2', self.base_epoch - 600),
+                            ('.1.gz', self.base_epoch + 3000)):
+            with open(self.logfile + name, 'wb') as log_fh:
+                log_fh.write(b'2022-07-16T00:00:00.000000+00:00 not read\n')
+            os.utime(self.logfile + name, (mtime,) * 2)
+        entries.update(self.write_log(
+            timestamp_line, epochs=range(self.base_epoch + 3000,
+                                         self.base_epoch + 6000, 10)))
+
+        stdout, _ = self.excerpt(self.base_epoch + 2980,
+                                 self.base_epoch + 3010)
+
+        self.assertEqual(stdout, b''.join(
+            entries[epoch] for epoch in range(self.base_epoch + 2980,
+                                              self.base_epoch + 3020, 10)))
+        self.assertIn(rotated, self.stderr)
+
+    def test_window_before_start_of_log(self):
+        """The window starting before the oldest log is a failure, the lines
+        of the window in the log are excerpted still"""
+        entries = self.write_log(
+            lambda dt: dt.astimezone().isoformat(timespec='microseconds'))
+
+        stdout, _ = self.excerpt(self.base_epoch - 600, self.base_epoch + 10,
+                                 returncode=2)
+
+        self.assertEqual(stdout, entries[self.base_epoch] +
+                         entries[self.base_epoch + 10])
+        self.assertIn('window before the start of the log', self.stderr)
+
+    def test_window_past_end_of_log(self):
+        """The log is not read at all past its end"""
+        self.write_log(
+            lambda dt: dt.astimezone().isoformat(timespec='microseconds'))
+
+        stdout, _ = self.excerpt(self.base_epoch + 9000,
+                                 self.base_epoch + 9600)
+
+        self.assertEqual(stdout, b'')
 
 if __name__ == '__main__':
     absltest.main()
@@ -20,6 +20,8 @@ import sys
 import os
 import json
 import datetime
+import shutil
+import tempfile
 from absl.testing import absltest
 from unittest.mock import patch
 
@@ -56,6 +58,12 @@ class TestSwingbenchSetup(absltest.TestCase):
         # garbage collect the swingbench_obj instance after tests
         cls.swingbench_obj = None
 
+    def _mkdtemp(self) -> str:
+        """Temporary log_location of a test, removed after the test"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        return f'{tmp_dir}/'
+
     # code under test has a method to `generate_swingbench_tokens`
     # following test verifies that generated tokens contain the keys in the
     # mocked cm1_json_file_flag.deserialized_data
@@ -155,6 +163,71 @@ class TestSwingbenchSetup(absltest.TestCase):
         self.assertTrue(os.path.exists(self.expected_path),
                         msg="".join([self.expected_path, " does not exist"]))
 
+    # pseudo-mock swingbench binary with cat, which like charbench ends once
+    # it reads from its stdin & echoes what it read to the timeseries file
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    def test_stop_swingbench(self):
+        """ The newline sent to stdin must end the run ahead of its runtime """
+        log_location = self._mkdtemp()
+        sb_obj = Swingbench(self.rt_hhmm, self.run_id, log_location)
+        self.assertFalse(sb_obj.run_swingbench(['/bin/cat'],
+                                               max_rampup_secs=1))
+        self.assertIsNone(sb_obj.swingbench_process.poll())
+
+        sb_obj.stop_swingbench(grace_secs=10)
+
+        self.assertEqual(sb_obj.swingbench_process.returncode, 0)
+        with open(''.join([log_location, self.run_id,
+                           '_swingbench_timeseries']),
+                  encoding="utf-8") as timeseries_fh:
+            self.assertEqual(timeseries_fh.read(), '\n')
+
+    # pseudo-mock swingbench binary with a shell printing charbench -v lines,
+    # ramping up for 5 seconds, & then waiting like charbench on its stdin
+    @patch('src.common.cm10_charbench_monitor._POLL_INTERVAL_SECS', 0.01)
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    def test_rampup_ends_at_steady_tps(self):
+        """ run_swingbench must return once the TPS is steady """
+        log_location = self._mkdtemp()
+        sb_obj = Swingbench(self.rt_hhmm, self.run_id, log_location)
+        charbench_output = ''.join(
+            ['Time Users TPM TPS Errors\n'] +
+            [f'13:38:{i:02} [60/60] 0 {min(i * 25, 120) + i % 3} 0\n'
+             for i in range(60)])
+        charbench_output_file = ''.join(
+            [log_location, self.run_id, '_charbench_output'])
+        with open(charbench_output_file, 'w', encoding="utf-8") as output_fh:
+            output_fh.write(charbench_output)
+
+        self.assertTrue(sb_obj.run_swingbench(
+            ['/bin/sh', '-c', f'cat {charbench_output_file}; read line'],
+            max_rampup_secs=30))
+        self.assertAlmostEqual(
+            sb_obj.live_monitor.steady_state_detector.mean, 121, delta=1)
+        sb_obj.stop_swingbench(grace_secs=10)
+
+    # pseudo-mock swingbench binary with a shell writing the results xml on
+    # its way out, like charbench does
+    @patch('src.common.cm1_json_file_flag.deserialized_data',
+           deserialized_data_inside_test)
+    def test_wait_for_completion(self):
+        """ wait_for_completion must return once the results xml is complete """
+        log_location = self._mkdtemp()
+        sb_obj = Swingbench(self.rt_hhmm, self.run_id, log_location)
+        sb_obj.run_swingbench(
+            ['/bin/sh', '-c',
+             f'sleep 0.5; printf "<Results>\\n</Results>\\n" > '
+             f'{sb_obj.sb_results_xml_filename}'],
+            max_rampup_secs=0)
+
+        self.assertTrue(sb_obj.wait_for_completion(timeout_secs=30))
+        self.assertEqual(sb_obj.swingbench_process.returncode, 0)
+        os.remove(sb_obj.sb_results_xml_filename)
+
+        # the process exited, but never wrote the results xml
+        self.assertFalse(sb_obj.wait_for_completion(timeout_secs=0.2))
 
 
 if __name__ == '__main__':
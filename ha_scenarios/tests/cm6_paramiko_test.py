@@ -20,9 +20,13 @@ Details on each test is attempted to be documented in test function or in-line.
 Erring on the side of too-much-documentation for my own recollection later :)
 
 """
+import os
 import pathlib
+import socket
 import sys
 import json
+import threading
+import time
 import unittest
 from unittest.mock import patch, Mock
 from absl.testing import absltest
@@ -32,7 +36,10 @@ import paramiko
 THIS_DIR = pathlib.Path(__file__).absolute().parent  # pylint: disable=invalid-name
 sys.path.append(str(THIS_DIR.parent))
 # pylint: disable-next=import-error,wrong-import-position
-from src.common.cm6_paramiko import ClientCls
+from src.common.cm6_paramiko import (ClientCls, CommandResult,
+                                     ConnectionPoolCls, ReceivedLine,
+                                     SSHCommandError, SSHConnectError,
+                                     SSHPeerDeadError)
 
 # pylint: disable=unused-argument
 # reason: mocked object `mocked_paramiko_sshclient` should be supplied as an
@@ -42,6 +49,54 @@ from src.common.cm6_paramiko import ClientCls
 # ClientCls_obj follows class naming of code under test
 
 
+class _FakeChannel:
+    """Channel of a fake transport running a cmd from a dict of cmds
+
+    cmds maps a cmd to a function returning its (exit status, stdout,
+    stderr), called once the cmd is exec-ed. Its o/p is then ready at once,
+    followed by the EOF. The channel is always readable for select().
+    """
+
+    def __init__(self, cmds: dict):
+        self.cmds = cmds
+        self.closed = False
+        self.eof_received = False
+        self._exit_status = None
+        self._stdout = self._stderr = b''
+        self._read_fd, self._write_fd = os.pipe()
+        os.write(self._write_fd, b'x')
+
+    def exec_command(self, command):
+        self._exit_status, self._stdout, self._stderr = self.cmds[command]()
+        self.eof_received = self._exit_status is not None
+
+    def fileno(self):
+        return self._read_fd
+
+    def recv_ready(self):
+        return bool(self._stdout)
+
+    def recv(self, nbytes):
+        data, self._stdout = self._stdout[:nbytes], self._stdout[nbytes:]
+        return data
+
+    def recv_stderr_ready(self):
+        return bool(self._stderr)
+
+    def recv_stderr(self, nbytes):
+        data, self._stderr = self._stderr[:nbytes], self._stderr[nbytes:]
+        return data
+
+    def recv_exit_status(self):
+        return self._exit_status
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+
+
 class TestParamikoClient(absltest.TestCase):
     """Test attributes and methods of the object instantiated from ClientCls()
 
@@ -187,6 +242,8 @@ class TestParamikoClient(absltest.TestCase):
         mocked_stdin_channel.read.return_value = b''
         mocked_stdout_channel.read.return_value = b'Lost But Won-Zimmer'
         mocked_stderr_channel.read.return_value = b'Leave No Man Behind-Zimmer'
+        mocked_stdout_channel.channel = Mock(spec=paramiko.Channel)
+        mocked_stdout_channel.channel.recv_exit_status.return_value = 0
 
         ClientCls_obj.client.exec_command.return_value = (
             mocked_stdin_channel, mocked_stdout_channel, mocked_stderr_channel)
@@ -266,6 +323,300 @@ class TestParamikoClient(absltest.TestCase):
         self.assertEqual(ClientCls_obj.client, None)
         self.assertFalse(ClientCls_obj.client)
 
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient', spec=True)
+    def test_open_file_range_prefetches_from_offset(self,
+                                                    mocked_paramiko_sshclient,
+                                                    mocked_rsakey):
+        """ Test the SFTP file is read from the offset with prefetching
+
+        The reads up to the current size of the file must be requested ahead
+        from the offset on, at most sftp_max_concurrent_requests at a time;
+        the SFTP session is opened once, even by threads sharing the pooled
+        client, & closed along with the client.
+        """
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key)
+        mocked_sftp = ClientCls_obj.client.open_sftp.return_value
+        mocked_remote_file = Mock(spec=paramiko.SFTPFile)
+        mocked_remote_file.stat.return_value = Mock(st_size=5000)
+        mocked_sftp.open.return_value = mocked_remote_file
+
+        def slow_open_sftp():
+            time.sleep(0.1)
+            return mocked_sftp
+
+        ClientCls_obj.client.open_sftp.side_effect = slow_open_sftp
+        remote_files = []
+        threads = [threading.Thread(target=lambda: remote_files.append(
+            ClientCls_obj.open_file_range('/u01/alert.log', 1000)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(remote_files, [mocked_remote_file] * 4)
+        ClientCls_obj.client.open_sftp.assert_called_once()
+        mocked_sftp.open.assert_called_with('/u01/alert.log', 'rb')
+        mocked_remote_file.seek.assert_called_with(1000)
+        mocked_remote_file.prefetch.assert_called_with(
+            5000, ClientCls_obj.sftp_max_concurrent_requests)
+
+        ClientCls_obj.garbage_clean()
+        mocked_sftp.close.assert_called_once()
+        self.assertIsNone(ClientCls_obj.sftp)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_pooled_client_reused_till_unhealthy(self,
+                                                 mocked_paramiko_sshclient,
+                                                 mocked_rsakey):
+        """ Test the pool connects once per host & reconnects a dead client
+
+        The phases of a run get the same connected client of a host, unless
+        its transport went down meanwhile.
+        """
+        connection_pool = ConnectionPoolCls()
+        ClientCls_obj = connection_pool.get(self.host_1_ip, self.ssh_username,
+                                            self.ssh_key)
+        self.assertIs(connection_pool.get(self.host_1_ip, self.ssh_username,
+                                          self.ssh_key), ClientCls_obj)
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 1)
+        ClientCls_obj.client.get_transport.return_value.send_ignore \
+            .assert_called()
+
+        # another user is another connection
+        connection_pool.get(self.host_1_ip, 'other_user', self.ssh_key)
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 2)
+
+        mocked_sshclient_inst = ClientCls_obj.client
+        mocked_sshclient_inst.get_transport.return_value.is_active \
+            .return_value = False
+        reconnected_obj = connection_pool.get(self.host_1_ip,
+                                              self.ssh_username, self.ssh_key)
+        self.assertIsNot(reconnected_obj, ClientCls_obj)
+        mocked_sshclient_inst.close.assert_called()
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 3)
+
+        connection_pool.close_all()
+        self.assertIsNone(reconnected_obj.client)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_pool_warm_reports_unreachable_hosts(self,
+                                                 mocked_paramiko_sshclient,
+                                                 mocked_rsakey):
+        """ Test warm() connects all hosts & returns the ones that failed """
+        def connect(host, *args, **kwargs):
+            if host == '172.16.30.2':
+                raise TimeoutError('timed out')
+
+        mocked_paramiko_sshclient.return_value.connect.side_effect = connect
+        connection_pool = ConnectionPoolCls()
+
+        failures = connection_pool.warm([self.host_1_ip, '172.16.30.2'],
+                                        self.ssh_username, self.ssh_key)
+
+        self.assertEqual(list(failures), ['172.16.30.2'])
+        self.assertStartsWith(failures['172.16.30.2'], 'SSHConnectError(')
+        self.assertIn("TimeoutError('timed out')", failures['172.16.30.2'])
+        connection_pool.get(self.host_1_ip, self.ssh_username, self.ssh_key)
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 2)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_submitted_cmds_run_concurrently_over_one_transport(
+            self, mocked_paramiko_sshclient, mocked_rsakey):
+        """ Test submit() runs cmds at once, each on a channel of its own
+
+        The log tail only ends once the kill ran, which deadlocks unless
+        both run concurrently; all channels are opened on the transport of
+        the single connection.
+        """
+        killed = threading.Event()
+
+        def tail():
+            finished = killed.wait(timeout=5)
+            return 0, b'ORA-00603\n' if finished else b'', b''
+
+        def kill():
+            killed.set()
+            return 0, b'', b''
+
+        cmds = {'tail -f alert.log': tail, 'sudo kill -9 1234': kill,
+                'vmstat': lambda: (1, b'procs', b'vmstat: oops')}
+        channels = []
+
+        def open_session(timeout=None):
+            channels.append(_FakeChannel(cmds))
+            return channels[-1]
+
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key)
+        ClientCls_obj.client.get_transport.return_value.open_session \
+            .side_effect = open_session
+
+        futures = [ClientCls_obj.submit(cmd) for cmd in cmds]
+
+        self.assertEqual([future.result(timeout=10) for future in futures], [
+            CommandResult('tail -f alert.log', 0, b'ORA-00603\n', b''),
+            CommandResult('sudo kill -9 1234', 0, b'', b''),
+            CommandResult('vmstat', 1, b'procs', b'vmstat: oops')])
+        self.assertEqual(mocked_paramiko_sshclient.call_count, 1)
+        self.assertLen(channels, 3)
+        self.assertTrue(all(channel.closed for channel in channels))
+        ClientCls_obj.garbage_clean()
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_submitted_cmd_times_out(self, mocked_paramiko_sshclient,
+                                     mocked_rsakey):
+        """ Test a cmd not done in time raises TimeoutError from its future
+        & gets its channel closed """
+        channel = _FakeChannel({'sleep 600': lambda: (None, b'', b'')})
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key)
+        ClientCls_obj.client.get_transport.return_value.open_session \
+            .return_value = channel
+
+        future = ClientCls_obj.submit('sleep 600', timeout=0.2)
+
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=10)
+        self.assertTrue(channel.closed)
+        ClientCls_obj.garbage_clean()
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    @patch('src.common.cm6_paramiko._RECV_BYTES', 4)
+    def test_stream_lines_with_time_of_receipt(self,
+                                               mocked_paramiko_sshclient,
+                                               mocked_rsakey):
+        """ Test the lines of stdout & stderr come out whole & time stamped
+
+        The o/p is received 4 bytes at a time, so lines are split across
+        receives; a last line without a newline is handed out as well.
+        """
+        channel = _FakeChannel({'kill': lambda: (
+            0, b'1658004483\nkilled 1234\nno newline', b'ps: warning\n')})
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key)
+        ClientCls_obj.client.get_transport.return_value.open_session \
+            .return_value = channel
+
+        started, started_monotonic = time.time(), time.monotonic()
+        line_stream = ClientCls_obj.stream_lines('kill')
+        received_lines = list(line_stream)
+
+        self.assertEqual(
+            [(received.stream, received.line) for received in received_lines],
+            [('stdout', b'1658004483'), ('stdout', b'killed 1234'),
+             ('stderr', b'ps: warning'), ('stdout', b'no newline')])
+        self.assertTrue(all(isinstance(received, ReceivedLine)
+                            for received in received_lines))
+        self.assertTrue(all(
+            started <= received.wall_clock <= time.time() and
+            started_monotonic <= received.monotonic <= time.monotonic()
+            for received in received_lines))
+        self.assertEqual(line_stream.exit_status, 0)
+        self.assertTrue(channel.closed)
+        ClientCls_obj.garbage_clean()
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_connect_timeouts_and_dead_peer_detection_set(
+            self, mocked_paramiko_sshclient, mocked_rsakey):
+        """ Test the timeouts are passed to connect & the dead peer is
+        detected by keepalives & the TCP timeouts of the socket """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        mocked_transport = \
+            mocked_paramiko_sshclient.return_value.get_transport.return_value
+        mocked_transport.sock = sock
+
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key, connect_timeout=3,
+                                  keepalive_secs=2, dead_peer_secs=8)
+
+        connect_kwargs = ClientCls_obj.client.connect.call_args[1]
+        self.assertEqual((connect_kwargs['timeout'],
+                          connect_kwargs['banner_timeout'],
+                          connect_kwargs['auth_timeout']),
+                         (3, ClientCls.banner_timeout, ClientCls.auth_timeout))
+        mocked_transport.set_keepalive.assert_called_once_with(2)
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,
+                                        socket.SO_KEEPALIVE))
+        if hasattr(socket, 'TCP_USER_TIMEOUT'):
+            self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP,
+                                             socket.TCP_USER_TIMEOUT), 8000)
+            self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP,
+                                             socket.TCP_KEEPCNT), 4)
+
+    @patch("src.common.cm6_paramiko.RSAKey", spec=True)
+    @patch('src.common.cm6_paramiko.SSHClient')
+    def test_failures_raised_as_typed_exceptions(self,
+                                                 mocked_paramiko_sshclient,
+                                                 mocked_rsakey):
+        """ Test connect & cmd failures raise SSHError subclasses, telling
+        a cmd failing on a live connection from a dead host """
+        mocked_sshclient_inst = mocked_paramiko_sshclient.return_value
+        mocked_sshclient_inst.connect.side_effect = socket.timeout(
+            'timed out')
+        with self.assertRaises(SSHConnectError) as raised:
+            ClientCls(host=self.host_1_ip, username=self.ssh_username,
+                      key_file=self.ssh_key)
+        self.assertEqual(raised.exception.host, self.host_1_ip)
+        mocked_sshclient_inst.close.assert_called()
+
+        mocked_sshclient_inst.connect.side_effect = None
+        ClientCls_obj = ClientCls(host=self.host_1_ip,
+                                  username=self.ssh_username,
+                                  key_file=self.ssh_key)
+        mocked_transport = mocked_sshclient_inst.get_transport.return_value
+        mocked_sshclient_inst.exec_command.side_effect = \
+            paramiko.ChannelException(1, 'Administratively prohibited')
+        with self.assertRaises(SSHCommandError):
+            ClientCls_obj.run_remote_cmd('date')
+
+        # o/p cut short: no o/p for exec_timeout secs, the cmd killed by a
+        # signal & the keepalive finding the host dead mid-cmd
+        mocked_sshclient_inst.exec_command.side_effect = None
+        mocked_stdout = Mock(spec=paramiko.channel.ChannelFile)
+        mocked_stdout.channel = Mock(spec=paramiko.Channel)
+        mocked_sshclient_inst.exec_command.return_value = (
+            None, mocked_stdout, Mock(spec=paramiko.channel.ChannelStderrFile))
+        mocked_stdout.read.side_effect = socket.timeout('timed out')
+        with self.assertRaises(SSHCommandError):
+            ClientCls_obj.store_op_to_py_variables('cat alert.log')
+        mocked_stdout.read.side_effect = None
+        mocked_stdout.read.return_value = b'ORA-'
+        mocked_stdout.channel.recv_exit_status.return_value = -1
+        with self.assertRaisesRegex(SSHCommandError, 'signal'):
+            ClientCls_obj.store_op_to_py_variables('cat alert.log')
+        mocked_transport.is_active.return_value = False
+        with self.assertRaises(SSHPeerDeadError):
+            ClientCls_obj.store_op_to_py_variables('cat alert.log')
+
+        mocked_sshclient_inst.exec_command.side_effect = EOFError()
+        with self.assertRaises(SSHPeerDeadError):
+            ClientCls_obj.run_remote_cmd('date')
+
+        # a channel closed under the cmd without its EOF
+        channel = _FakeChannel({'sleep 600': lambda: (None, b'', b'')})
+        channel.closed = True
+        mocked_transport.open_session.return_value = channel
+        with self.assertRaises(SSHPeerDeadError):
+            ClientCls_obj.submit('sleep 600').result(timeout=10)
+        channel.closed = False
+        channel.close()
+        ClientCls_obj.garbage_clean()
+
 
 if __name__ == '__main__':
     absltest.main()
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the vectorized operations on the Swingbench TPS timeseries"""
+import pathlib
+import sys
+from absl.testing import absltest
+import numpy as np
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm7_tps_timeseries
+
+_START_TS = 1658003925819
+
+
+def _csv_timeseries(tps_values: list) -> str:
+    """ Build <TPSReadings> text with one reading per second """
+    return ''.join([f'{_START_TS + i * 1000}, {tps},'
+                    for i, tps in enumerate(tps_values)])
+
+
+class TestDecodeTPSReadings(absltest.TestCase):
+    """ Test decoding of the <TPSReadings> text into a (n, 2) int64 array """
+
+    def test_decode_with_trailing_comma(self):
+        " Assert the trailing comma of swingbench data is ignored"
+        tps_series, unpaired = cm7_tps_timeseries.decode_tps_readings(
+            '1658003925819, 0,1658003926819, 0,\n 1658003927819, 127,')
+
+        self.assertEqual(tps_series.dtype, np.int64)
+        self.assertEqual(tps_series.shape, (3, 2))
+        self.assertEqual(tps_series[2].tolist(), [1658003927819, 127])
+        self.assertEqual(unpaired.size, 0)
+
+    def test_decode_carries_unpaired_timestamp(self):
+        " Assert a dangling timestamp is paired up with the next piece"
+        tps_series, unpaired = cm7_tps_timeseries.decode_tps_readings(
+            '1658003925819, 0,1658003926819')
+        self.assertEqual(tps_series.tolist(), [[1658003925819, 0]])
+        self.assertEqual(unpaired.tolist(), [1658003926819])
+
+        tps_series, unpaired = cm7_tps_timeseries.decode_tps_readings(
+            '113,1658003927819, 0,', unpaired)
+        self.assertEqual(tps_series.tolist(), [[1658003926819, 113],
+                                               [1658003927819, 0]])
+        self.assertEqual(unpaired.size, 0)
+
+    def test_decode_empty_tps_readings(self):
+        " Assert an empty <TPSReadings/> (None text) decodes to no readings"
+        for csv_timeseries in [None, '', '\n ']:
+            tps_series, unpaired = cm7_tps_timeseries.decode_tps_readings(
+                csv_timeseries)
+            self.assertEqual(tps_series.dtype, np.int64)
+            self.assertEqual(tps_series.shape, (0, 2))
+            self.assertEqual(unpaired.size, 0)
+
+
+class TestOutageWindowDetector(absltest.TestCase):
+    """ Test the run-length based detection of every outage window """
+
+    # 2 outage windows, a low TPS (45) does not end the first one & the
+    # 0s before workload start (ramp up) are not an outage
+    tps_values = [0, 0, 120, 118, 0, 0, 0, 45, 121, 119, 0, 122, 50, 123]
+
+    def test_every_outage_window_found(self):
+        " Assert all outage windows are found with their start/end/zero TPS"
+        tps_series, _ = cm7_tps_timeseries.decode_tps_readings(
+            _csv_timeseries(self.tps_values))
+
+        outage_windows = cm7_tps_timeseries.find_outage_windows(tps_series)
+
+        self.assertEqual(outage_windows, [
+            cm7_tps_timeseries.OutageWindow(
+                _START_TS + 4000, _START_TS + 8000, 4.0, 3, False),
+            cm7_tps_timeseries.OutageWindow(
+                _START_TS + 10000, _START_TS + 11000, 1.0, 1, False)])
+
+    def test_detect_in_chunks(self):
+        " Assert detecting chunk by chunk matches detecting the whole series"
+        tps_series, _ = cm7_tps_timeseries.decode_tps_readings(
+            _csv_timeseries(self.tps_values))
+
+        for chunk_count in range(1, len(self.tps_values) + 1):
+            detector = cm7_tps_timeseries.OutageWindowDetector()
+            for chunk in np.array_split(tps_series, chunk_count):
+                detector.feed(chunk)
+
+            self.assertEqual(detector.finish(),
+                             cm7_tps_timeseries.find_outage_windows(
+                                 tps_series))
+            self.assertEqual(detector.workload_start, _START_TS + 2000)
+
+    def test_run_ending_in_outage(self):
+        " Assert an outage still ongoing at the end of the run is reported"
+        tps_series, _ = cm7_tps_timeseries.decode_tps_readings(
+            _csv_timeseries([0, 120, 0, 0, 50, 30]))
+
+        self.assertEqual(cm7_tps_timeseries.find_outage_windows(tps_series), [
+            cm7_tps_timeseries.OutageWindow(
+                _START_TS + 2000, _START_TS + 5000, 3.0, 2, True)])
+
+    def test_no_outage(self):
+        " Assert no window is reported before workload start or without 0s"
+        for tps_values in [[0, 0, 0], [0, 120, 121, 50, 119]]:
+            tps_series, _ = cm7_tps_timeseries.decode_tps_readings(
+                _csv_timeseries(tps_values))
+            self.assertEqual(
+                cm7_tps_timeseries.find_outage_windows(tps_series), [])
+
+
+class TestBrownoutDetector(absltest.TestCase):
+    """ Test the rolling baseline detection of partial TPS degradation """
+
+    @classmethod
+    def setUp(cls) -> None:
+        super(TestBrownoutDetector, cls)  # go/gpylint-faq#g-missing-super-call
+        # 20 mins of steady TPS jittering between 110 & 129, with a 40% drop
+        # for a minute & a 50% drop lasting 5 times the baseline window
+        rng = np.random.default_rng(seed=2023)
+        tps = rng.integers(110, 130, size=1200)
+        tps[:30] = 0  # ramp up
+        tps[400:460] = tps[400:460] * 6 // 10
+        tps[600:1100] = tps[600:1100] // 2
+        cls.tps_series = np.column_stack(
+            (_START_TS + np.arange(tps.size) * 1000, tps))
+
+    def test_brownouts_found_with_depth_and_duration(self):
+        " Assert both drops are found & the long one keeps its baseline"
+        brownout_windows = cm7_tps_timeseries.find_brownout_windows(
+            self.tps_series, baseline_window=100)
+
+        self.assertLen(brownout_windows, 2)
+        for brownout_window, (start, end, depth) in zip(
+                brownout_windows, [(400, 460, 0.4), (600, 1100, 0.5)]):
+            # smoothing over 10 readings shifts the edges by a few readings
+            self.assertBetween((brownout_window.start - _START_TS) / 1000,
+                               start, start + 10)
+            self.assertBetween((brownout_window.end - _START_TS) / 1000,
+                               end, end + 10)
+            self.assertAlmostEqual(brownout_window.depth, depth, delta=0.05)
+            self.assertBetween(brownout_window.baseline_tps, 110, 130)
+            self.assertFalse(brownout_window.ongoing)
+
+    def test_detect_in_chunks(self):
+        " Assert detecting chunk by chunk matches detecting the whole series"
+        for chunk_count in [2, 7, 100, 1200]:
+            detector = cm7_tps_timeseries.BrownoutDetector(
+                baseline_window=100)
+            for chunk in np.array_split(self.tps_series, chunk_count):
+                detector.feed(chunk)
+
+            self.assertEqual(detector.finish(),
+                             cm7_tps_timeseries.find_brownout_windows(
+                                 self.tps_series, baseline_window=100))
+
+    def test_short_dips_and_ongoing_brownout(self):
+        " Assert dips below min_duration_secs are ignored & ongoing reported"
+        tps_series = self.tps_series[:500]
+
+        brownout_windows = cm7_tps_timeseries.find_brownout_windows(
+            tps_series, baseline_window=100, min_duration_secs=120)
+        self.assertEqual(brownout_windows, [])
+
+        brownout_windows = cm7_tps_timeseries.find_brownout_windows(
+            tps_series[:430], baseline_window=100)
+        self.assertLen(brownout_windows, 1)
+        self.assertTrue(brownout_windows[0].ongoing)
+
+
+if __name__ == '__main__':
+    absltest.main()
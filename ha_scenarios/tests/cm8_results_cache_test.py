@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the sidecar cache of parsed Swingbench results"""
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+from unittest.mock import patch
+from absl.testing import absltest
+import numpy as np
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable-next=import-error,wrong-import-position
+from src.common.cm8_results_cache import ResultsCacheCls
+
+
+class TestResultsCache(absltest.TestCase):
+    """ Test storing, loading & invalidating the cache entry of a file """
+
+    def setUp(self):
+        super().setUp()
+        self.run_dir = self._mkdtemp()
+        self.resultsxml_file = pathlib.Path(self.run_dir,
+                                            '1658003923_Jul1622_133843.xml')
+        self.resultsxml_file.write_text('<Results/>')
+        self.tps_series = np.array([[1658003925819, 0], [1658003926819, 127]],
+                                   dtype=np.int64)
+        self.summary = {'workload_start': 1658003926819,
+                        'outage_windows': []}
+
+    def _mkdtemp(self) -> str:
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        return tmp_dir
+
+    def store(self, results_cache):
+        """Store the series & summary under the key of the current content"""
+        results_cache.store(self.tps_series, self.summary,
+                            results_cache.content_key())
+
+    def test_store_then_load(self):
+        " Assert the stored series & summary are loaded back from sidecars"
+        self.store(ResultsCacheCls(self.resultsxml_file, 1))
+        self.assertTrue(pathlib.Path(
+            f'{self.resultsxml_file}.tps.npy').exists())
+        self.assertTrue(pathlib.Path(
+            f'{self.resultsxml_file}.summary.json').exists())
+
+        cached_results = ResultsCacheCls(self.resultsxml_file, 1).load()
+
+        self.assertIsInstance(cached_results.tps_series, np.memmap)
+        self.assertEqual(cached_results.tps_series.tolist(),
+                         self.tps_series.tolist())
+        self.assertEqual(cached_results.summary, self.summary)
+
+    def test_missing_entry(self):
+        " Assert a file never cached loads as None"
+        self.assertIsNone(ResultsCacheCls(self.resultsxml_file, 1).load())
+
+    def test_stale_entries_invalidated(self):
+        " Assert a changed parser version or file content invalidates"
+        self.store(ResultsCacheCls(self.resultsxml_file, 1))
+        self.assertIsNone(ResultsCacheCls(self.resultsxml_file, 2).load())
+
+        self.resultsxml_file.write_text('<Results></Results>')
+        self.assertIsNone(ResultsCacheCls(self.resultsxml_file, 1).load())
+
+    def test_touched_file_still_valid(self):
+        " Assert a new mtime with the same content keeps the entry valid"
+        self.store(ResultsCacheCls(self.resultsxml_file, 1))
+        os.utime(self.resultsxml_file, ns=(0, 0))
+
+        self.assertIsNotNone(ResultsCacheCls(self.resultsxml_file, 1).load())
+
+        # the new mtime was recorded, so the file is not re-hashed again
+        with patch.object(ResultsCacheCls, 'content_hash') as content_hash:
+            self.assertIsNotNone(
+                ResultsCacheCls(self.resultsxml_file, 1).load())
+        content_hash.assert_not_called()
+
+    def test_file_changed_while_parsed_not_stored(self):
+        " Assert results are not stored if the file changed since keyed"
+        results_cache = ResultsCacheCls(self.resultsxml_file, 1)
+        content_key = results_cache.content_key()
+        # charbench still writing the results file
+        with open(self.resultsxml_file, 'a', encoding='utf-8') as xml_fh:
+            xml_fh.write('<TPSReadings>1658003925819, 0,</TPSReadings>')
+
+        results_cache.store(self.tps_series, self.summary, content_key)
+
+        self.assertFalse(pathlib.Path(
+            f'{self.resultsxml_file}.summary.json').exists())
+        self.assertIsNone(ResultsCacheCls(self.resultsxml_file, 1).load())
+
+    def test_content_hashed_once_per_stat(self):
+        " Assert load() & content_key() of a changed file hash it once"
+        self.store(ResultsCacheCls(self.resultsxml_file, 1))
+        self.resultsxml_file.write_text('<Results></Results>')
+
+        results_cache = ResultsCacheCls(self.resultsxml_file, 1)
+        with patch.object(ResultsCacheCls, 'content_hash',
+                          return_value='0' * 64) as content_hash:
+            self.assertIsNone(results_cache.load())
+            content_key = results_cache.content_key()
+        content_hash.assert_called_once()
+        self.assertEqual(content_key.size, len('<Results></Results>'))
+
+    def test_separate_cache_dir(self):
+        " Assert the sidecars can be kept outside of the run directory"
+        cache_dir = self._mkdtemp()
+        self.store(ResultsCacheCls(self.resultsxml_file, 1, cache_dir))
+
+        self.assertLen(os.listdir(self.run_dir), 1)
+        self.assertIsNone(ResultsCacheCls(self.resultsxml_file, 1).load())
+        self.assertIsNotNone(
+            ResultsCacheCls(self.resultsxml_file, 1, cache_dir).load())
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+#
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the bulk analysis of an archive of scenario run directories"""
+import csv
+import pathlib
+import shutil
+import sys
+import tempfile
+from absl.testing import absltest
+
+THIS_DIR = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(THIS_DIR.parent))
+# pylint: disable-next=import-error,wrong-import-position
+from src.common import cm9_bulk_analyzer
+
+
+class TestBulkAnalyzer(absltest.TestCase):
+    """ Test the analysis of an archive built from the testdata xml files """
+
+    def setUp(self):
+        super().setUp()
+        self.archive_root = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.archive_root)
+
+        # 2 runs in the archive root & one nested a level deeper
+        for run_id, scenario, parent in [
+                ('1658003923_Jul1622_133843', 'oracleinst_down', '.'),
+                ('1661415592_Aug2522_011952', 'testing', '.'),
+                ('1658297854_Jul1922_231734', 'listener_crash', 'site2')]:
+            run_dir = self.archive_root / parent / f'{run_id}_{scenario}'
+            run_dir.mkdir(parents=True)
+            shutil.copy(THIS_DIR/'testdata'/f'{run_id}.xml', run_dir)
+            (run_dir/f'{run_id}_runlog').write_text(
+                '- INFO - Fault injection node: 172.16.110.2\n')
+
+        # neither a run directory without its results xml, nor a random one
+        (self.archive_root/'1657902658_Jul1522_093058_testing').mkdir()
+        (self.archive_root/'misc').mkdir()
+
+    def test_find_runs(self):
+        " Assert only the run directories holding a results xml are found"
+        runs = cm9_bulk_analyzer.find_runs(self.archive_root)
+
+        # in run_id (chronological) order irrespective of the nesting
+        self.assertEqual([(run.run_id, run.scenario) for run in runs], [
+            ('1658003923_Jul1622_133843', 'oracleinst_down'),
+            ('1658297854_Jul1922_231734', 'listener_crash'),
+            ('1661415592_Aug2522_011952', 'testing')])
+
+    def test_pool_matches_serial_analysis(self):
+        " Assert the process pool gives the same rows as a serial analysis"
+        runs = cm9_bulk_analyzer.find_runs(self.archive_root)
+
+        serial_rows = cm9_bulk_analyzer.analyse_runs(runs, workers=1,
+                                                     use_cache=False)
+        pool_rows = cm9_bulk_analyzer.analyse_runs(runs, workers=2,
+                                                   use_cache=False)
+
+        self.assertEqual(pool_rows, serial_rows)
+        first_row = serial_rows[0]
+        self.assertEqual(first_row['node'], '172.16.110.2')
+        self.assertEqual(first_row['workload_start'], 1658003959828)
+        self.assertEqual(first_row['outage_duration'], 56.012)
+        self.assertEqual(first_row['outage_window_count'], 9)
+        self.assertTrue(first_row['outage_windows'].startswith(
+            '1658004016839-1658004072851;'))
+        self.assertEqual(first_row['error'], '')
+
+    def test_corrupt_results_file_isolated(self):
+        " Assert a corrupt xml only fills the error column of its own row"
+        runs = cm9_bulk_analyzer.find_runs(self.archive_root)
+        pathlib.Path(runs[1].path, f'{runs[1].run_id}.xml').write_text('<Res')
+
+        rows = cm9_bulk_analyzer.analyse_runs(runs, workers=2)
+
+        self.assertStartsWith(rows[1]['error'], 'ParseError')
+        self.assertEqual(rows[0]['error'], '')
+        self.assertEqual(rows[2]['error'], '')
+
+    def test_write_summary_table(self):
+        " Assert one CSV row per run under the SUMMARY_COLUMNS header"
+        runs = cm9_bulk_analyzer.find_runs(self.archive_root)
+        summary_file = self.archive_root/'summary.csv'
+
+        cm9_bulk_analyzer.write_summary_table(
+            cm9_bulk_analyzer.analyse_runs(runs, workers=1), summary_file)
+
+        with open(summary_file, newline='', encoding='utf-8') as summary_fh:
+            table = list(csv.DictReader(summary_fh))
+        self.assertEqual(list(table[0].keys()),
+                         cm9_bulk_analyzer.SUMMARY_COLUMNS)
+        self.assertEqual([row['run_id'] for row in table],
+                         [run.run_id for run in runs])
+
+
+if __name__ == '__main__':
+    absltest.main()